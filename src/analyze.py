@@ -1,25 +1,214 @@
 import json
-import boto3
+import logging
+import os
+
+from cache import Cache, backend_from_url, get_image_hash
+from metrics import Metrics
 from receipt import Receipt
+from aws import BUCKET, get_client
+
+_cache = None
+_spellchecker = None
+_templates = None
+
+
+logging.getLogger("pennydetective").setLevel(logging.INFO)
+
+
+def get_cache():
+    """
+    caching is off unless the environment variable ANALYZE_CACHE is set (see cache.backend_from_url).
+    With an S3 cache, e.g. s3://<bucket>/cache/, the role of the lambda needs s3:GetObject and s3:PutObject
+    below the prefix and every document costs a head_object more.
+    """
+    global _cache
+    url = os.environ.get("ANALYZE_CACHE")
+    if _cache is None and url:
+        # corrected descriptions are other results than uncorrected ones, and so may be the ones found with templates.
+        # Both are identified by their content, so a lexicon or templates rebuilt at the same path get other entries.
+        version = Receipt.VERSION
+        spellchecker = get_spellchecker()
+        if spellchecker is not None:
+            version = "{}-{}".format(version, spellchecker.lexicon.checksum[:12])
+        templates = get_templates()
+        if templates is not None:
+            version = "{}-{}".format(version, templates.checksum[:12])
+        _cache = Cache(backend_from_url(url), version)
+    return _cache
+
+
+def get_spellchecker():
+    """
+    the descriptions are corrected if the environment variable ANALYZE_LEXICON is the folder of a lexicon
+    (see spellcheck.build_lexicon), e.g. in a lambda layer. It is memory-mapped once per container.
+    """
+    global _spellchecker
+    path = os.environ.get("ANALYZE_LEXICON")
+    if _spellchecker is None and path:
+        from spellcheck import SpellChecker
+        _spellchecker = SpellChecker.from_path(path)
+    return _spellchecker
+
+
+def get_templates():
+    """
+    receipts of known stores are analyzed with their layouts if the environment variable ANALYZE_TEMPLATES is
+    a JSON file of templates (see template.TemplateStore), it is read once per container.
+    """
+    global _templates
+    path = os.environ.get("ANALYZE_TEMPLATES")
+    if _templates is None and path:
+        from template import TemplateStore
+        _templates = TemplateStore(path)
+    return _templates
+
+
+def prepare_receipt(receipt: Receipt) -> Receipt:
+    """
+    use the spellchecker and templates of this process (see get_spellchecker and get_templates) for a receipt.
+    Every entry point (the lambda, service, batch, export and render) analyzes its receipts with them,
+    so that the same document gets the same result everywhere.
+    """
+    receipt.SPELLCHECKER = get_spellchecker()
+    receipt.TEMPLATES = get_templates()
+    return receipt
 
 
 def lambda_handler(event, context):
-    bucket = "elasticbeanstalk-us-east-2-693859464061"
+    """
+    event["path"]: analyze a single document, results and textract responses are cached by the image content
+    if ANALYZE_CACHE is set (see get_cache).
+    With the environment variable ANALYZE_METRICS set, timings and counters are logged and returned.
+    event["paths"]: fetch all documents from textract concurrently and analyze them
+    event["multipage"]: analyze a document with many pages (e.g. a PDF) by an asynchronous textract job
+    """
+    if "paths" in event:
+        return {
+            'statusCode': 200,
+            'response': json.dumps(analyze_many(event["paths"])),
+        }
+    if "multipage" in event:
+        return {
+            'statusCode': 200,
+            'response': json.dumps(analyze_multipage(event["multipage"])),
+        }
+
     document = "receipts/DSC_3607.JPG"
     document = event["path"]
-    client = boto3.client('textract')
-
-    # process using S3 object
-    response = client.detect_document_text(
-        Document={'S3Object': {'Bucket': bucket, 'Name': document}})
-
-    # Get the text blocks
-    # blocks=response['Blocks']
-    receipt = Receipt(response)
-    receipt.analyze()
 
     return {
         'statusCode': 200,
-        'response': json.dumps(receipt.get_json()),
+        'response': json.dumps(analyze_path(document)),
         # 'body': json.dumps(response)
     }
+
+
+def analyze_path(document):
+    """ analyze a single document in the bucket, results and textract responses are cached by the image content """
+    cache = get_cache()
+    image_hash = None if cache is None else get_image_hash(document)
+    result = None if cache is None else cache.get_result(image_hash)
+    if result is None:
+        result = analyze(document, cache, image_hash)
+    return result
+
+
+def analyze(document, cache=None, image_hash=None):
+    response = None if cache is None else cache.get_response(image_hash)
+    if response is None:
+        # process using S3 object
+        response = get_client().detect_document_text(
+            Document={'S3Object': {'Bucket': BUCKET, 'Name': document}})
+        if cache is not None:
+            cache.put_response(image_hash, response)
+    return analyze_response(response, cache=cache, image_hash=image_hash)
+
+
+def analyze_response(response, name=None, cache=None, image_hash=None):
+    """ :return: the result of a textract response, it is cached if a cache and the hash of the image are given """
+    metrics = Metrics({"function": "analyze"}) if os.environ.get("ANALYZE_METRICS") else None
+    receipt = prepare_receipt(Receipt(response, name=name, metrics=metrics))
+    receipt.analyze()
+    result = receipt.get_json()
+    if metrics is not None:
+        metrics.emit()
+    if cache is not None:
+        cache.put_result(image_hash, {key: value for key, value in result.items() if key != "metrics"})
+    return result
+
+
+def analyze_many(documents, client=None, max_in_flight=8):
+    """
+    :param documents: S3 keys of the images
+    :param client: a boto3 textract client (or LocalTextract), defaults to the shared client
+    :return: one result per document, in order. Failing documents have an "error" instead of a "result".
+    Like a single document, results and textract responses are cached, only the others are fetched.
+    """
+    cache = get_cache()
+    results = [None] * len(documents)
+    image_hashes = [None] * len(documents)
+    responses = [None] * len(documents)
+    if cache is not None:
+        for n, document in enumerate(documents):
+            try:
+                image_hashes[n] = get_image_hash(document)
+                results[n] = cache.get_result(image_hashes[n])
+                responses[n] = None if results[n] is not None else cache.get_response(image_hashes[n])
+            except Exception as e:
+                results[n] = e
+    missing = [n for n in range(len(documents)) if results[n] is None and responses[n] is None]
+    if len(missing) > 0:
+        # asyncio takes a considerable part of the cold start, only import it if it is used
+        from textract import AsyncTextract, run
+        textract = AsyncTextract(client=client, max_in_flight=max_in_flight)
+        try:
+            fetched = run(textract.detect_many([documents[n] for n in missing]))
+        finally:
+            textract.close()
+        for n, response in zip(missing, fetched):
+            if isinstance(response, Exception):
+                results[n] = response
+            else:
+                responses[n] = response
+                if cache is not None:
+                    cache.put_response(image_hashes[n], response)
+
+    for n, document in enumerate(documents):
+        if results[n] is None:
+            try:
+                results[n] = analyze_response(responses[n], document, cache, image_hashes[n])
+            except Exception as e:
+                results[n] = e
+    return [{"path": document, "error": "{}: {}".format(type(result).__name__, result)}
+            if isinstance(result, Exception) else {"path": document, "result": result}
+            for document, result in zip(documents, results)]
+
+
+def analyze_multipage(document, client=None, executor=None, poll_interval=1.):
+    """
+    :param document: S3 key of a document with many pages, e.g. a long invoice or a stitched scan
+    :param executor: where the pages are analyzed, see pages.analyze_job. By default a pool of processes,
+    but in the lambda (which has no /dev/shm for multiprocessing) the thread pool of the event loop.
+    :return: the results of all pages merged (see pages.merge_results)
+    """
+    cache = get_cache()
+    image_hash = None if cache is None else get_image_hash(document)
+    result = None if cache is None else cache.get_result(image_hash, "pages")
+    if result is not None:
+        return result
+    from pages import analyze_document
+    from textract import AsyncTextract, run
+    pool = None
+    if executor is None and not os.environ.get("AWS_LAMBDA_FUNCTION_NAME"):
+        from concurrent.futures import ProcessPoolExecutor
+        executor = pool = ProcessPoolExecutor()
+    textract = AsyncTextract(client=client)
+    try:
+        result = run(analyze_document(textract, document, executor, poll_interval))
+    finally:
+        textract.close()
+        if pool is not None:
+            pool.shutdown()
+    if cache is not None:
+        cache.put_result(image_hash, result, "pages")
+    return result
@@ -0,0 +1,22 @@
+from typing import Optional
+
+BUCKET = "elasticbeanstalk-us-east-2-693859464061"
+
+_clients = {}
+
+
+def get_client(service_name: str = 'textract'):
+    """
+    boto3 clients are created once per container and reused by all invocations.
+    boto3 is only imported when the first client is needed, it is the slowest import of the lambda.
+    """
+    if service_name not in _clients:
+        import boto3
+        _clients[service_name] = boto3.client(service_name)
+    return _clients[service_name]
+
+
+def get_error_code(error: Exception) -> Optional[str]:
+    """ :return: the error code of a botocore ClientError, None for other exceptions """
+    response = getattr(error, "response", None) or {}
+    return response.get("Error", {}).get("Code")
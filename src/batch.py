@@ -0,0 +1,91 @@
+import argparse
+import glob
+import json
+import os
+import sys
+from multiprocessing import Pool
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+from analyze import prepare_receipt
+from receipt import Receipt
+
+# either the path to an apiResponse.json or the textract response itself
+Document = Union[str, Dict]
+
+
+def find_documents(directory: str) -> List[str]:
+    """ :return: the paths of all <directory>/<name>/apiResponse.json files, sorted by name """
+    return sorted(glob.glob(os.path.join(directory, "*", "apiResponse.json")))
+
+
+def get_name(numbered_document: Tuple[int, Document]) -> str:
+    """ :return: the name of the folder of an apiResponse.json, the number of the document otherwise """
+    no, document = numbered_document
+    if isinstance(document, str):
+        return os.path.basename(os.path.dirname(document)) or document
+    return str(no)
+
+
+def load_receipt(numbered_document: Tuple[int, Document]) -> Receipt:
+    """ :return: the receipt of the document with the spellchecker and templates of the lambda, not analyzed yet """
+    name, document = get_name(numbered_document), numbered_document[1]
+    if isinstance(document, str):
+        with open(document, "rb") as f:
+            return prepare_receipt(Receipt.from_stream(f, name=name))
+    return prepare_receipt(Receipt(document, name=name))
+
+
+def analyze_document(numbered_document: Tuple[int, Document]) -> Dict:
+    """
+    analyze a single document. Errors are returned in the result instead of being raised,
+    so that one broken receipt doesn't stop the whole batch.
+    """
+    name = get_name(numbered_document)
+    try:
+        receipt = load_receipt(numbered_document)
+        receipt.analyze()
+        return {"name": name, "result": receipt.get_json()}
+    except Exception as e:
+        return {"name": name, "error": "{}: {}".format(type(e).__name__, e)}
+
+
+def analyze_batch(documents: Iterable[Document], processes: Optional[int] = None,
+                  chunksize: int = 1) -> Iterator[Dict]:
+    """
+    analyze many documents across a pool of worker processes
+    :param documents: paths to apiResponse.json files or textract responses
+    :param processes: number of workers, defaults to the number of CPUs. With 1 everything runs in this process
+    (e.g. on AWS Lambda, which doesn't support multiprocessing.Pool).
+    :param chunksize: number of documents that are sent to a worker at once
+    :return: the results in the same order as the documents, as soon as they are available
+    """
+    numbered_documents = enumerate(documents)
+    if processes == 1:
+        yield from map(analyze_document, numbered_documents)
+        return
+    with Pool(processes) as pool:
+        yield from pool.imap(analyze_document, numbered_documents, chunksize)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Analyze many textract responses at once")
+    parser.add_argument("paths", nargs="+",
+                        help="apiResponse.json files or directories containing <name>/apiResponse.json")
+    parser.add_argument("--processes", type=int, default=None,
+                        help="number of worker processes, defaults to the number of CPUs")
+    parser.add_argument("--output", default=None,
+                        help="write one JSON result per line into this file instead of stdout")
+    args = parser.parse_args()
+
+    paths = []
+    for path in args.paths:
+        paths.extend(find_documents(path) if os.path.isdir(path) else [path])
+
+    out = sys.stdout if args.output is None else open(args.output, "w")
+    try:
+        for result in analyze_batch(paths, processes=args.processes):
+            out.write(json.dumps(result) + "\n")
+            out.flush()
+    finally:
+        if out is not sys.stdout:
+            out.close()
@@ -0,0 +1,214 @@
+import argparse
+import contextlib
+import copy
+import glob
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+import tracemalloc
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from metrics import Metrics
+from receipt import Receipt
+
+PERCENTILES = (50, 90, 99)
+
+
+def load_corpus(data_path: str) -> List[Tuple[str, bytes, Optional[Dict]]]:
+    """ :return: (name, textract response as bytes, expected result or None) of every receipt in the data folder """
+    corpus = []
+    for path in sorted(glob.glob(os.path.join(data_path, "*", "apiResponse.json"))):
+        directory = os.path.dirname(path)
+        with open(path, "rb") as f:
+            response = f.read()
+        expected = None
+        if os.path.exists(os.path.join(directory, "result.json")):
+            with open(os.path.join(directory, "result.json")) as f:
+                expected = json.load(f)
+        corpus.append((os.path.basename(directory), response, expected))
+    return corpus
+
+
+def stack_response(response: Dict, copies: int) -> Dict:
+    """
+    a synthetic long receipt: the response is repeated `copies` times from top to bottom,
+    each copy squeezed to 1 / copies of the height.
+    """
+    blocks = []
+    for no in range(copies):
+        for block in response["Blocks"]:
+            block = copy.deepcopy(block)
+            block["Id"] = "{}-{}".format(block["Id"][:30], no)
+            geometry = block.get("Geometry")
+            if geometry is not None:
+                for point in geometry["Polygon"]:
+                    point["Y"] = (point["Y"] + no) / copies
+                geometry["BoundingBox"]["Top"] = (geometry["BoundingBox"]["Top"] + no) / copies
+                geometry["BoundingBox"]["Height"] /= copies
+            blocks.append(block)
+    return {"Blocks": blocks}
+
+
+def scale_to_words(response: Dict, words: int) -> Dict:
+    """ :return: a stacked response with at least `words` WORD blocks """
+    number_words = sum(block["BlockType"] == "WORD" for block in response["Blocks"])
+    return stack_response(response, max(1, -(-words // max(1, number_words))))
+
+
+def build_documents(corpus, docs: Optional[int], words: Optional[int]) -> List[Tuple[str, bytes, Optional[Dict]]]:
+    """ replicate the corpus round robin to `docs` documents, optionally stacked to `words` words each """
+    documents = corpus
+    if words is not None:
+        # a stacked receipt has no expected result
+        documents = [("{}x{}".format(name, words), json.dumps(scale_to_words(json.loads(response), words)).encode(),
+                      None) for name, response, _ in corpus]
+    if docs is not None:
+        documents = [documents[no % len(documents)] for no in range(docs)]
+    return documents
+
+
+def check(receipt: Receipt, expected: Dict) -> Dict:
+    """ compare an analyzed receipt with the expected result.json """
+    result = receipt.get_json()
+    found = [(item["desc"], item["price"]) for item in result["items"]]
+    wanted = [(item["desc"], item["price"]) for item in expected["items"]]
+    matched = sum(min(found.count(item), wanted.count(item)) for item in set(wanted))
+    return {
+        "total": result["total"] == expected["total"],
+        "items": found == wanted,
+        "matched_items": matched,
+        "found_items": len(found),
+        "expected_items": len(wanted),
+    }
+
+
+def analyze_timed(response: bytes, name: str) -> Tuple[Receipt, Dict[str, float]]:
+    """ :return: the analyzed receipt and the seconds every stage took (parsing included) """
+    receipt = Receipt.from_stream(response, name=name, metrics=Metrics())
+    receipt.analyze()
+    return receipt, receipt.metrics.timings
+
+
+def summarize(values: List[float]) -> Dict[str, float]:
+    """ latency statistics in milliseconds """
+    values = np.array(values) * 1000
+    summary = {"p{}".format(p): float(np.percentile(values, p)) for p in PERCENTILES}
+    summary.update({"mean": float(values.mean()), "max": float(values.max())})
+    return summary
+
+
+def peak_memory(documents) -> int:
+    """ :return: the highest peak of memory allocated by python while parsing and analyzing a single document """
+    peak = 0
+    for name, response, _ in {document[0]: document for document in documents}.values():
+        tracemalloc.start()
+        try:
+            Receipt.from_stream(response, name=name).analyze()
+        except Exception:
+            pass
+        peak = max(peak, tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+    return peak
+
+
+def get_commit() -> Optional[str]:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmark(data_path: str = "../data", docs: Optional[int] = None, words: Optional[int] = None,
+                  repeat: int = 1) -> Dict:
+    """
+    analyze the documents `repeat` times and report latencies, throughput, memory and accuracy.
+    Only the last repetition is checked for accuracy.
+    """
+    documents = build_documents(load_corpus(data_path), docs, words)
+    stage_names = ["parse"] + [stage.name for stage in Receipt.STAGES]
+    timings = {stage: [] for stage in stage_names + ["total"]}
+    accuracy, errors = {}, {}
+
+    start = time.perf_counter()
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        for _ in range(repeat):
+            for name, response, expected in documents:
+                try:
+                    receipt, document_timings = analyze_timed(response, name)
+                except Exception as e:
+                    errors[name] = "{}: {}".format(type(e).__name__, e)
+                    continue
+                for stage, seconds in document_timings.items():
+                    timings[stage].append(seconds)
+                timings["total"].append(sum(document_timings.values()))
+                if expected is not None:
+                    accuracy[name] = check(receipt, expected)
+        duration = time.perf_counter() - start
+        peak = peak_memory(documents)
+
+    checked = list(accuracy.values())
+    return {
+        "commit": get_commit(),
+        "config": {"docs": len(documents), "words": words, "repeat": repeat},
+        "latency_ms": {stage: summarize(values) for stage, values in timings.items() if len(values) > 0},
+        "throughput": len(documents) * repeat / duration,
+        "memory": {
+            "peak_per_document": peak,
+            "max_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        },
+        "accuracy": {
+            "receipts": len(checked),
+            "total": sum(c["total"] for c in checked) / max(1, len(checked)),
+            "items": sum(c["items"] for c in checked) / max(1, len(checked)),
+            "item_precision": sum(c["matched_items"] for c in checked) / max(1, sum(c["found_items"] for c in checked)),
+            "item_recall": sum(c["matched_items"] for c in checked) / max(1, sum(c["expected_items"] for c in checked)),
+        },
+        "receipts": accuracy,
+        "errors": errors,
+    }
+
+
+def compare(old: Dict, new: Dict) -> List[str]:
+    """ :return: human readable lines comparing two benchmark results """
+    lines = ["{} -> {}".format(old.get("commit"), new.get("commit"))]
+    for stage, summary in new["latency_ms"].items():
+        if stage in old["latency_ms"]:
+            before, after = old["latency_ms"][stage]["p50"], summary["p50"]
+            lines.append("{:20} p50 {:8.3f} ms -> {:8.3f} ms ({:+.0%})".format(
+                stage, before, after, after / before - 1 if before > 0 else 0))
+    lines.append("{:20} {:8.1f} docs/s -> {:8.1f} docs/s".format("throughput", old["throughput"], new["throughput"]))
+    for key, value in new["accuracy"].items():
+        if new["accuracy"]["receipts"] > 0 and key in old["accuracy"] and value != old["accuracy"][key]:
+            lines.append("{:20} {} -> {}".format("accuracy " + key, old["accuracy"][key], value))
+    for name, result in new["receipts"].items():
+        before = old["receipts"].get(name)
+        if before is not None and (before["total"], before["items"]) != (result["total"], result["items"]):
+            lines.append("{:20} total {} -> {}, items {} -> {}".format(
+                name, before["total"], result["total"], before["items"], result["items"]))
+    return lines
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the analysis on the receipts in the data folder")
+    parser.add_argument("--data", default="../data", help="folder containing <name>/apiResponse.json")
+    parser.add_argument("--docs", type=int, default=None, help="replicate the receipts to this many documents")
+    parser.add_argument("--words", type=int, default=None, help="stack every receipt to at least this many words")
+    parser.add_argument("--repeat", type=int, default=1, help="analyze all documents this many times")
+    parser.add_argument("--output", default=None, help="write the result as JSON into this file")
+    parser.add_argument("--compare", default=None, help="a result of an earlier run to compare with")
+    args = parser.parse_args()
+
+    benchmark = run_benchmark(args.data, docs=args.docs, words=args.words, repeat=args.repeat)
+    if args.output is not None:
+        with open(args.output, "w") as f:
+            json.dump(benchmark, f, indent=2)
+    if args.compare is not None:
+        with open(args.compare) as f:
+            print("\n".join(compare(json.load(f), benchmark)))
+    elif args.output is None:
+        json.dump(benchmark, sys.stdout, indent=2)
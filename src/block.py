@@ -1,28 +1,77 @@
-import re
-from typing import Dict, List, Tuple
+from typing import Dict, List, Optional
 
 import numpy as np
 
+from geometry import Geometry
+
+
+class BlockTable:
+    """
+    the fields of all blocks of a receipt in contiguous arrays, a Block is a row of it.
+    Textract ids are ASCII UUIDs, they are stored as fixed size bytes.
+    """
+    __slots__ = ("ids", "confs", "geometry")
+
+    def __init__(self, ids: List[str], confs: List[float], geometry: Geometry):
+        self.ids = np.array(ids, dtype="S36")
+        self.confs = np.array(confs, dtype=float)
+        self.geometry = geometry
+
+    def __len__(self):
+        return len(self.confs)
 
-class Block:
 
-    def __init__(self, block_json: Dict):
+class Block:
+    # most blocks are never prices, so a block only has what every word needs, without a per instance dict
+    __slots__ = ("text", "type", "table", "idx", "json", "cents")
+
+    def __init__(self, text: str, block_type: str, table: BlockTable, idx: int, block_json: Optional[Dict] = None):
+        """
+        :param table: the shared storage of the receipt, this block is row `idx` of it.
+        :param block_json: the LINE or WORD block as returned by textract, only kept if it was requested
+        """
         self.json = block_json
 
-        self.id: str = block_json["Id"]
-        self.conf = float(block_json["Confidence"])
-        self.poly = np.array([(p["X"], p["Y"]) for p in block_json["Geometry"]["Polygon"]])
-        self.text: str = block_json["Text"]
-        self.bb: Dict = block_json["Geometry"]["BoundingBox"]
-        self.type: str = block_json["BlockType"]
+        self.text: str = text
+        self.type: str = block_type
+
+        self.table = table
+        self.idx = idx
 
-        self.is_price = False
-        self.price_column = None
-        self.associated_descs: List[Tuple[float, Block]] = []
+        self.cents: Optional[int] = None  # the value if this block is a price, see find_prices
         # self.linked_description, self.linked_price = None, None
 
+    @classmethod
+    def from_json(cls, block_json: Dict, keep_json: bool = True) -> "Block":
+        """ a block with a table of its own """
+        table = BlockTable([block_json["Id"]], [float(block_json["Confidence"])], Geometry.from_json([block_json]))
+        return cls(block_json["Text"], block_json["BlockType"], table, 0, block_json if keep_json else None)
+
+    @property
+    def id(self) -> str:
+        return self.table.ids[self.idx].decode()
+
+    @property
+    def conf(self) -> float:
+        return float(self.table.confs[self.idx])
+
+    @property
+    def geometry(self) -> Geometry:
+        return self.table.geometry
+
+    @property
+    def poly(self) -> np.ndarray:
+        return self.geometry.poly[self.idx]
+
     def __getitem__(self, no):
-        return self.poly[no]
+        return self.geometry.poly[self.idx, no]
+
+    @property
+    def bb(self) -> Dict:
+        """ the axis aligned bounding box, like the one textract returns """
+        left, top = self.poly.min(axis=0)
+        right, bottom = self.poly.max(axis=0)
+        return {"Width": right - left, "Height": bottom - top, "Left": left, "Top": top}
 
     @property
     def top_left(self):
@@ -42,21 +91,25 @@ class Block:
 
     @property
     def left_center(self):
-        return (self.top_left + self.bottom_left) / 2
+        return self.geometry.left_center[self.idx]
 
     @property
     def right_center(self):
-        return (self.top_right + self.bottom_right) / 2
+        return self.geometry.right_center[self.idx]
 
     @property
     def center(self) -> np.ndarray:
-        return (self.left_center + self.right_center) / 2
+        return self.geometry.center[self.idx]
+
+    @property
+    def is_price(self) -> bool:
+        return self.cents is not None
 
     @property
-    def price(self):
+    def price(self) -> float:
         assert self.is_price
-        """ remove all non number characters and take care of ',' -> '.' conversion"""
-        return float(re.sub('[^0-9.]+', '', self.text.replace(",", ".")))
+        """ the value that the tokenizer parsed from the text """
+        return self.cents / 100
 
     def __repr__(self):
         return "`{}`".format(self.text)
@@ -0,0 +1,233 @@
+import hashlib
+import json
+import os
+import time
+import zlib
+from collections import OrderedDict
+from typing import Dict, Optional
+
+from aws import BUCKET, get_client, get_error_code
+
+
+def content_hash(data: bytes) -> str:
+    """ MD5 of the image, for single part uploads this is also the ETag S3 reports for it """
+    return hashlib.md5(data).hexdigest()
+
+
+def get_image_hash(document: str, bucket: str = BUCKET, client=None) -> str:
+    """
+    :return: the content hash of an S3 object. The uploader puts images in a single part,
+    so the ETag already is the MD5 and the image doesn't have to be downloaded.
+    The ETag is not a content hash for multipart uploads (it has a '-') and for objects encrypted with SSE-KMS
+    or SSE-C, then the image is hashed here.
+    """
+    client = client if client is not None else get_client('s3')
+    head = client.head_object(Bucket=bucket, Key=document)
+    etag = head["ETag"].strip('"')
+    if "-" not in etag and head.get("ServerSideEncryption", "AES256") == "AES256" \
+            and "SSECustomerAlgorithm" not in head:
+        return etag
+    return content_hash(client.get_object(Bucket=bucket, Key=document)["Body"].read())
+
+
+class Backend:
+    """
+    stores bytes by key. Backends with a size limit evict the least recently used entries,
+    `max_entries` and `max_bytes` of None mean unlimited.
+    """
+
+    def get(self, key: str) -> Optional[bytes]:
+        raise NotImplementedError
+
+    def put(self, key: str, value: bytes):
+        raise NotImplementedError
+
+
+class MemoryBackend(Backend):
+    """ keeps the entries in this process, e.g. for the lifetime of a warm lambda container """
+
+    def __init__(self, max_entries: Optional[int] = None, max_bytes: Optional[int] = None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.entries: OrderedDict = OrderedDict()
+        self.size = 0
+
+    def get(self, key):
+        value = self.entries.get(key)
+        if value is not None:
+            self.entries.move_to_end(key)
+        return value
+
+    def put(self, key, value):
+        if key in self.entries:
+            self.size -= len(self.entries.pop(key))
+        self.entries[key] = value
+        self.size += len(value)
+        while len(self.entries) > 1 and (
+                (self.max_entries is not None and len(self.entries) > self.max_entries) or
+                (self.max_bytes is not None and self.size > self.max_bytes)):
+            _, evicted = self.entries.popitem(last=False)
+            self.size -= len(evicted)
+
+
+class DirectoryBackend(Backend):
+    """ one file per entry, the modification time of the file is its last use """
+
+    def __init__(self, path: str, max_entries: Optional[int] = None, max_bytes: Optional[int] = None):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.path, *key.split("/"))
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                value = f.read()
+        except FileNotFoundError:
+            return None
+        os.utime(path)
+        return value
+
+    def put(self, key, value):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # write to a temporary file first, so that concurrent readers never see half an entry
+        tmp_path = "{}.{}.tmp".format(path, os.getpid())
+        with open(tmp_path, "wb") as f:
+            f.write(value)
+        os.replace(tmp_path, path)
+        if self.max_entries is not None or self.max_bytes is not None:
+            self.evict()
+
+    def evict(self):
+        entries = []
+        for directory, _, filenames in os.walk(self.path):
+            for filename in filenames:
+                if not filename.endswith(".tmp"):
+                    stat = os.stat(os.path.join(directory, filename))
+                    entries.append((stat.st_mtime, stat.st_size, os.path.join(directory, filename)))
+        entries.sort()
+        size = sum(entry[1] for entry in entries)
+        while len(entries) > 1 and (
+                (self.max_entries is not None and len(entries) > self.max_entries) or
+                (self.max_bytes is not None and size > self.max_bytes)):
+            _, entry_size, path = entries.pop(0)
+            os.remove(path)
+            size -= entry_size
+
+
+class SQLiteBackend(Backend):
+    """ all entries in one SQLite file, with the time of last use in an indexed column """
+
+    def __init__(self, path: str, max_entries: Optional[int] = None, max_bytes: Optional[int] = None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        import sqlite3  # not needed by the default S3 backend of the lambda
+        self.connection = sqlite3.connect(path)
+        self.connection.execute("CREATE TABLE IF NOT EXISTS cache "
+                                "(key TEXT PRIMARY KEY, value BLOB, size INTEGER, used REAL)")
+        self.connection.execute("CREATE INDEX IF NOT EXISTS cache_used ON cache (used)")
+        self.connection.commit()
+
+    def get(self, key):
+        row = self.connection.execute("SELECT value FROM cache WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        self.connection.execute("UPDATE cache SET used = ? WHERE key = ?", (time.time(), key))
+        self.connection.commit()
+        return row[0]
+
+    def put(self, key, value):
+        self.connection.execute("REPLACE INTO cache (key, value, size, used) VALUES (?, ?, ?, ?)",
+                                (key, value, len(value), time.time()))
+        self.evict()
+        self.connection.commit()
+
+    def evict(self):
+        if self.max_entries is not None:
+            self.connection.execute("DELETE FROM cache WHERE key IN "
+                                    "(SELECT key FROM cache ORDER BY used DESC LIMIT -1 OFFSET ?)",
+                                    (max(1, self.max_entries),))
+        if self.max_bytes is not None:
+            # keep the most recently used entries whose sizes add up to max_bytes
+            size = 0
+            for no, (key, entry_size) in enumerate(
+                    self.connection.execute("SELECT key, size FROM cache ORDER BY used DESC").fetchall()):
+                size += entry_size
+                if size > self.max_bytes and no > 0:
+                    self.connection.execute("DELETE FROM cache WHERE key = ?", (key,))
+
+
+class S3Backend(Backend):
+    """
+    entries are objects below a prefix of a bucket.
+    Eviction is left to a lifecycle rule of the bucket (e.g. expire objects below the prefix after 90 days).
+    """
+
+    def __init__(self, bucket: str, prefix: str = "cache/", client=None):
+        self.bucket = bucket
+        self.prefix = prefix
+        self.client = client if client is not None else get_client('s3')
+
+    def get(self, key):
+        try:
+            return self.client.get_object(Bucket=self.bucket, Key=self.prefix + key)["Body"].read()
+        except Exception as e:
+            if get_error_code(e) in ("NoSuchKey", "404"):
+                return None
+            raise
+
+    def put(self, key, value):
+        self.client.put_object(Bucket=self.bucket, Key=self.prefix + key, Body=value)
+
+
+def backend_from_url(url: str) -> Backend:
+    """
+    memory://, dir:///tmp/cache, sqlite:///tmp/cache.db or s3://bucket/prefix/
+    """
+    scheme, _, location = url.partition("://")
+    if scheme == "memory":
+        return MemoryBackend()
+    if scheme == "dir":
+        return DirectoryBackend(location)
+    if scheme == "sqlite":
+        return SQLiteBackend(location)
+    if scheme == "s3":
+        bucket, _, prefix = location.partition("/")
+        return S3Backend(bucket, prefix)
+    raise ValueError("Unknown cache backend '{}'".format(url))
+
+
+class Cache:
+    """
+    caches textract responses by the hash of the image
+    and analysis results by the hash of the image and the version of the analyzer.
+    The entries are compressed JSON.
+    """
+
+    def __init__(self, backend: Backend, version: str):
+        self.backend = backend
+        self.version = version
+
+    def _get(self, key: str) -> Optional[Dict]:
+        value = self.backend.get(key)
+        return None if value is None else json.loads(zlib.decompress(value).decode())
+
+    def _put(self, key: str, value: Dict):
+        self.backend.put(key, zlib.compress(json.dumps(value).encode()))
+
+    def get_response(self, image_hash: str) -> Optional[Dict]:
+        return self._get("textract/{}".format(image_hash))
+
+    def put_response(self, image_hash: str, response: Dict):
+        self._put("textract/{}".format(image_hash), response)
+
+    def get_result(self, image_hash: str, kind: str = "result") -> Optional[Dict]:
+        """ :param kind: "result" of a receipt or "pages" of a document with many pages, see analyze """
+        return self._get("{}/{}/{}".format(kind, self.version, image_hash))
+
+    def put_result(self, image_hash: str, result: Dict, kind: str = "result"):
+        self._put("{}/{}/{}".format(kind, self.version, image_hash), result)
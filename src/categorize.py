@@ -0,0 +1,197 @@
+import math
+import re
+from array import array
+from typing import Dict, Iterable, List, NamedTuple, Optional, Sequence
+
+import numpy as np
+
+from item import Item
+
+NGRAM = 3
+
+
+class Match(NamedTuple):
+    category: str
+    score: float  # cosine similarity of the tf-idf vectors, 1 for the same description
+    desc: str  # the known description that matched
+
+
+def normalize(desc: str) -> str:
+    return " {} ".format(re.sub(r"\s+", " ", desc.lower()).strip())
+
+
+def get_ngrams(desc: str, n: int = NGRAM) -> Dict[str, int]:
+    """ :return: the character n-grams of the normalized description with their counts """
+    text = normalize(desc)
+    counts: Dict[str, int] = {}
+    for i in range(max(1, len(text) - n + 1)):
+        gram = text[i:i + n]
+        counts[gram] = counts.get(gram, 0) + 1
+    return counts
+
+
+class Categorizer:
+    """
+    finds the most similar earlier item descriptions by an inverted index of their character trigrams,
+    weighted by tf-idf, and takes over their category.
+    Every distinct description is stored once, with how often it got which category.
+
+    The postings of the index are in arrays sorted by trigram (main) and in a list of recently added ones (delta).
+    A lookup merges the delta into the main arrays once it has grown to `merge_ratio` of them,
+    so adding a few items at a time stays cheap. The idf is taken from the counts at the last merge
+    for the norms of the descriptions, and from the current counts for the queries.
+    """
+
+    def __init__(self, merge_ratio: float = 0.1, max_postings: int = 100000):
+        """ :param max_postings: trigrams in more descriptions than this are too common to be looked up """
+        self.merge_ratio = merge_ratio
+        self.max_postings = max_postings
+
+        self.descs: List[str] = []
+        self.category_counts: List[Dict[str, int]] = []
+        self._desc_ids: Dict[str, int] = {}
+        self._gram_ids: Dict[str, int] = {}
+        self._df: List[int] = []  # number of descriptions with this trigram
+
+        # main postings, compressed by trigram: the postings of trigram g are at [_ptr[g], _ptr[g + 1])
+        self._ptr = np.zeros(1, dtype=np.int64)
+        self._docs = np.zeros(0, dtype=np.int64)
+        self._tfs = np.zeros(0, dtype=np.float64)
+        self._norms = np.zeros(0, dtype=np.float64)
+        # delta postings
+        self._delta_grams, self._delta_docs, self._delta_tfs = array("q"), array("q"), array("d")
+
+    def __len__(self):
+        return len(self.descs)
+
+    @classmethod
+    def from_export(cls, path: str, **kwargs) -> "Categorizer":
+        """ an index of all items with a category in an export (see export.ItemWriter) """
+        from export import iter_chunks
+        categorizer = cls(**kwargs)
+        for chunk in iter_chunks(path, ["desc", "category"]):
+            known = chunk["category"] != ""
+            categorizer.add(chunk["desc"][known], chunk["category"][known])
+        return categorizer
+
+    def add(self, descs: Iterable[str], categories: Iterable[str]):
+        """ add descriptions with their categories, they are found by the next lookup """
+        for desc, category in zip(descs, categories):
+            key = normalize(desc)
+            desc_id = self._desc_ids.get(key)
+            if desc_id is None:
+                desc_id = self._desc_ids[key] = len(self.descs)
+                self.descs.append(str(desc))
+                self.category_counts.append({})
+                for gram, tf in get_ngrams(desc).items():
+                    gram_id = self._gram_ids.get(gram)
+                    if gram_id is None:
+                        gram_id = self._gram_ids[gram] = len(self._df)
+                        self._df.append(0)
+                    self._df[gram_id] += 1
+                    self._delta_grams.append(gram_id)
+                    self._delta_docs.append(desc_id)
+                    self._delta_tfs.append(tf)
+            counts = self.category_counts[desc_id]
+            counts[str(category)] = counts.get(str(category), 0) + 1
+
+    def category(self, desc_id: int) -> str:
+        """ the category a description got most often, the first one on a tie """
+        counts = self.category_counts[desc_id]
+        return max(counts, key=counts.get)
+
+    def _idf(self) -> np.ndarray:
+        return np.log((len(self.descs) + 1) / (np.array(self._df, dtype=np.float64) + 1)) + 1
+
+    def _get_delta(self):
+        return (np.frombuffer(self._delta_grams, dtype=np.int64), np.frombuffer(self._delta_docs, dtype=np.int64),
+                np.frombuffer(self._delta_tfs, dtype=np.float64))
+
+    def _merge(self):
+        """ move the delta into the main arrays and compute the norms of all descriptions with the current idf """
+        delta_grams, delta_docs, delta_tfs = self._get_delta()
+        grams = np.concatenate([np.repeat(np.arange(len(self._ptr) - 1), np.diff(self._ptr)), delta_grams])
+        docs = np.concatenate([self._docs, delta_docs])
+        tfs = np.concatenate([self._tfs, delta_tfs])
+        order = np.argsort(grams, kind="stable")
+        self._docs, self._tfs = docs[order], tfs[order]
+        self._ptr = np.searchsorted(grams[order], np.arange(len(self._df) + 1)).astype(np.int64)
+        weights = tfs * self._idf()[grams]
+        self._norms = np.sqrt(np.bincount(docs, weights ** 2, minlength=len(self.descs)))
+        self._delta_grams, self._delta_docs, self._delta_tfs = array("q"), array("q"), array("d")
+
+    def lookup(self, descs: Sequence[str], min_score: float = 0.5) -> List[Optional[Match]]:
+        """
+        find the most similar known description for all descriptions (e.g. of a receipt) at once
+        :return: per description the match, or None if there is none with at least min_score
+        """
+        if len(self._delta_docs) > self.merge_ratio * len(self._docs):
+            self._merge()
+        if len(self.descs) == 0 or len(descs) == 0:
+            return [None] * len(descs)
+        idf = self._idf()
+
+        # the known trigrams of all queries, unknown ones only count for the norm (with the idf of df = 0)
+        unknown_idf = math.log(len(self.descs) + 1) + 1
+        query_ids, gram_ids, query_tfs = [], [], []
+        query_norms = np.zeros(len(descs))
+        for query_id, desc in enumerate(descs):
+            for gram, tf in get_ngrams(desc).items():
+                gram_id = self._gram_ids.get(gram)
+                query_norms[query_id] += (tf * (unknown_idf if gram_id is None else idf[gram_id])) ** 2
+                if gram_id is not None and self._df[gram_id] <= self.max_postings:
+                    query_ids.append(query_id)
+                    gram_ids.append(gram_id)
+                    query_tfs.append(tf)
+        query_norms = np.sqrt(query_norms)
+        query_ids, gram_ids = np.array(query_ids, dtype=np.int64), np.array(gram_ids, dtype=np.int64)
+        query_weights = np.array(query_tfs, dtype=np.float64) * idf[gram_ids]
+
+        # all postings of these trigrams in the main arrays, trigrams that are only in the delta have none
+        ptr = np.concatenate([self._ptr, np.full(len(self._df) + 1 - len(self._ptr), self._ptr[-1])])
+        starts, ends = ptr[gram_ids], ptr[gram_ids + 1]
+        lengths = ends - starts
+        pairs = np.repeat(np.arange(len(gram_ids)), lengths)
+        positions = np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths) - lengths, lengths) + starts[pairs]
+        hit_queries, hit_docs = query_ids[pairs], self._docs[positions]
+        hit_weights = query_weights[pairs] * self._tfs[positions] * idf[gram_ids[pairs]]
+        norms = self._norms
+        if len(self._delta_docs) > 0:
+            delta_grams, delta_docs, delta_tfs = self._get_delta()
+            delta_weights = delta_tfs * idf[delta_grams]
+            norms = np.concatenate([norms, np.zeros(len(self.descs) - len(norms))])
+            new_docs = np.unique(delta_docs)
+            norms[new_docs] = np.sqrt(np.bincount(delta_docs, delta_weights ** 2, minlength=len(self.descs)))[new_docs]
+            # join the delta with the trigrams of the queries
+            order = np.argsort(gram_ids, kind="stable")
+            sorted_grams = gram_ids[order]
+            lo = np.searchsorted(sorted_grams, delta_grams, side="left")
+            hi = np.searchsorted(sorted_grams, delta_grams, side="right")
+            delta_pairs = np.repeat(np.arange(len(delta_grams)), hi - lo)
+            matched = order[np.arange((hi - lo).sum()) - np.repeat(np.cumsum(hi - lo) - (hi - lo), hi - lo)
+                            + lo[delta_pairs]]
+            hit_queries = np.concatenate([hit_queries, query_ids[matched]])
+            hit_docs = np.concatenate([hit_docs, delta_docs[delta_pairs]])
+            hit_weights = np.concatenate([hit_weights, query_weights[matched] * delta_weights[delta_pairs]])
+
+        # sum up the dot products of each (query, description) and take the best description per query
+        keys, inverse = np.unique(hit_queries * len(self.descs) + hit_docs, return_inverse=True)
+        scores = np.bincount(inverse, hit_weights, minlength=len(keys))
+        key_queries, key_docs = keys // len(self.descs), keys % len(self.descs)
+        scores = scores / np.maximum(query_norms[key_queries] * norms[key_docs], 1e-12)
+        order = np.lexsort((key_docs, -scores, key_queries))  # the first description wins a tie
+        first = order[np.r_[True, key_queries[order][1:] != key_queries[order][:-1]]] if len(order) > 0 else order
+
+        matches: List[Optional[Match]] = [None] * len(descs)
+        for key in first:
+            if scores[key] >= min_score:
+                desc_id = int(key_docs[key])
+                matches[int(key_queries[key])] = Match(self.category(desc_id), float(min(1., scores[key])),
+                                                       self.descs[desc_id])
+        return matches
+
+    def categorize(self, items: List[Item], min_score: float = 0.5):
+        """ set the category of the items, e.g. receipt.items, that are similar enough to a known description """
+        for item, match in zip(items, self.lookup([item.desc for item in items], min_score)):
+            if match is not None:
+                item.category = match.category
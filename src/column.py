@@ -1,17 +1,42 @@
+from typing import List, Optional, Tuple
+
+import numpy as np
+
 from block import Block
-from util import rotate_point, avg
+from util import rotate_points
 
 
 class Column:
+    __slots__ = ("prices", "_rotated_x")
+
     def __init__(self, price: Block):
         self.prices = [price]
+        self._rotated_x: Optional[Tuple[float, float]] = None  # (angle, rotated x) of the last calculation
+
+    @classmethod
+    def from_prices(cls, prices: List[Block], angle: float, rotated_x: float) -> "Column":
+        """ create a column whose rotated x for the given angle is already known """
+        column = cls(prices[0])
+        column.prices.extend(prices[1:])
+        column._rotated_x = angle, rotated_x
+        return column
 
     def add(self, price: Block):
         self.prices.append(price)
+        self._rotated_x = None
 
     def get_rotated_x(self, angle):
-        rotated_points = [rotate_point(-angle, price.top_right) for price in self.prices]
-        return avg([point[0] for point in rotated_points])
+        if self._rotated_x is None or self._rotated_x[0] != angle:
+            top_rights = np.array([price.top_right for price in self.prices])
+            self._rotated_x = angle, float(np.mean(rotate_points(-angle, top_rights)[:, 0]))
+        return self._rotated_x[1]
+
+    def __eq__(self, other):
+        """ columns of the same prices are equal, so find_items doesn't run again if the same columns are found """
+        return isinstance(other, Column) and \
+            [price.idx for price in self.prices] == [price.idx for price in other.prices]
+
+    __hash__ = None
 
     def __repr__(self):
         return "`{}´".format(";".join([price.text[:6] for price in self.prices[:5]]))
@@ -0,0 +1,242 @@
+import argparse
+import glob
+import io
+import os
+import tempfile
+from multiprocessing import Pool
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from batch import Document, find_documents, get_name, load_receipt
+from receipt import Receipt
+
+# name, dtype and shape of a row of every exported column
+COLUMNS = (
+    ("receipt_id", str, ()),
+    ("desc", str, ()),
+    ("price_cents", np.int64, ()),
+    ("category", str, ()),  # empty if the item has no category
+    ("desc_polygon", np.float32, (4, 2)),  # in the coordinates of the image, see Geometry
+    ("price_polygon", np.float32, (4, 2)),
+    ("desc_confidence", np.float32, ()),
+    ("price_confidence", np.float32, ()),
+)
+FORMATS = ("npz", "parquet")
+
+
+def item_columns(receipt: Receipt, receipt_id: str) -> Dict[str, np.ndarray]:
+    """ :return: the items of an analyzed receipt as one array per column """
+    desc_idx = np.array([item.desc_block.idx for item in receipt.items], dtype=int)
+    price_idx = np.array([item.price_block.idx for item in receipt.items], dtype=int)
+    return {
+        "receipt_id": np.array([receipt_id] * len(receipt.items), dtype=str),
+        "desc": np.array([item.desc for item in receipt.items], dtype=str),
+        "price_cents": np.array([item.price_block.cents for item in receipt.items], dtype=np.int64),
+        "category": np.array([item.category or "" for item in receipt.items], dtype=str),
+        "desc_polygon": receipt.geometry.poly[desc_idx].astype(np.float32).reshape(-1, 4, 2),
+        "price_polygon": receipt.geometry.poly[price_idx].astype(np.float32).reshape(-1, 4, 2),
+        "desc_confidence": receipt.table.confs[desc_idx].astype(np.float32),
+        "price_confidence": receipt.table.confs[price_idx].astype(np.float32),
+    }
+
+
+def concatenate(chunks: Sequence[Dict[str, np.ndarray]], columns: Optional[Sequence[str]] = None) \
+        -> Dict[str, np.ndarray]:
+    columns = columns or [name for name, _, _ in COLUMNS]
+    if len(chunks) == 0:
+        return {name: np.zeros((0,) + shape, dtype=dtype) for name, dtype, shape in COLUMNS if name in columns}
+    return {name: np.concatenate([chunk[name] for chunk in chunks]) for name in columns}
+
+
+class ItemWriter:
+    """
+    writes the items of many receipts into a folder, in parts of about `chunk_size` items:
+    part-00000.npz, part-00001.npz, ... A new writer on the same folder appends new parts after the existing ones.
+    Use it as context manager or call close(), otherwise the last items are not written.
+    """
+
+    def __init__(self, path: str, chunk_size: int = 100000, file_format: str = "npz"):
+        if file_format not in FORMATS:
+            raise ValueError("Unknown format {}, use one of {}".format(file_format, FORMATS))
+        if file_format == "parquet":
+            _import_pyarrow()
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        self.chunk_size = chunk_size
+        self.file_format = file_format
+        # after the last part, even if earlier ones were deleted
+        self.part = max(map(_part_number, _part_paths(path)), default=-1) + 1
+        self._chunks: List[Dict[str, np.ndarray]] = []
+        self._rows = 0
+
+    def add(self, columns: Dict[str, np.ndarray]):
+        """ :param columns: e.g. from item_columns """
+        self._chunks.append(columns)
+        self._rows += len(columns["desc"])
+        if self._rows >= self.chunk_size:
+            self.flush()
+
+    def add_receipt(self, receipt: Receipt, receipt_id: str):
+        self.add(item_columns(receipt, receipt_id))
+
+    def flush(self):
+        if self._rows == 0:
+            return
+        columns = concatenate(self._chunks)
+        fd, tmp_path = tempfile.mkstemp(suffix=".tmp", dir=self.path)
+        try:
+            if self.file_format == "npz":
+                with os.fdopen(fd, "wb") as f:
+                    np.savez(f, **columns)
+            else:
+                os.close(fd)
+                _write_parquet(tmp_path, columns)
+            # a reader never sees half a part, and a link is never created over an existing part,
+            # so writers that append to the same folder at once take the next free number instead
+            while True:
+                path = os.path.join(self.path, "part-{:05d}.{}".format(self.part, self.file_format))
+                try:
+                    os.link(tmp_path, path)
+                    break
+                except FileExistsError:
+                    self.part += 1
+        finally:
+            os.remove(tmp_path)
+        self.part += 1
+        self._chunks, self._rows = [], 0
+
+    def close(self):
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+def iter_chunks(path: str, columns: Optional[Sequence[str]] = None) -> Iterator[Dict[str, np.ndarray]]:
+    """
+    yields the parts of an export one after another, so that millions of items can be scanned
+    without holding all of them in memory.
+    :param columns: only load these columns, all by default
+    """
+    for part_path in _part_paths(path):
+        if part_path.endswith(".npz"):
+            with np.load(part_path, allow_pickle=False) as data:
+                yield {name: data[name] for name in (columns or data.files)}
+        else:
+            yield _read_parquet(part_path, columns)
+
+
+def load_items(path: str, columns: Optional[Sequence[str]] = None) -> Dict[str, np.ndarray]:
+    """ :return: all items of an export as one array per column """
+    return concatenate(list(iter_chunks(path, columns)), columns)
+
+
+def _part_number(part_path: str) -> int:
+    return int(os.path.basename(part_path)[len("part-"):].split(".")[0])
+
+
+def _part_paths(path: str) -> List[str]:
+    return sorted((part_path for file_format in FORMATS
+                   for part_path in glob.glob(os.path.join(path, "part-*.{}".format(file_format)))), key=_part_number)
+
+
+def _import_pyarrow():
+    """ pyarrow is only needed for parquet files, it is not installed on the lambda """
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        raise ImportError("Writing and reading parquet files needs pyarrow (pip install pyarrow), use npz instead")
+    return pyarrow, pyarrow.parquet
+
+
+def _write_parquet(path: str, columns: Dict[str, np.ndarray]):
+    pa, pq = _import_pyarrow()
+    arrays = {}
+    for name, values in columns.items():
+        if values.ndim > 1:
+            # e.g. a polygon becomes a list of 8 floats
+            flat = values.reshape(len(values), -1)
+            arrays[name] = pa.FixedSizeListArray.from_arrays(pa.array(flat.ravel()), flat.shape[1])
+        else:
+            arrays[name] = pa.array(values.tolist() if values.dtype.kind == "U" else values)
+    with io.open(path, "wb") as f:
+        pq.write_table(pa.table(arrays), f)
+
+
+def _read_parquet(path: str, columns: Optional[Sequence[str]] = None) -> Dict[str, np.ndarray]:
+    _, pq = _import_pyarrow()
+    table = pq.read_table(path, columns=None if columns is None else list(columns))
+    result = {}
+    for name, dtype, shape in COLUMNS:
+        if name not in table.column_names:
+            continue
+        column = table.column(name)
+        if len(shape) > 0:
+            values = np.concatenate([chunk.flatten().to_numpy() for chunk in column.chunks]) \
+                if column.num_chunks > 0 else np.zeros(0)
+            result[name] = values.astype(dtype).reshape((-1,) + shape)
+        else:
+            result[name] = np.array(column.to_pylist(), dtype=dtype)
+    return result
+
+
+def _analyze_columns(numbered_document: Tuple[int, Document]) \
+        -> Tuple[str, Optional[Dict[str, np.ndarray]], Optional[str]]:
+    """ :return: the name, the items and an error of a document, runs in a worker of export_documents """
+    name = get_name(numbered_document)
+    try:
+        receipt = load_receipt(numbered_document)
+        receipt.analyze()
+        return name, item_columns(receipt, name), None
+    except Exception as e:
+        return name, None, "{}: {}".format(type(e).__name__, e)
+
+
+def export_documents(documents: Iterable[Document], path: str, processes: Optional[int] = None,
+                     chunk_size: int = 100000, file_format: str = "npz") -> Dict[str, str]:
+    """
+    analyze the documents across a pool of worker processes (see batch.analyze_batch) and append their items
+    to the export in `path`.
+    :return: the errors of the documents that could not be analyzed by their name
+    """
+    errors = {}
+
+    def write(results):
+        for name, columns, error in results:
+            if error is not None:
+                errors[name] = error
+            else:
+                writer.add(columns)
+
+    with ItemWriter(path, chunk_size, file_format) as writer:
+        numbered_documents = enumerate(documents)
+        if processes == 1:
+            write(map(_analyze_columns, numbered_documents))
+        else:
+            with Pool(processes) as pool:
+                write(pool.imap(_analyze_columns, numbered_documents, 8))
+    return errors
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export the items of many receipts for bulk analytics")
+    parser.add_argument("paths", nargs="+",
+                        help="apiResponse.json files or directories containing <name>/apiResponse.json")
+    parser.add_argument("--output", required=True, help="folder of the export, new parts are appended")
+    parser.add_argument("--format", default="npz", choices=FORMATS)
+    parser.add_argument("--chunk_size", type=int, default=100000, help="items per part")
+    parser.add_argument("--processes", type=int, default=None,
+                        help="number of worker processes, defaults to the number of CPUs")
+    args = parser.parse_args()
+
+    paths = []
+    for path in args.paths:
+        paths.extend(find_documents(path) if os.path.isdir(path) else [path])
+    for document_name, document_error in export_documents(paths, args.output, args.processes, args.chunk_size,
+                                                          args.format).items():
+        print("[{}] {}".format(document_name, document_error))
@@ -0,0 +1,33 @@
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+
+class Geometry:
+    """
+    holds the polygons of many blocks in one (N, 4, 2) array.
+    The corners are ordered like textract returns them:
+        0: top-left, 1: top-right, 2: bottom-right, 3: bottom-left
+    Edge midpoints and centers are computed once for all blocks, a Block only keeps its row index.
+    """
+
+    def __init__(self, poly: np.ndarray):
+        self.poly = poly
+        self.left_center = (poly[:, 0] + poly[:, 3]) / 2
+        self.right_center = (poly[:, 1] + poly[:, 2]) / 2
+        self.center = (self.left_center + self.right_center) / 2
+
+    @classmethod
+    def from_polygons(cls, polygons: List[List[Tuple[float, float]]]) -> "Geometry":
+        return cls(np.array(polygons, dtype=float).reshape(-1, 4, 2))
+
+    @classmethod
+    def from_json(cls, blocks_json: List[Dict]) -> "Geometry":
+        return cls.from_polygons([get_polygon(block_json) for block_json in blocks_json])
+
+    def __len__(self):
+        return len(self.poly)
+
+
+def get_polygon(block_json: Dict) -> List[Tuple[float, float]]:
+    return [(p["X"], p["Y"]) for p in block_json["Geometry"]["Polygon"]]
@@ -4,18 +4,29 @@ from typing import Dict, Optional
 import matplotlib.figure
 import matplotlib.pyplot as plt
 import numpy as np
+from matplotlib.backends.backend_agg import FigureCanvasAgg
 from matplotlib.patches import Polygon
 
 from receipt import Receipt
 
 
 class Instance:
+    # the size of the canvas of a headless instance without image, textract coordinates are relative anyway
+    CANVAS_SHAPE = (1400, 1000)
+
     def __init__(self, receipt: Receipt, expected: Dict,
-                 im: Optional[np.ndarray] = None):
+                 im: Optional[np.ndarray] = None, headless: bool = False,
+                 fig: Optional[matplotlib.figure.Figure] = None):
+        """
+        :param headless: draw without a display, the drawings are only saved (see save, save_overlays).
+        The image may be None then, the drawings are on a white canvas.
+        :param fig: reuse this figure instead of creating a new one, e.g. one per process when rendering many receipts
+        """
         self.receipt = receipt
         self.expected = expected
         self.im = im
-        self._fig, self._ax, self._w, self._h = None, None, None, None
+        self.headless = headless
+        self._fig, self._ax, self._w, self._h = fig, None, None, None
 
     @property
     def fig(self):
@@ -38,31 +49,97 @@ class Instance:
         return self._h
 
     def _create_fig_if_necessary(self):
-        if self._fig is not None:
+        if self._ax is not None:
             return
-        if self.im is None:
+        if self.im is None and not self.headless:
             raise ValueError("No value for parameter 'im' was set")
-        self._fig: matplotlib.figure.Figure = plt.figure(self.receipt.name)
-        self._ax: matplotlib.figure.Axes = self._fig.add_subplot(111)
-        self._ax.imshow(self.im)
-        self._h: float = self.im.shape[0]
-        self._w: float = self.im.shape[1]
+        self._h, self._w = self.CANVAS_SHAPE if self.im is None else self.im.shape[:2]
+        if not self.headless:
+            self._fig: matplotlib.figure.Figure = plt.figure(self.receipt.name)
+            self._ax: matplotlib.figure.Axes = self._fig.add_subplot(111)
+            self._ax.imshow(self.im)
+            return
+
+        # not registered with pyplot, so it needs no display and is freed with the instance.
+        # One pixel of the image is one pixel of the figure and the axes fill it.
+        if self._fig is None:
+            self._fig = matplotlib.figure.Figure()
+        FigureCanvasAgg(self._fig)
+        self._fig.clear()
+        self._fig.set_dpi(100)
+        self._fig.set_size_inches(self._w / 100, self._h / 100)
+        self._ax = self._fig.add_axes([0, 0, 1, 1])
+        if self.im is not None:
+            self._ax.imshow(self.im, interpolation="none")
+        self._ax.set_xlim(0, self._w)
+        self._ax.set_ylim(self._h, 0)
+        self._ax.set_axis_off()
+
+    def show(self):
+        if not self.headless:
+            self.fig.show()
+
+    def save(self, path: str):
+        """ save what was drawn, e.g. as png """
+        self.fig.savefig(path)
+
+    def save_overlays(self, paths: Dict[str, str]):
+        """
+        headless only: save each drawing on its own copy of the image, e.g. {"items": "items.png"} saves draw_items.
+        The image is drawn once, and restored before each drawing instead of being drawn again.
+        """
+        canvas = self.fig.canvas
+        canvas.draw()
+        background = canvas.copy_from_bbox(self.fig.bbox)
+        for drawing, path in paths.items():
+            canvas.restore_region(background)
+            existing = set(self.ax.get_children())
+            getattr(self, "draw_{}".format(drawing))()
+            artists = [artist for artist in self.ax.get_children() if artist not in existing]
+            for artist in artists:
+                self.ax.draw_artist(artist)
+            plt.imsave(path, np.asarray(canvas.buffer_rgba()))
+            for artist in artists:
+                artist.remove()
+
+    def close(self):
+        """ release the figure, a pyplot figure is kept by pyplot until it is closed """
+        if self._fig is not None and not self.headless:
+            plt.close(self._fig)
+        self._fig, self._ax = None, None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
 
     def draw_angle(self):
         self.ax.arrow(self.w / 2, self.h / 2, math.cos(self.receipt.angle) * self.w / 10,
                       math.sin(self.receipt.angle) * self.h / 10,
                       head_width=0.02 * self.h, head_length=0.05 * self.w, fc='k', ec='k')
 
+    def draw_words(self):
+        """ the text of all words where they were found, e.g. for a white canvas instead of the image """
+        for word in self.receipt.words:
+            (x, y), (_, bottom) = word.top_left, word.bottom_left
+            self.ax.text(x * self.w, y * self.h, word.text, color="0.5", va="top", clip_on=True,
+                         fontsize=max(1., (bottom - y) * self.h * 72 / self.fig.dpi * 0.8))
+
     def draw_prices(self):
+        if len(self.receipt.prices) == 0:
+            return
         x, y = zip(*[price[1] for price in self.receipt.prices])
 
         self.ax.plot(np.array(x) * self.w, np.array(y) * self.h, "bo")
 
     def draw_total(self):
+        if self.receipt.total_desc is None:
+            return
         polygon = Polygon(np.array([self.receipt.total_desc[i] for i in range(4)])
                           * np.array([self.w, self.h]), closed=True)
         self.ax.plot(polygon.xy[:, 0], polygon.xy[:, 1], color='#6699cc', alpha=0.7, linewidth=3)
-        self.fig.show()
+        self.show()
 
     def draw_columns(self):
         number_of_columns = len(self.receipt.columns)
@@ -89,7 +166,7 @@ class Instance:
                 polygon = Polygon(np.array([block[i] for i in range(4)])
                                   * np.array([self.w, self.h]), closed=True)
                 self.ax.plot(polygon.xy[:, 0], polygon.xy[:, 1], color='#6699cc', alpha=0.7, linewidth=3)
-        self.fig.show()
+        self.show()
 
     def draw(self):
         self.draw_angle()
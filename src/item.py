@@ -1,20 +1,28 @@
+from typing import Optional
+
 from block import Block
 
 
 class Item:
-    def __init__(self, desc: Block, price: Block):
+    __slots__ = ("desc_block", "price_block", "desc", "price", "category")
+
+    def __init__(self, desc: Block, price: Block, category: Optional[str] = None):
         self.desc_block = desc
         self.price_block = price
 
         self.desc = desc.text
         self.price = price.price
+        self.category = category
 
     @property
     def json(self):
-        return {
+        result = {
             "desc": self.desc,
             "price": self.price,
         }
+        if self.category is not None:
+            result["category"] = self.category
+        return result
 
     def __repr__(self):
         return "<{}:{}>".format(self.desc, self.price)
@@ -0,0 +1,97 @@
+from functools import lru_cache
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from metrics import Metrics, NULL_METRICS
+
+
+class Keyword:
+    """
+    a keyword compiled for bit-parallel LCS computation (Hyyrö 2004):
+    bit i of masks[c] is set if the i-th character of the keyword is c.
+    """
+
+    def __init__(self, text: str):
+        self.text = text
+        self.masks: Dict[str, int] = {}
+        for i, char in enumerate(text):
+            self.masks[char] = self.masks.get(char, 0) | (1 << i)
+        self.full = (1 << len(text)) - 1
+
+    def __len__(self):
+        return len(self.text)
+
+    def lcs(self, word: str) -> int:
+        """ :return: the length of the longest common subsequence of the keyword and word """
+        v = self.full
+        for char in word:
+            u = v & self.masks.get(char, 0)
+            v = ((v + u) | (v - u)) & self.full
+        return len(self.text) - bin(v).count("1")
+
+    def ratio(self, word: str) -> int:
+        """
+        :return: the similarity between keyword and word in percent, 2 * LCS / (len(keyword) + len(word)).
+        This is what fuzzywuzzy.fuzz.ratio returns when python-Levenshtein is installed.
+        """
+        if word == self.text:
+            return 100
+        if len(word) == 0 or len(self.text) == 0:
+            return 0
+        return to_percent(2 * self.lcs(word), len(word) + len(self.text))
+
+
+def to_percent(numerator: int, denominator: int) -> int:
+    """ rounds like fuzzywuzzy does """
+    return int(round(100 * numerator / denominator))
+
+
+class KeywordMatcher:
+    """
+    finds the word that matches best to keywords that are given by priority.
+    Only words whose length allows a ratio above the threshold are compared,
+    and the comparison of a keyword stops as soon as a word matches it exactly.
+    """
+
+    def __init__(self, keywords: Sequence[str]):
+        self.keywords = [Keyword(keyword) for keyword in keywords]
+
+    def match(self, texts: Sequence[str], threshold: int,
+              metrics: Metrics = NULL_METRICS) -> Tuple[Optional[int], int]:
+        """
+        :param texts: the words, already lower case
+        :param threshold: a match needs a ratio above this value
+        :param metrics: counts the keyword comparisons
+        :return: the index of the best matching word for the first keyword that has any match and its ratio,
+        (None, 0) if no word matches any keyword. On equal ratios the first word wins.
+        """
+        by_length: Dict[int, List[int]] = {}
+        for idx, text in enumerate(texts):
+            by_length.setdefault(len(text), []).append(idx)
+
+        comparisons = 0
+        for keyword in self.keywords:
+            best_idx, best_ratio = None, 0
+            for length in sorted(by_length):
+                # even if all characters of the shorter string match, the ratio would be too low
+                if to_percent(2 * min(length, len(keyword)), length + len(keyword)) <= threshold:
+                    continue
+                for idx in by_length[length]:
+                    if best_idx is not None and best_ratio == 100 and idx > best_idx:
+                        break
+                    ratio = keyword.ratio(texts[idx])
+                    comparisons += 1
+                    if ratio > threshold and (best_idx is None or ratio > best_ratio or
+                                              (ratio == best_ratio and idx < best_idx)):
+                        best_idx, best_ratio = idx, ratio
+            if best_idx is not None:
+                # iterate through keywords by priority if the first one is found -> break.
+                metrics.count("keyword_comparisons", comparisons)
+                return best_idx, best_ratio
+        metrics.count("keyword_comparisons", comparisons)
+        return None, 0
+
+
+@lru_cache(maxsize=16)
+def get_matcher(keywords: Tuple[str, ...]) -> KeywordMatcher:
+    """ the compiled matcher for a tuple of keywords, built only once """
+    return KeywordMatcher(keywords)
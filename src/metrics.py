@@ -0,0 +1,80 @@
+import json
+import time
+from typing import Dict, Optional
+
+
+class Metrics:
+    """
+    timers (in seconds) and counters of one analysis.
+    Code that needs extra work to compute a value should check `enabled` first.
+    """
+    enabled = True
+
+    def __init__(self, dimensions: Optional[Dict[str, str]] = None):
+        """ :param dimensions: e.g. {"function": "analyze"}, attached to the emitted metrics """
+        self.dimensions = dimensions or {}
+        self.timings: Dict[str, float] = {}
+        self.counters: Dict[str, int] = {}
+
+    @staticmethod
+    def now() -> float:
+        return time.perf_counter()
+
+    def time(self, name: str, start: float):
+        """ add the time since `start` (a value of now()) to the timer `name` """
+        self.timings[name] = self.timings.get(name, 0.) + time.perf_counter() - start
+
+    def count(self, name: str, value: int = 1):
+        self.counters[name] = self.counters.get(name, 0) + value
+
+    @property
+    def json(self) -> Dict:
+        return {
+            "timings_ms": {name: seconds * 1000 for name, seconds in self.timings.items()},
+            "counters": dict(self.counters),
+        }
+
+    def emit(self, namespace: str = "pennydetective"):
+        """
+        print the metrics as one JSON line in the CloudWatch embedded metric format,
+        so that they become CloudWatch metrics without any API call from the lambda.
+        The lambda runtime forwards stdout unchanged, its log handler would prefix the line and CloudWatch
+        only extracts metrics from lines that are exactly the JSON object.
+        """
+        values = {"{}_ms".format(name): seconds * 1000 for name, seconds in self.timings.items()}
+        values.update(self.counters)
+        record = {
+            "_aws": {
+                "Timestamp": int(time.time() * 1000),
+                "CloudWatchMetrics": [{
+                    "Namespace": namespace,
+                    "Dimensions": [list(self.dimensions.keys())],
+                    "Metrics": [{"Name": name, "Unit": "Milliseconds" if name.endswith("_ms") else "Count"}
+                                for name in values],
+                }],
+            },
+        }
+        record.update(self.dimensions)
+        record.update(values)
+        print(json.dumps(record), flush=True)
+
+
+class NullMetrics(Metrics):
+    """ used when instrumentation is disabled, all methods do nothing """
+    enabled = False
+
+    @staticmethod
+    def now() -> float:
+        return 0.
+
+    def time(self, name: str, start: float):
+        pass
+
+    def count(self, name: str, value: int = 1):
+        pass
+
+    def emit(self, namespace: str = "pennydetective"):
+        pass
+
+
+NULL_METRICS = NullMetrics()
@@ -0,0 +1,126 @@
+import asyncio
+from concurrent.futures import Executor
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from receipt import Receipt
+
+
+def get_page(block_json: Dict) -> int:
+    """ the response of detect_document_text has no page numbers, it has only one page """
+    return block_json.get("Page", 1)
+
+
+class PageSplitter:
+    """
+    groups the blocks of a textract response by page, while the responses of an asynchronous job arrive.
+    Textract returns the blocks ordered by page, so a page is complete as soon as a block of a later page arrives.
+    """
+
+    def __init__(self):
+        self.page: Optional[int] = None
+        self.blocks: List[Dict] = []
+        self.done: set = set()
+
+    def feed(self, blocks: Iterable[Dict]) -> Iterator[Tuple[int, List[Dict]]]:
+        """ :return: (page, blocks) of the pages that are complete now """
+        for block in blocks:
+            page = get_page(block)
+            if page != self.page:
+                if page in self.done:
+                    raise ValueError("The blocks of page {} are not in one piece".format(page))
+                if self.page is not None:
+                    yield self._finish()
+                self.page = page
+            self.blocks.append(block)
+
+    def close(self) -> Iterator[Tuple[int, List[Dict]]]:
+        """ :return: the last page """
+        if self.page is not None:
+            yield self._finish()
+
+    def _finish(self) -> Tuple[int, List[Dict]]:
+        page, blocks = self.page, self.blocks
+        self.done.add(page)
+        self.page, self.blocks = None, []
+        return page, blocks
+
+
+def split_pages(blocks: Iterable[Dict]) -> Iterator[Tuple[int, List[Dict]]]:
+    splitter = PageSplitter()
+    yield from splitter.feed(blocks)
+    yield from splitter.close()
+
+
+def analyze_page(numbered_page: Tuple[int, List[Dict]]) -> Dict:
+    """
+    analyze the blocks of a single page like a receipt of its own,
+    an error is returned instead of raised so that the other pages are still merged.
+    """
+    # the spellchecker and templates of the lambda, loaded once per process (pages may be analyzed in other processes)
+    from analyze import prepare_receipt
+    page, blocks = numbered_page
+    try:
+        receipt = prepare_receipt(Receipt({"Blocks": blocks}, name="page {}".format(page)))
+        receipt.analyze()
+        return {"page": page, "result": receipt.get_json()}
+    except Exception as e:
+        return {"page": page, "error": "{}: {}".format(type(e).__name__, e)}
+
+
+def merge_results(page_results: List[Dict]) -> Dict:
+    """
+    one result for all pages: the items of all pages in page order, each with its page,
+    and the total of the last page that has one (the total of an invoice is at its end).
+    """
+    result = {"total": None, "items": [], "pages": len(page_results)}
+    errors = {}
+    for page_result in sorted(page_results, key=lambda page_result_: page_result_["page"]):
+        if "error" in page_result:
+            errors[str(page_result["page"])] = page_result["error"]
+            continue
+        for item in page_result["result"]["items"]:
+            item = dict(item)
+            item["page"] = page_result["page"]
+            result["items"].append(item)
+        if page_result["result"]["total"] is not None:
+            result["total"] = page_result["result"]["total"]
+    if len(errors) > 0:
+        result["errors"] = errors
+    return result
+
+
+def analyze_pages(response: Dict, executor: Optional[Executor] = None) -> Dict:
+    """
+    analyze every page of a complete textract response and merge the results
+    :param executor: e.g. a ProcessPoolExecutor to analyze the pages in parallel, in this process if None
+    """
+    pages = split_pages(response["Blocks"])
+    page_results = list(map(analyze_page, pages) if executor is None else executor.map(analyze_page, pages))
+    return merge_results(page_results)
+
+
+async def analyze_job(textract, job_id: str, executor: Optional[Executor] = None, poll_interval: float = 1.) -> Dict:
+    """
+    fetch the responses of an asynchronous textract job and analyze each page as soon as all its blocks arrived,
+    while the next responses are fetched.
+    :param textract: a textract.AsyncTextract
+    :param executor: where the pages are analyzed, a ProcessPoolExecutor analyzes them in parallel.
+    By default the thread pool of the event loop: fetching and analyzing overlap, but the analysis holds the GIL,
+    so the pages are analyzed one after another.
+    """
+    loop = asyncio.get_event_loop()
+    splitter = PageSplitter()
+    analyses = []
+    async for response in textract.iter_document_text(job_id, poll_interval):
+        for page in splitter.feed(response["Blocks"]):
+            analyses.append(loop.run_in_executor(executor, analyze_page, page))
+    for page in splitter.close():
+        analyses.append(loop.run_in_executor(executor, analyze_page, page))
+    return merge_results(list(await asyncio.gather(*analyses)))
+
+
+async def analyze_document(textract, document: str, executor: Optional[Executor] = None,
+                           poll_interval: float = 1.) -> Dict:
+    """ start an asynchronous textract job for a document in the bucket and analyze its pages, see analyze_job """
+    job_id = await textract.start_document_text_detection(document)
+    return await analyze_job(textract, job_id, executor, poll_interval)
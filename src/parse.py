@@ -0,0 +1,99 @@
+import codecs
+import json
+from typing import Dict, IO, Iterator, Union
+
+CHUNK_SIZE = 1 << 16
+_decoder = json.JSONDecoder()
+_WHITESPACE = " \t\n\r"
+
+
+class _Reader:
+    """ a growing text buffer over a file object, that may return str or bytes """
+
+    def __init__(self, fp: IO, chunk_size: int = CHUNK_SIZE):
+        self.fp = fp
+        self.chunk_size = chunk_size
+        self.buffer = ""
+        self.pos = 0
+        self.eof = False
+        self._bytes_decoder = codecs.getincrementaldecoder("utf-8")()
+
+    def read_more(self) -> bool:
+        """ append the next chunk to the buffer, drop what was already consumed. :return: False at the end """
+        if self.eof:
+            return False
+        chunk = self.fp.read(self.chunk_size)
+        if isinstance(chunk, bytes):
+            chunk = self._bytes_decoder.decode(chunk, final=len(chunk) == 0)
+        if len(chunk) == 0:
+            self.eof = True
+            return False
+        self.buffer = self.buffer[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def skip_whitespace(self):
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos] in _WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.buffer) or not self.read_more():
+                return
+
+    def peek(self) -> str:
+        self.skip_whitespace()
+        if self.pos >= len(self.buffer):
+            raise ValueError("Unexpected end of the textract response")
+        return self.buffer[self.pos]
+
+    def expect(self, char: str):
+        if self.peek() != char:
+            raise ValueError("Expected '{}' at '{}'".format(char, self.buffer[self.pos:self.pos + 20]))
+        self.pos += 1
+
+    def value(self):
+        """ decode the next complete JSON value, read more until it is complete """
+        self.skip_whitespace()
+        while True:
+            try:
+                value, end = _decoder.raw_decode(self.buffer, self.pos)
+            except json.JSONDecodeError:
+                if self.read_more():
+                    continue
+                raise
+            # a number at the end of the buffer might continue in the next chunk
+            if end < len(self.buffer) or self.eof or isinstance(value, (dict, list, str)):
+                self.pos = end
+                return value
+            if not self.read_more():
+                self.pos = end
+                return value
+
+
+def iter_blocks(fp: Union[IO[str], IO[bytes]], chunk_size: int = CHUNK_SIZE) -> Iterator[Dict]:
+    """
+    yields the elements of "Blocks" of a textract response one after another without reading the whole file,
+    so only a single block is held in memory at a time. All other keys of the response are skipped.
+    """
+    reader = _Reader(fp, chunk_size)
+    reader.expect("{")
+    if reader.peek() == "}":
+        return
+    while True:
+        key = reader.value()
+        reader.expect(":")
+        if key == "Blocks":
+            reader.expect("[")
+            if reader.peek() == "]":
+                reader.pos += 1
+            else:
+                while True:
+                    yield reader.value()
+                    if reader.peek() == "]":
+                        reader.pos += 1
+                        break
+                    reader.expect(",")
+        else:
+            reader.value()
+        if reader.peek() == "}":
+            return
+        reader.expect(",")
@@ -0,0 +1,291 @@
+import argparse
+import io
+import math
+import os
+from typing import Iterator, NamedTuple, Tuple
+
+import numpy as np
+
+# textract reads text reliably down to about this height in pixels, smaller images lose characters
+MIN_TEXT_HEIGHT = 16
+# and it does not accept larger images
+MAX_SIDE = 10000
+CHUNK_ROWS = 256
+LUMA = np.array([0.299, 0.587, 0.114], dtype=np.float32)
+
+
+class Preprocessed(NamedTuple):
+    image: np.ndarray  # gray, uint8
+    box: Tuple[int, int, int, int]  # top, bottom, left, right of the receipt in the original image
+    angle: float  # the writing angle in the cropped image in radians, the image was rotated back by it
+    factor: int  # the image was downsampled by this factor after cropping and rotating
+
+
+def iter_rows(image: np.ndarray, chunk_rows: int = CHUNK_ROWS) -> Iterator[Tuple[int, np.ndarray]]:
+    """ :return: (first row, rows) of the image, so that a memory-mapped image is never read at once """
+    for start in range(0, image.shape[0], chunk_rows):
+        yield start, image[start:start + chunk_rows]
+
+
+def to_gray(image: np.ndarray, chunk_rows: int = CHUNK_ROWS) -> np.ndarray:
+    """ :param image: (h, w) gray or (h, w, 3|4) RGB(A), e.g. a np.memmap :return: gray uint8 image """
+    if image.ndim == 2 and image.dtype == np.uint8:
+        return np.array(image)
+    gray = np.empty(image.shape[:2], dtype=np.uint8)
+    for start, rows in iter_rows(image, chunk_rows):
+        rows = rows.astype(np.float32)
+        if rows.ndim == 3:
+            rows = rows[..., :3] @ LUMA
+        if image.dtype.kind == "f":  # images of floats are in [0, 1]
+            rows = rows * 255
+        gray[start:start + len(rows)] = np.clip(rows + 0.5, 0, 255)
+    return gray
+
+
+def get_histogram(gray: np.ndarray, chunk_rows: int = CHUNK_ROWS) -> np.ndarray:
+    histogram = np.zeros(256, dtype=np.int64)
+    for _, rows in iter_rows(gray, chunk_rows):
+        histogram += np.bincount(rows.ravel(), minlength=256)
+    return histogram
+
+
+def otsu_threshold(histogram: np.ndarray) -> int:
+    """ :return: the gray value that separates the histogram best into dark (< threshold) and bright values """
+    values = np.arange(len(histogram))
+    weights = np.cumsum(histogram)[:-1]  # of the dark values below each threshold
+    sums = np.cumsum(histogram * values)[:-1]
+    total, total_sum = histogram.sum(), (histogram * values).sum()
+    with np.errstate(divide="ignore", invalid="ignore"):
+        dark_mean = sums / weights
+        bright_mean = (total_sum - sums) / (total - weights)
+        between = weights * (total - weights) * (dark_mean - bright_mean) ** 2
+    return int(np.nanargmax(np.where(np.isfinite(between), between, np.nan))) + 1 if total > 0 else 128
+
+
+def find_edges(gray: np.ndarray, threshold: int, min_fraction: float = 0.1, margin: int = 4,
+               chunk_rows: int = CHUNK_ROWS) -> Tuple[int, int, int, int]:
+    """
+    the receipt is the bright paper in front of a darker background
+    :param min_fraction: rows and columns with less bright pixels (relative to the brightest one) are background
+    :return: top, bottom, left, right (exclusive) of the receipt, the whole image if nothing stands out
+    """
+    h, w = gray.shape
+    row_counts = np.zeros(h, dtype=np.int64)
+    column_counts = np.zeros(w, dtype=np.int64)
+    for start, rows in iter_rows(gray, chunk_rows):
+        bright = rows >= threshold
+        row_counts[start:start + len(rows)] = bright.sum(axis=1)
+        column_counts += bright.sum(axis=0)
+    rows = np.flatnonzero(row_counts >= min_fraction * row_counts.max())
+    columns = np.flatnonzero(column_counts >= min_fraction * column_counts.max())
+    if row_counts.max() == 0:
+        return 0, h, 0, w
+    return (max(0, rows[0] - margin), min(h, rows[-1] + 1 + margin),
+            max(0, columns[0] - margin), min(w, columns[-1] + 1 + margin))
+
+
+def get_step(histogram: np.ndarray, threshold: int) -> float:
+    """ :return: half the difference of the mean bright and dark value, a smaller step is noise """
+    values = np.arange(len(histogram))
+    dark, bright = histogram[:threshold], histogram[threshold:]
+    if dark.sum() == 0 or bright.sum() == 0:
+        return 128.
+    return ((values[threshold:] * bright).sum() / bright.sum() - (values[:threshold] * dark).sum() / dark.sum()) / 2
+
+
+def get_edges(rows: np.ndarray, min_step: float) -> np.ndarray:
+    """ :return: where the gray value jumps by at least min_step to the next pixel of the row, e.g. in letters """
+    return np.abs(np.diff(rows.astype(np.int16), axis=1)) >= min_step
+
+
+def get_edge_points(gray: np.ndarray, min_step: float, max_points: int = 100000,
+                    chunk_rows: int = CHUNK_ROWS) -> np.ndarray:
+    """
+    the text is where the gray value jumps a lot within a row. Unlike dark pixels this doesn't include
+    the background around the receipt.
+    :return: (n, 2) x, y of the edges, every k-th one if there are more than max_points
+    """
+    counts = sum(int(get_edges(rows, min_step).sum()) for _, rows in iter_rows(gray, chunk_rows))
+    step = max(1, -(-counts // max_points))
+    points, seen = [np.zeros((0, 2))], 0
+    for start, rows in iter_rows(gray, chunk_rows):
+        y, x = np.nonzero(get_edges(rows, min_step))
+        # keep the stride across chunks
+        keep = (np.arange(seen, seen + len(y)) % step) == 0
+        points.append(np.stack([x[keep], y[keep] + start], axis=1))
+        seen += len(y)
+    return np.concatenate(points).astype(np.float32)
+
+
+def profile_scores(points: np.ndarray, angles: np.ndarray) -> np.ndarray:
+    """
+    the projection profile of the points along lines of each angle, for all angles at once:
+    the sum of squared counts per line is highest if the lines run along the lines of text.
+    """
+    if len(points) == 0:
+        return np.zeros(len(angles))
+    offsets = points[:, 1][None, :] * np.cos(angles)[:, None] - points[:, 0][None, :] * np.sin(angles)[:, None]
+    bins = np.floor(offsets - offsets.min(axis=1, keepdims=True)).astype(np.int64)
+    width = int(bins.max()) + 1
+    counts = np.bincount((bins + np.arange(len(angles))[:, None] * width).ravel(), minlength=len(angles) * width)
+    return (counts.reshape(len(angles), width).astype(np.float64) ** 2).sum(axis=1)
+
+
+def find_skew(points: np.ndarray, max_angle: float = math.radians(15), steps: Tuple[float, ...] = (
+        math.radians(1), math.radians(0.1))) -> float:
+    """
+    :param points: of the text, see get_edge_points
+    :return: the angle of the lines of text in radians, searched coarse to fine within +-max_angle
+    """
+    center, radius = 0., max_angle
+    for step in steps:
+        angles = center + np.arange(-radius, radius + step / 2, step)
+        center = float(angles[np.argmax(profile_scores(points, angles))])
+        radius = step
+    return center
+
+
+def rotate(gray: np.ndarray, angle: float, fill: int = 255, chunk_rows: int = CHUNK_ROWS) -> np.ndarray:
+    """
+    rotate the image by -angle around its center with bilinear interpolation, so that lines of text
+    at `angle` become horizontal. The image grows so that no corner is cut off, new pixels are `fill`.
+    """
+    if angle == 0:
+        return np.array(gray)
+    h, w = gray.shape
+    cos, sin = math.cos(angle), math.sin(angle)
+    out_h = int(math.ceil(abs(h * cos) + abs(w * sin)))
+    out_w = int(math.ceil(abs(w * cos) + abs(h * sin)))
+    rotated = np.empty((out_h, out_w), dtype=np.uint8)
+    xo = np.arange(out_w, dtype=np.float32) - (out_w - 1) / 2
+    for start in range(0, out_h, chunk_rows):
+        yo = np.arange(start, min(out_h, start + chunk_rows), dtype=np.float32)[:, None] - (out_h - 1) / 2
+        x = cos * xo[None, :] - sin * yo + (w - 1) / 2
+        y = sin * xo[None, :] + cos * yo + (h - 1) / 2
+        x0, y0 = np.floor(x).astype(np.int64), np.floor(y).astype(np.int64)
+        fx, fy = x - x0, y - y0
+        values = np.zeros(x.shape, dtype=np.float32)
+        for dy, dx, weight in ((0, 0, (1 - fx) * (1 - fy)), (0, 1, fx * (1 - fy)),
+                               (1, 0, (1 - fx) * fy), (1, 1, fx * fy)):
+            xs, ys = x0 + dx, y0 + dy
+            inside = (xs >= 0) & (xs < w) & (ys >= 0) & (ys < h)
+            values += weight * np.where(inside, gray[np.clip(ys, 0, h - 1), np.clip(xs, 0, w - 1)], fill)
+        rotated[start:start + len(yo)] = np.clip(values + 0.5, 0, 255)
+    return rotated
+
+
+def stretch_contrast(gray: np.ndarray, low: float = 0.01, high: float = 0.99,
+                     chunk_rows: int = CHUNK_ROWS) -> np.ndarray:
+    """ map the gray values linearly, so that the `low` and `high` quantiles become black and white, in place """
+    cumulative = np.cumsum(get_histogram(gray, chunk_rows))
+    if cumulative[-1] == 0:
+        return gray
+    lo = np.searchsorted(cumulative, low * cumulative[-1], side="right")
+    hi = np.searchsorted(cumulative, high * cumulative[-1])
+    if hi <= lo:
+        return gray
+    table = np.clip((np.arange(256) - lo) * 255. / (hi - lo) + 0.5, 0, 255).astype(np.uint8)
+    for start, rows in iter_rows(gray, chunk_rows):
+        gray[start:start + len(rows)] = table[rows]
+    return gray
+
+
+def get_text_height(gray: np.ndarray, min_step: float, min_fraction: float = 0.02) -> float:
+    """
+    :param gray: a deskewed image, so that the lines of text are horizontal
+    :param min_fraction: rows with less edges (relative to the width) have no text
+    :return: the median height of the runs of rows with text in pixels, 0 if there is no text
+    """
+    text = np.zeros(gray.shape[0], dtype=bool)
+    for start, rows in iter_rows(gray):
+        text[start:start + len(rows)] = get_edges(rows, min_step).mean(axis=1) >= min_fraction
+    edges = np.flatnonzero(np.diff(np.r_[0, text.astype(np.int8), 0]))
+    heights = edges[1::2] - edges[::2]
+    return float(np.median(heights)) if len(heights) > 0 else 0.
+
+
+def downsample(gray: np.ndarray, factor: int, chunk_rows: int = CHUNK_ROWS) -> np.ndarray:
+    """ :return: the mean of every factor x factor block, the incomplete blocks at the edges are dropped """
+    if factor <= 1:
+        return gray
+    h, w = gray.shape[0] // factor, gray.shape[1] // factor
+    small = np.empty((h, w), dtype=np.uint8)
+    chunk_rows = max(1, chunk_rows // factor) * factor
+    for start, rows in iter_rows(gray[:h * factor, :w * factor], chunk_rows):
+        blocks = rows.reshape(len(rows) // factor, factor, w, factor).mean(axis=(1, 3))
+        small[start // factor:start // factor + len(blocks)] = blocks + 0.5
+    return small
+
+
+def get_factor(shape: Tuple[int, int], text_height: float, min_text_height: float = MIN_TEXT_HEIGHT,
+               max_side: int = MAX_SIDE) -> int:
+    """ :return: the largest factor that keeps the text readable, at least the one needed to fit max_side """
+    factor = max(1, int(text_height // min_text_height))
+    return max(factor, int(math.ceil(max(shape) / max_side)))
+
+
+def preprocess(image: np.ndarray, max_angle: float = math.radians(15), min_text_height: float = MIN_TEXT_HEIGHT,
+               chunk_rows: int = CHUNK_ROWS) -> Preprocessed:
+    """
+    prepare a photo of a receipt for textract: crop it to the edges of the paper, rotate it so that the text is
+    horizontal, stretch the contrast and make it as small as textract can still read it.
+    :param image: gray or RGB(A), e.g. np.load(path, mmap_mode="r"), it is read in chunks of rows
+    :param max_angle: the text is searched for within this angle, larger ones are left to Receipt.find_writing_angle
+    """
+    gray = to_gray(image, chunk_rows)
+    histogram = get_histogram(gray, chunk_rows)
+    threshold = otsu_threshold(histogram)
+    min_step = get_step(histogram, threshold)
+    top, bottom, left, right = find_edges(gray, threshold, chunk_rows=chunk_rows)
+    gray = gray[top:bottom, left:right]
+
+    angle = find_skew(get_edge_points(gray, min_step, chunk_rows=chunk_rows), max_angle)
+    # the corners that are new after rotating are background, the receipt is cropped again without them
+    gray = rotate(gray, angle, fill=0, chunk_rows=chunk_rows)
+    inner_top, inner_bottom, inner_left, inner_right = find_edges(gray, threshold, chunk_rows=chunk_rows)
+    gray = gray[inner_top:inner_bottom, inner_left:inner_right]
+    factor = get_factor(gray.shape, get_text_height(gray, min_step), min_text_height)
+    gray = stretch_contrast(np.array(gray), chunk_rows=chunk_rows)
+    return Preprocessed(downsample(gray, factor, chunk_rows), (top, bottom, left, right), angle, factor)
+
+
+def load_image(path: str) -> np.ndarray:
+    """ .npy files are memory-mapped, other images are decoded with Pillow """
+    if path.endswith(".npy"):
+        return np.load(path, mmap_mode="r")
+    return np.asarray(_import_pil().open(path).convert("RGB"))
+
+
+def encode(gray: np.ndarray, image_format: str = "PNG") -> bytes:
+    """ :return: the image as file, e.g. for Document={"Bytes": ...} of textract """
+    f = io.BytesIO()
+    _import_pil().fromarray(gray).save(f, format=image_format)
+    return f.getvalue()
+
+
+def _import_pil():
+    """ Pillow is only needed to read and write image files, it is not installed on the lambda """
+    try:
+        from PIL import Image
+    except ImportError:
+        raise ImportError("Reading and writing images needs Pillow (pip install Pillow), or use .npy files")
+    return Image
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Crop, deskew and shrink photos of receipts before uploading them")
+    parser.add_argument("images", nargs="+", help="image files or .npy arrays")
+    parser.add_argument("--output", required=True, help="folder of the preprocessed images")
+    parser.add_argument("--format", default="PNG", help="e.g. PNG or JPEG")
+    args = parser.parse_args()
+
+    os.makedirs(args.output, exist_ok=True)
+    for image_path in args.images:
+        result = preprocess(load_image(image_path))
+        output_path = os.path.join(args.output, "{}.{}".format(
+            os.path.splitext(os.path.basename(image_path))[0], args.format.lower()))
+        with open(output_path, "wb") as output_file:
+            output_file.write(encode(result.image, args.format))
+        print("[{}] {}x{}, box {}, angle {:.2f} deg, factor {}".format(
+            image_path, result.image.shape[1], result.image.shape[0], result.box,
+            math.degrees(result.angle), result.factor))
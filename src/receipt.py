@@ -1,26 +1,81 @@
+import io
 import math
-import re
-from typing import List, Tuple, Union
+from typing import Dict, IO, List, NamedTuple, Optional, Set, Tuple, Union
 
-from fuzzywuzzy import fuzz
+import numpy as np
 
-from block import Block
+from block import Block, BlockTable
 from column import Column
+from geometry import Geometry, get_polygon
 from item import Item
-from util import get_angle, get_abs_perp_angle_diff, rotate_point, get_dist_to_line
+from matcher import get_matcher
+from metrics import Metrics, NULL_METRICS
+from parse import iter_blocks
+from reconcile import Reconciliation, reconcile
+from spatial import GridIndex
+from tokenizer import DEFAULT_TOKENIZER, PRICE
+from util import circular_mean, get_angles, get_dists_to_lines, rotate_point, rotate_points
+
+
+class Stage(NamedTuple):
+    """
+    a step of the analysis. It has to run again if one of its parameters (attributes of the receipt)
+    or one of the outputs of its input stages changed since it ran the last time.
+    """
+    name: str
+    parameters: Tuple[str, ...]
+    inputs: Tuple[str, ...]
+    outputs: Tuple[str, ...]
+
+
+def get_parameter_key(value):
+    """
+    parameters are compared by value, objects with a `version` (e.g. the TOKENIZER) by identity and version,
+    so that a stage runs again if such an object was changed in place
+    """
+    version = getattr(value, "version", None)
+    return value if version is None else (id(value), version)
 
 
 class Receipt:
-    REGEX = r"\d+(\.|,)[ ]?\d\d"
+    LINE, WORD = "LINE", "WORD"
+    VERSION = "4"  # increase when the analysis changes, cached results of older versions are not used anymore
+    TOKENIZER = DEFAULT_TOKENIZER
     TOTAL_WORDS = ("total", "zu zahlen", "pagar", "zwischensumme", "summe", "suma",)
     TOTAL_THRESHOLD = 65
     COLUMN_ANGLE_TRESHOLD = math.pi / 8
     ROW_DIST_THRESHOLD = 0.05
+    SPELLCHECKER = None  # a spellcheck.SpellChecker to correct the descriptions of the items
+    TEMPLATES = None  # a template.TemplateStore with the layouts of known stores
     COLUMN_SEPARATOR_THRESHOLD = 0.2
-    ANGLE_SAMPLE_SIZE = 30
+    ANGLE_OUTLIER_THRESHOLD = math.pi / 12
+    MAX_CORRECTIONS = 4  # prices that reconcile may add to or remove from the items to match the total
 
-    def __init__(self, data, name=None):
-        self.data = data
+    # in order of execution
+    STAGES = (
+        Stage("find_writing_angle", ("ANGLE_OUTLIER_THRESHOLD",), (), ("angle", "angle_confidence")),
+        Stage("find_prices", ("TOKENIZER",), (), ("prices",)),
+        Stage("match_template", ("TEMPLATES",), ("find_writing_angle",), ("template", "column_range")),
+        Stage("find_columns", ("COLUMN_ANGLE_TRESHOLD",), ("find_writing_angle", "find_prices", "match_template"),
+              ("columns",)),
+        Stage("find_total", ("TOTAL_WORDS", "TOTAL_THRESHOLD"), ("match_template",), ("total_desc",)),
+        Stage("find_items", ("ROW_DIST_THRESHOLD", "COLUMN_SEPARATOR_THRESHOLD"),
+              ("find_writing_angle", "find_prices", "find_columns", "find_total"), ("items", "total")),
+        Stage("correct_items", ("SPELLCHECKER",), ("find_items",), ("items",)),
+        Stage("reconcile", ("MAX_CORRECTIONS",), ("find_writing_angle", "find_prices", "find_items"),
+              ("reconciliation",)),
+    )
+
+    def __init__(self, data: Dict, name=None, keep_json: bool = False, metrics: Optional[Metrics] = None):
+        """
+        :param data: the textract response, only data["Blocks"] is used and it is iterated only once
+        :param keep_json: keep the response in self.data and the textract JSON of each block in block.json,
+        otherwise only the fields the analysis needs are kept.
+        :param metrics: collects timings and counters of the analysis, disabled if not given
+        """
+        self.data = data if keep_json else None
+        self.metrics = metrics if metrics is not None else NULL_METRICS
+        start = self.metrics.now()
 
         self.lines: List[Block] = []
         self.words: List[Block] = []
@@ -28,96 +83,224 @@ class Receipt:
         self.columns: List[Column] = []
         self.total_desc: Union[None, Block] = None
         self.angle: float = 0
+        self.angle_confidence: float = 0
+        self.template = None  # the template.Template of the store, if TEMPLATES knows it
+        self.column_range: Optional[Tuple[float, float]] = None  # rotated x of the price column of the template
 
         self.name = name
         self.items: List[Item] = []
         self.total: Union[Item, None] = None
+        self.reconciliation: Optional[Reconciliation] = None
+
+        self._stage_keys: Dict[str, Tuple] = {}  # parameters and input versions a stage ran with the last time
+        self._stage_versions: Dict[str, int] = {}  # increased whenever the output of a stage changes
+        self._pinned_stages: Set[str] = set()  # stages whose output was set by the user
+        self._line_index: Optional[Tuple[float, GridIndex]] = None  # (angle, index of the rotated line centers)
+
+        ids, confs, polygons, records = [], [], [], []
+        for block_json in data["Blocks"]:
+            # use the constants, so that not every block keeps its own copy of the type string
+            block_type = Receipt.LINE if block_json["BlockType"] == Receipt.LINE else \
+                Receipt.WORD if block_json["BlockType"] == Receipt.WORD else None
+            if block_type is not None:
+                ids.append(block_json["Id"])
+                confs.append(float(block_json["Confidence"]))
+                polygons.append(get_polygon(block_json))
+                records.append((block_json["Text"], block_type, block_json if keep_json else None))
+
+        # all fields and polygons live in arrays, in the order of the response
+        self.table = BlockTable(ids, confs, Geometry.from_polygons(polygons))
+        self.geometry = self.table.geometry
+        for idx, (text, block_type, block_json) in enumerate(records):
+            block = Block(text, block_type, self.table, idx, block_json)
+            (self.lines if block_type == Receipt.LINE else self.words).append(block)
+        self.line_indices = self._indices(self.lines)
+
+        self.metrics.time("parse", start)
+        self.metrics.count("lines", len(self.lines))
+        self.metrics.count("words", len(self.words))
 
-        for block_json in self.data["Blocks"]:
-            if block_json["BlockType"] == "LINE":
-                self.lines.append(Block(block_json))
-            elif block_json["BlockType"] == "WORD":
-                self.words.append(Block(block_json))
+    @classmethod
+    def from_stream(cls, fp: Union[IO[str], IO[bytes], bytes], name=None, keep_json: bool = False,
+                    metrics: Optional[Metrics] = None) -> "Receipt":
+        """
+        read a textract response from a file object (or bytes) incrementally,
+        without ever holding the complete response in memory.
+        """
+        if isinstance(fp, bytes):
+            fp = io.BytesIO(fp)
+        receipt = cls({"Blocks": iter_blocks(fp)}, name=name, keep_json=keep_json, metrics=metrics)
+        receipt.data = None
+        return receipt
 
-    def analyze(self):
-        self.find_writing_angle()
-        self.find_prices()
-        self.find_columns()
-        self.find_total()
-        self.find_items()
+    def analyze(self) -> List[str]:
+        """
+        run all stages of the analysis, but only those whose parameters or inputs changed since the last call.
+        Parameters can be changed per receipt, e.g. `receipt.TOTAL_THRESHOLD = 70; receipt.analyze()`
+        only runs find_total again, and find_items only if that found another total.
+        :return: the names of the stages that were run
+        """
+        run = []
+        for stage in self.STAGES:
+            if stage.name in self._pinned_stages:
+                continue
+            key = tuple(get_parameter_key(getattr(self, parameter)) for parameter in stage.parameters) + \
+                tuple(self._stage_versions.get(input_stage, 0) for input_stage in stage.inputs)
+            if self._stage_keys.get(stage.name) == key:
+                continue
+            before = [getattr(self, output) for output in stage.outputs]
+            start = self.metrics.now()
+            getattr(self, stage.name)()
+            self.metrics.time(stage.name, start)
+            self._stage_keys[stage.name] = key
+            if before != [getattr(self, output) for output in stage.outputs]:
+                self._stage_versions[stage.name] = self._stage_versions.get(stage.name, 0) + 1
+            run.append(stage.name)
+        return run
+
+    def set_total_desc(self, total_desc: Optional[Block]):
+        """
+        a correction by the user: this block is the description of the total, find_total won't change it anymore.
+        With None, find_total will search for the total again.
+        """
+        if total_desc is None:
+            self._pinned_stages.discard("find_total")
+            self._stage_keys.pop("find_total", None)
+            return
+        self._pinned_stages.add("find_total")
+        if total_desc is not self.total_desc:
+            self.total_desc = total_desc
+            self._stage_versions["find_total"] = self._stage_versions.get("find_total", 0) + 1
 
     def find_writing_angle(self):
         """
-        take <=30 lines from the receipt and determine the angle of writing
+        the angle of writing is the circular mean of the angles of the top edges of all lines, weighted by their length.
+        The circular mean also works for upside down (about +-pi) and sideways (about +-pi/2) receipts.
+        Lines that are off by more than ANGLE_OUTLIER_THRESHOLD (e.g. vertical text or misread lines) are dropped
+        and the mean is taken again.
+        The confidence is in [0, 1]: the share of the (weighted) lines that agree, times how well they agree.
         """
-        some_lines = self.lines if len(self.lines) <= Receipt.ANGLE_SAMPLE_SIZE else [
-            self.lines[i] for i in range(0, len(self.lines), len(self.lines) // Receipt.ANGLE_SAMPLE_SIZE)]
-        angles = [get_angle(line.top_left, line.top_right) for line in some_lines]
-        self.angle = sum(angles) / len(angles)
+        top_edges = self.geometry.poly[self.line_indices].reshape(-1, 4, 2)
+        angles = get_angles(top_edges[:, 0], top_edges[:, 1])
+        weights = np.hypot(*(top_edges[:, 1] - top_edges[:, 0]).T)
+        angle, _ = circular_mean(angles, weights)
+
+        deviations = np.abs((angles - angle + math.pi) % (2 * math.pi) - math.pi)
+        inliers = deviations <= self.ANGLE_OUTLIER_THRESHOLD
+        angle, concentration = circular_mean(angles[inliers], weights[inliers])
+
+        self.angle = angle
+        self.angle_confidence = concentration * float(weights[inliers].sum() / max(weights.sum(), 1e-12))
+        if self.metrics.enabled:
+            self.metrics.count("angle_outliers", int((~inliers).sum()))
         return self.angle
 
     def find_prices(self):
         """
-        go through all words, find the ones that match our number format
+        go through all words, find the ones that the tokenizer classifies as price, their value is parsed only once.
+        Dates, percentages and quantities that look like prices (28.07.18, 19,00%, 6.00x) are not taken.
         if you can put the ending of three or more in good line we have found the right side.
         always take three consecutive numbers and store their lines
         the ones that fit together the best are our line!
         """
-
-        pattern = re.compile(Receipt.REGEX)
+        for price in self.prices:
+            price.cents = None
         self.prices = []
-        for word in self.words:
-            # #################################
-            # This would be a simpler matching
-            # if pattern.match(word.text):
-            # self.prices.append(word)
-            # #################################
-
-            result = pattern.search(word.text)
-            if result and result.span()[0] <= 2:
-                # accept prices but also if there was a currency symbol in front
+        for word, token in zip(self.words, self.TOKENIZER.tokenize(word.text for word in self.words)):
+            if token.kind == PRICE:
+                word.cents = token.cents
                 self.prices.append(word)
-                word.is_price = True
+        self.metrics.count("prices", len(self.prices))
 
         # TODO: fault detection for partial prices in places where we expect prices to be
         # TODO: rescan in such cases.
 
+    def match_template(self):
+        """
+        look up the layout of the store by the header of the receipt. With a template, find_columns and find_total
+        only look for what the store prints, and if that isn't found they fall back to searching everything.
+        """
+        match = None if self.TEMPLATES is None else self.TEMPLATES.match(self)
+        self.template, self.column_range = (None, None) if match is None else match
+        if self.template is not None:
+            self.metrics.count("template_matches")
+
     def find_total(self):
-        current_total: Union[Block, None] = None
-        current_total_ratio = 0
-        for total_word in Receipt.TOTAL_WORDS:
-            for word in self.words:
-                ratio = fuzz.ratio(word.text.lower(), total_word)
-                if ratio > current_total_ratio and ratio > Receipt.TOTAL_THRESHOLD:
-                    current_total_ratio = ratio
-                    current_total = word
-            if current_total is not None:
-                # iterate through TOTAL words by priority if the first one is found -> break.
-                break
-        if current_total is not None:
-            # print("Found Total: {}".format(current_total.text))
-            self.total_desc = current_total
+        """
+        find the word that is most similar to one of the TOTAL_WORDS,
+        they are tried by priority: if the first one is found, the others are not considered.
+        With a template, the total word of the store is tried first: the first word that is exactly it,
+        which is what the matcher would find too, but without comparing all words.
+        """
+        texts = [word.text.lower() for word in self.words]
+        idx = None
+        if self.template is not None:
+            idx = next((idx for idx, text in enumerate(texts) if text == self.template.total_word), None)
+            if idx is None:
+                idx, _ = get_matcher((self.template.total_word,)).match(texts, self.TOTAL_THRESHOLD, self.metrics)
+        if idx is None:
+            idx, _ = get_matcher(self.TOTAL_WORDS).match(texts, self.TOTAL_THRESHOLD, self.metrics)
+        self.total_desc = None
+        if idx is not None:
+            # print("Found Total: {}".format(self.words[idx].text))
+            self.total_desc = self.words[idx]
 
     def find_columns(self):
-        undone_prices = self.prices.copy()
-        while len(undone_prices) > 0:
-            price1 = undone_prices.pop(0)
-            column = Column(price1)
-            for price2 in undone_prices.copy():
-                angle = get_angle(price1.top_right, price2.top_right)
-                if get_abs_perp_angle_diff(self.angle, angle) < self.COLUMN_ANGLE_TRESHOLD:
-                    undone_prices.remove(price2)
-                    column.add(price2)
-            self.columns.append(column)
+        """
+        a price belongs to the column of a seed price if the line between their top right corners runs
+        (almost) perpendicular to the writing, in rotated coordinates: |dx| < tan(COLUMN_ANGLE_TRESHOLD) * |dy|.
+        The seeds are taken in reading order, every price is rotated only once and the prices are sorted by x,
+        so for each seed only the x-window that the threshold allows for the height of the receipt is checked.
+        With a template, the prices at the x of its price column are the only column.
+        """
+        anchors = self.rotate(self.geometry.poly[self._indices(self.prices), 1]).reshape(-1, 2)
+        if self.template is not None:
+            # the prices in the column of the template are the column of the items, if there are enough of them
+            low, high = self.column_range
+            members = np.flatnonzero((anchors[:, 0] >= low) & (anchors[:, 0] <= high))
+            if len(members) >= 2:
+                self.columns = [Column.from_prices([self.prices[idx] for idx in members], self.angle,
+                                                   float(np.mean(anchors[members, 0])))]
+                self.metrics.count("columns", 1)
+                return
+            self.metrics.count("template_fallbacks")
+
+        order = np.argsort(anchors[:, 0], kind="stable")
+        xs, ys = anchors[order, 0], anchors[order, 1]
+        position = np.empty_like(order)
+        position[order] = np.arange(len(order))  # position of each price in the sorted arrays
+
+        slope = math.tan(self.COLUMN_ANGLE_TRESHOLD)
+        max_dx = slope * (ys.max() - ys.min()) if len(ys) > 0 else 0.
+        done = np.zeros(len(order), dtype=bool)
+
+        self.columns = []
+        for seed in range(len(self.prices)):
+            pos = position[seed]
+            if done[pos]:
+                continue
+            lo = np.searchsorted(xs, xs[pos] - max_dx, side="left")
+            hi = np.searchsorted(xs, xs[pos] + max_dx, side="right")
+            in_cone = np.abs(xs[lo:hi] - xs[pos]) < slope * np.abs(ys[lo:hi] - ys[pos])
+            members = lo + np.flatnonzero(in_cone & ~done[lo:hi])
+            done[members] = True
+            done[pos] = True
+
+            member_idx = np.concatenate(([seed], np.sort(order[members])))  # keep the reading order
+            self.columns.append(Column.from_prices([self.prices[idx] for idx in member_idx], self.angle,
+                                                   float(np.mean(anchors[member_idx, 0]))))
         self.columns.sort(key=lambda column_: column_.get_rotated_x(self.angle))
+        self.metrics.count("columns", len(self.columns))
 
     def find_items(self):
+        self.items, self.total = [], None
         total_height = 1.0
         if self.total_desc is not None:
             _, total_height = self.r(self.total_desc.right_center)
-            total_distances = [(get_dist_to_line((0, total_height), (0.1, total_height),
-                                                 self.r(price.left_center)), price) for price in self.prices]
-            self.total = Item(self.total_desc, min(total_distances, key=lambda x: x[0])[1])
+            # the price nearest to the horizontal line through the total in rotated coordinates
+            price_heights = self.rotate(self.geometry.left_center[self._indices(self.prices)])[:, 1]
+            if len(price_heights) > 0:
+                self.total = Item(self.total_desc, self.prices[int(np.argmin(np.abs(price_heights - total_height)))])
 
         right_column = max(self.columns, key=lambda c: c.get_rotated_x(self.angle))
 
@@ -140,26 +323,69 @@ class Receipt:
         #
         # There should be some plausibility check to make it match as good as possible.
 
-        for price in right_column.prices:
-            if self.r(price.bottom_left)[1] > total_height:
+        # in rotated coordinates, only the lines in the row band of a price are examined
+        price_idx = self._indices(right_column.prices)
+        price_left = self.rotate(self.geometry.left_center[price_idx])
+        price_right = self.rotate(self.geometry.right_center[price_idx])
+        price_bottom = self.rotate(self.geometry.poly[price_idx, 3])[:, 1]
+        index = self.get_line_index()
+        line_centers = index.points
+
+        for price, left, right, bottom in zip(right_column.prices, price_left, price_right, price_bottom):
+            if bottom > total_height:
                 continue  # this price is below the total sum
+            # don't consider a desc that is farther away from this price than the threshold
+            # and keep a minimum distance between desc and price of COLUMN_SEPARATOR_THRESHOLD
+            x_max = left[0] - self.COLUMN_SEPARATOR_THRESHOLD
+            nearby = index.query_band(left, right - left, self.ROW_DIST_THRESHOLD, x_max=x_max)
+            dists = get_dists_to_lines(left, right, line_centers[nearby])
+            candidates = (dists <= self.ROW_DIST_THRESHOLD) & \
+                         (line_centers[nearby, 0] + self.COLUMN_SEPARATOR_THRESHOLD <= left[0])
+            if self.metrics.enabled:
+                self.metrics.count("lines_examined", len(nearby))
+                self.metrics.count("row_candidates", int(candidates.sum()))
+            if candidates.any():
+                # nearby is sorted, so the first line wins if several are equally near
+                best_desc = nearby[candidates][np.argmin(dists[candidates])]
+                self.items.append(Item(self.lines[best_desc], price))
+            else:
+                self.metrics.count("unassociated_prices")
+                print("[{}] could not associate price {} with any description".format(self.name, price.text))
 
-            for line in self.lines:
-                dist = get_dist_to_line(price.left_center, price.right_center, line.center)
-                if dist > Receipt.ROW_DIST_THRESHOLD:
-                    continue  # don't consider a desc that is farther away from this price than the threshold
-                if self.r(line.center)[0] + Receipt.COLUMN_SEPARATOR_THRESHOLD > self.r(price.left_center)[0]:
-                    continue  # minimum distance between desc and price not > COLUMN_SEPARATOR_THRESHOLD
+    def correct_items(self):
+        """ correct misread descriptions with the SPELLCHECKER, without one the descriptions are kept as read """
+        if self.SPELLCHECKER is not None:
+            self.SPELLCHECKER.correct_items(self.items)
+        else:
+            for item in self.items:
+                item.desc = item.desc_block.text
 
-                price.associated_descs.append((dist, line))
-                # calculate center of item line
-                # difference of this center to ray from price.
+    def reconcile(self):
+        """
+        check if the prices of the items add up to the total, otherwise find the fewest prices above the total line
+        (in any column) to add to or remove from the items so that they do, see reconcile.reconcile
+        """
+        self.reconciliation = None
+        if self.total is None:
+            return
+        _, total_height = self.r(self.total_desc.right_center)
+        bottoms = self.rotate(self.geometry.poly[self._indices(self.prices), 3])[:, 1]
+        taken = {item.price_block.idx for item in self.items} | {self.total.price_block.idx}
+        candidates = [price for price, bottom in zip(self.prices, bottoms)
+                      if bottom <= total_height and price.idx not in taken]
+        self.reconciliation = reconcile(self.items, candidates, self.total, self.MAX_CORRECTIONS)
+        if self.metrics.enabled:
+            self.metrics.count("reconcile_candidates", len(candidates))
 
-            if len(price.associated_descs) > 0:
-                best_matching_desc = sorted(price.associated_descs, key=lambda l: l[0])[0][1]
-                self.items.append(Item(best_matching_desc, price))
-            else:
-                print("[{}] could not associate price {} with any description".format(self.name, price.text))
+    def get_line_index(self) -> GridIndex:
+        """
+        the centers of all lines in rotated coordinates, bucketed into cells of ROW_DIST_THRESHOLD.
+        It is built once per angle and shared by all queries for "lines near this block".
+        """
+        if self._line_index is None or self._line_index[0] != self.angle:
+            centers = self.rotate(self.geometry.center[self.line_indices]).reshape(-1, 2)
+            self._line_index = (self.angle, GridIndex(centers, max(self.ROW_DIST_THRESHOLD, 1e-3)))
+        return self._line_index[1]
 
     def get_json(self):
         """ this method is used by the AWS Lambda function"""
@@ -169,6 +395,10 @@ class Receipt:
         }
         for item in self.items:
             result["items"].append(item.json)
+        if self.reconciliation is not None:
+            result["reconciliation"] = self.reconciliation.json
+        if self.metrics.enabled:
+            result["metrics"] = self.metrics.json
         return result
 
     def r(self, point):
@@ -194,5 +424,14 @@ class Receipt:
         """
         return rotate_point(-self.angle, point)
 
+    def rotate(self, points: np.ndarray) -> np.ndarray:
+        """ batched version of r, points has shape (..., 2) """
+        return rotate_points(-self.angle, points)
+
+    @staticmethod
+    def _indices(blocks: List[Block]) -> np.ndarray:
+        """ the rows of the blocks in the geometry of the receipt """
+        return np.array([block.idx for block in blocks], dtype=int)
+
     def __repr__(self):
         return self.name
@@ -0,0 +1,136 @@
+from typing import Dict, Iterator, List, NamedTuple, Optional, Sequence, Tuple
+
+from block import Block
+from item import Item
+
+# every correction makes a reconciliation less likely to be right
+CORRECTION_PENALTY = 0.5
+
+
+class Correction(NamedTuple):
+    block: Block  # a price
+    add: bool  # True: the price is missing in the items, False: the item of the price is wrong
+
+    @property
+    def json(self) -> Dict:
+        return {"price": self.block.price, "text": self.block.text, "action": "add" if self.add else "remove"}
+
+
+class Reconciliation(NamedTuple):
+    gap: int  # cents the total is more than the sum of the items
+    corrections: Optional[List[Correction]]  # the fewest that close the gap, None if there are none
+    alternatives: List[List[Correction]]  # other ones that close the gap, with as few or one more correction
+    confidence: float  # in [0, 1], 1 if the items add up to the total
+
+    @property
+    def json(self) -> Dict:
+        return {
+            "gap": self.gap / 100,
+            "confidence": self.confidence,
+            "corrections": None if self.corrections is None else [c.json for c in self.corrections],
+            "alternatives": [[c.json for c in corrections] for corrections in self.alternatives],
+        }
+
+
+def get_layers(values: Sequence[int], target: int, max_size: int) -> Tuple[List[List[int]], int]:
+    """
+    what is left of the target after taking subsets of the values, as bitsets: a python int per number of values taken,
+    bit (target - sum of the subset) + base is set if the subset exists. Taking a value shifts all bits at once.
+    Only what can still be closed by the remaining values is kept: with k values taken, at most max_size - k
+    of the remaining values, so the bitsets never get wider than about 2 * max_size * the largest value.
+    :return: layers[i][k] for exactly k of the first i values, and the base
+    """
+    # the largest positive and negative value from i on, and the sums of the positive and negative ones
+    largest_positive, largest_negative, positive_sum, negative_sum = [0], [0], [0], [0]
+    for value in reversed(values):
+        largest_positive.append(max(largest_positive[-1], value))
+        largest_negative.append(max(largest_negative[-1], -value))
+        positive_sum.append(positive_sum[-1] + max(value, 0))
+        negative_sum.append(negative_sum[-1] + max(-value, 0))
+    n = len(values)
+
+    def prune(bits: int, rest: int, left: int) -> int:
+        """ keep what can be closed by at most `left` of the last `rest` values """
+        low = base - min(negative_sum[rest], left * largest_negative[rest])
+        high = base + min(positive_sum[rest], left * largest_positive[rest])
+        if bits.bit_length() > high + 1:
+            bits &= (1 << (high + 1)) - 1
+        return bits >> low << low if low > 0 else bits
+
+    base = min(negative_sum[n], max_size * largest_negative[n])
+    layer = [prune(1 << (target + base), n, max_size) if target + base >= 0 else 0] + [0] * max_size
+    layers = [layer]
+    for i, value in enumerate(values):
+        shifted = [left >> value if value >= 0 else left << -value for left in layer[:-1]]
+        layer = [layer[0]] + [layer[k] | shifted[k - 1] for k in range(1, max_size + 1)]
+        layer = [prune(left, n - i - 1, max_size - k) if left else 0 for k, left in enumerate(layer)]
+        layers.append(layer)
+    return layers, base
+
+
+def iter_subsets(values: Sequence[int], layers: List[List[int]], base: int, size: int) -> Iterator[Tuple[int, ...]]:
+    """
+    :return: the indices of all subsets of exactly `size` values that sum up to the target.
+    A depth-first search backwards through the layers with an explicit stack, there can be more values than the
+    recursion limit allows. (i, k, left, subset): subsets of exactly k of the first i values that leave `left`
+    of the target, with the indices of the later values that were taken.
+    """
+    stack = [(len(values), size, 0, ())]
+    while stack:
+        i, k, left, subset = stack.pop()
+        if left + base < 0 or not layers[i][k] >> (left + base) & 1:
+            continue
+        if i == 0:
+            yield subset
+            continue
+        # value i - 1 is taken after all subsets without it, like in the order of values
+        if k > 0:
+            stack.append((i - 1, k - 1, left + values[i - 1], (i - 1,) + subset))
+        stack.append((i - 1, k, left, subset))
+
+
+def find_subsets(values: Sequence[int], target: int, max_size: int = 4, max_subsets: int = 6) \
+        -> List[Tuple[int, ...]]:
+    """
+    find the smallest subsets of values (integers, may be negative) that sum up to the target,
+    by a subset-sum search over bitsets (see get_layers).
+    :return: the indices of up to max_subsets subsets, the smallest ones first and otherwise in the order of values.
+    Subsets with one value more than the smallest ones are only taken if there are not enough of these.
+    """
+    layers, base = get_layers(values, target, max_size)
+    sizes = [k for k in range(max_size + 1) if layers[-1][k] >> base & 1]
+    subsets: List[Tuple[int, ...]] = []
+    for size in sizes[:2]:
+        if size > sizes[0] + 1:
+            break
+        for subset in iter_subsets(values, layers, base, size):
+            subsets.append(subset)
+            if len(subsets) == max_subsets:
+                return subsets
+    return subsets
+
+
+def reconcile(items: List[Item], candidates: List[Block], total: Item, max_corrections: int = 4,
+              max_alternatives: int = 5) -> Reconciliation:
+    """
+    readme step 6, check if sum(items) == total. If not, find the fewest corrections that explain the gap:
+    prices of candidates that are missing in the items (e.g. a deposit, "Pfand" or a discount in another column)
+    and prices of items that don't belong to them (e.g. a price that was read twice).
+    All prices are in integer cents, so the sums are exact.
+    :param candidates: the other prices above the total line
+    """
+    gap = total.price_block.cents - sum(item.price_block.cents for item in items)
+    if gap == 0:
+        return Reconciliation(0, [], [], 1.)
+    # removing an item changes the sum by minus its price
+    corrections = [Correction(item.price_block, False) for item in items] + \
+                  [Correction(block, True) for block in candidates]
+    values = [correction.block.cents * (1 if correction.add else -1) for correction in corrections]
+    subsets = find_subsets(values, gap, max_corrections, max_alternatives + 1)
+    if len(subsets) == 0:
+        return Reconciliation(gap, None, [], 0.)
+    subsets = [[corrections[idx] for idx in subset] for subset in subsets]
+    # the fewer corrections and the fewer ways to make them, the more likely the best one is right
+    equally_small = sum(len(subset) == len(subsets[0]) for subset in subsets)
+    confidence = CORRECTION_PENALTY ** len(subsets[0]) / equally_small
+    return Reconciliation(gap, subsets[0], subsets[1:], confidence)
@@ -0,0 +1,169 @@
+import argparse
+import html
+import json
+import os
+from multiprocessing import Pool
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+import matplotlib.figure
+import matplotlib.image
+import numpy as np
+
+from batch import find_documents, get_name, load_receipt
+from instance import Instance
+from receipt import Receipt
+
+OVERLAYS = ("prices", "columns", "total", "items")
+
+# one figure per process, every receipt is drawn on it again instead of creating a figure per receipt
+_figure: Optional[matplotlib.figure.Figure] = None
+
+
+def get_figure() -> matplotlib.figure.Figure:
+    global _figure
+    if _figure is None:
+        _figure = matplotlib.figure.Figure()
+    return _figure
+
+
+def load_image(directory: str, max_size: int = 1600) -> Optional[np.ndarray]:
+    """ :return: the image.jpg of a receipt, every n-th pixel so that it is at most max_size pixels high or wide """
+    path = os.path.join(directory, "image.jpg")
+    if not os.path.isfile(path):
+        return None
+    im = matplotlib.image.imread(path)
+    step = -(-max(im.shape[:2]) // max_size)
+    return im[::step, ::step]
+
+
+def load_expected(directory: str) -> Optional[Dict]:
+    path = os.path.join(directory, "result.json")
+    if not os.path.isfile(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def get_mistakes(receipt: Receipt, expected: Dict) -> List[str]:
+    """ :return: how the analyzed receipt differs from its result.json, like TestReceipt.test_results """
+    mistakes = []
+    total = None if receipt.total is None else receipt.total.price
+    if expected["total"] != total:
+        mistakes.append("total {} != {}".format(expected["total"], total))
+    if len(expected["items"]) != len(receipt.items):
+        mistakes.append("{} items != {}".format(len(expected["items"]), len(receipt.items)))
+        return mistakes
+    for n, (item_expected, item) in enumerate(zip(expected["items"], receipt.items)):
+        if item_expected["desc"] != item.desc or item_expected["price"] != item.price:
+            mistakes.append("#{} <'{}': {}> != <'{}': {}>".format(
+                n, item_expected["desc"], item_expected["price"], item.desc, item.price))
+    return mistakes
+
+
+def render_document(numbered_document: Tuple[int, str], output: str, only_failed: bool = False,
+                    max_size: int = 1600) -> Dict:
+    """
+    analyze a receipt and render its overlays into <output>/<name>/, runs in a worker of render_batch.
+    Errors are returned instead of raised, like in batch.analyze_document.
+    :param only_failed: don't render receipts that match their result.json
+    """
+    name = get_name(numbered_document)
+    report = {"name": name, "overlays": []}
+    try:
+        receipt = load_receipt(numbered_document)
+        receipt.analyze()
+        report["total"] = None if receipt.total is None else receipt.total.price
+        report["items"] = len(receipt.items)
+        expected = load_expected(os.path.dirname(numbered_document[1]))
+        if expected is not None:
+            report["mistakes"] = get_mistakes(receipt, expected)
+            if only_failed and len(report["mistakes"]) == 0:
+                return report
+        instance = Instance(receipt, expected, load_image(os.path.dirname(numbered_document[1]), max_size),
+                            headless=True, fig=get_figure())
+        if instance.im is None:
+            instance.draw_words()
+        os.makedirs(os.path.join(output, name), exist_ok=True)
+        file_names = {overlay: "{}.png".format(overlay) for overlay in OVERLAYS}
+        instance.save_overlays({overlay: os.path.join(output, name, file_name)
+                                for overlay, file_name in file_names.items()})
+        report["overlays"] = list(file_names.values())
+    except Exception as e:
+        report["error"] = "{}: {}".format(type(e).__name__, e)
+    return report
+
+
+def _render_document(args: Tuple[Tuple[int, str], str, bool, int]) -> Dict:
+    return render_document(*args)
+
+
+def render_batch(paths: Iterable[str], output: str, processes: Optional[int] = None, only_failed: bool = False,
+                 max_size: int = 1600) -> Iterator[Dict]:
+    """
+    render many receipts across a pool of worker processes (see batch.analyze_batch)
+    :param paths: of apiResponse.json files, next to them may be an image.jpg and a result.json
+    :return: the reports of the receipts in the same order, as soon as they are available
+    """
+    tasks = ((numbered_path, output, only_failed, max_size) for numbered_path in enumerate(paths))
+    if processes == 1:
+        yield from map(_render_document, tasks)
+        return
+    with Pool(processes) as pool:
+        yield from pool.imap(_render_document, tasks, 4)
+
+
+def is_failed(report: Dict) -> bool:
+    return "error" in report or len(report.get("mistakes", [])) > 0
+
+
+def write_contact_sheet(reports: List[Dict], output: str, thumbnail_width: int = 240) -> str:
+    """
+    write <output>/index.html with the overlays of all receipts, the failed ones first
+    :return: the path of the page
+    """
+    cards = []
+    for report in sorted(reports, key=lambda report_: (not is_failed(report_), report_["name"])):
+        if "error" in report:
+            status, details = "error", [report["error"]]
+        elif "mistakes" not in report:
+            status, details = "unknown", []
+        else:
+            status, details = ("failed" if report["mistakes"] else "correct"), report["mistakes"]
+        images = "".join(
+            '<a href="{0}"><img src="{0}" width="{1}" title="{2}"></a>'.format(
+                html.escape("{}/{}".format(report["name"], file_name)), thumbnail_width,
+                html.escape(os.path.splitext(file_name)[0]))
+            for file_name in report["overlays"])
+        cards.append('<div class="{}"><h3>{} ({})</h3><p>total: {}, items: {}</p><ul>{}</ul>{}</div>'.format(
+            status, html.escape(report["name"]), status, report.get("total"), report.get("items"),
+            "".join("<li>{}</li>".format(html.escape(detail)) for detail in details), images))
+
+    path = os.path.join(output, "index.html")
+    with open(path, "w") as f:
+        f.write("<!DOCTYPE html>\n<html><head><meta charset=\"utf-8\"><title>pennydetective</title><style>"
+                "div {{ margin: 1em 0; padding: 0.5em; border-left: 6px solid #999; }} "
+                ".failed, .error {{ border-color: #c33; }} .correct {{ border-color: #3a3; }} "
+                "img {{ margin-right: 4px; border: 1px solid #ccc; }}"
+                "</style></head><body>\n<h1>{} receipts, {} failed</h1>\n{}\n</body></html>\n".format(
+                    len(reports), sum(map(is_failed, reports)), "\n".join(cards)))
+    return path
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Render the overlays of many receipts into an HTML contact sheet")
+    parser.add_argument("paths", nargs="+",
+                        help="apiResponse.json files or directories containing <name>/apiResponse.json")
+    parser.add_argument("--output", required=True, help="folder of the overlays and index.html")
+    parser.add_argument("--processes", type=int, default=None,
+                        help="number of worker processes, defaults to the number of CPUs")
+    parser.add_argument("--only_failed", action="store_true", default=False,
+                        help="only render receipts that differ from their result.json")
+    parser.add_argument("--max_size", type=int, default=1600, help="pixels of the longer side of an overlay")
+    args = parser.parse_args()
+
+    documents = []
+    for path in args.paths:
+        documents.extend(find_documents(path) if os.path.isdir(path) else [path])
+    os.makedirs(args.output, exist_ok=True)
+    all_reports = list(render_batch(documents, args.output, args.processes, args.only_failed, args.max_size))
+    print(write_contact_sheet(all_reports, args.output))
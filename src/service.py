@@ -0,0 +1,241 @@
+import argparse
+import json
+import logging
+import os
+import threading
+from functools import partial
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from multiprocessing import Pool, TimeoutError
+from socketserver import ThreadingMixIn, UnixStreamServer
+from typing import Dict, List, Optional
+
+import analyze
+from matcher import get_matcher
+from receipt import Receipt
+
+logger = logging.getLogger("pennydetective.service")
+
+
+def warm_up():
+    """
+    runs once in every worker before its first document: everything that is built lazily
+    (the keyword matcher, the tokenizer patterns and its cache, the lexicon of the spellchecker and the templates,
+    see analyze.prepare_receipt) is built now and not during the first request.
+    """
+    get_matcher(Receipt.TOTAL_WORDS)
+    Receipt.TOKENIZER.tokenize(["SUMME", "1,99", "28.07.2018"])
+    analyze.get_spellchecker()
+    analyze.get_templates()
+
+
+def get_local_path(path: str, data_root: Optional[str]) -> Optional[str]:
+    """
+    :return: the real path of the file `path` (relative to data_root) if it is below data_root, else None.
+    Symbolic links and '..' are resolved first, so that a request can't read other files of the service.
+    """
+    if data_root is None:
+        return None
+    root = os.path.realpath(data_root)
+    real_path = os.path.realpath(os.path.join(root, path))
+    if os.path.commonpath([root, real_path]) != root or not os.path.isfile(real_path):
+        return None
+    return real_path
+
+
+def analyze_request(request: Dict, data_root: Optional[str] = None) -> Dict:
+    """
+    :param request: a textract response (with "Blocks") or {"path": ...}, the path of an apiResponse.json
+    below data_root or else the key of an image in the bucket, like event["path"] of the lambda.
+    :param data_root: the folder whose files may be analyzed, without one every path is a key in the bucket
+    :return: {"result": ...} or {"error": ...}, errors are returned instead of raised like in batch.analyze_document
+    """
+    try:
+        if not isinstance(request, dict):
+            raise ValueError("Expected a textract response or {\"path\": ...}")
+        if "Blocks" in request:
+            receipt = analyze.prepare_receipt(Receipt(request))
+        elif "path" in request:
+            local_path = get_local_path(request["path"], data_root)
+            if local_path is None:
+                return {"result": analyze.analyze_path(request["path"])}
+            with open(local_path, "rb") as f:
+                receipt = analyze.prepare_receipt(Receipt.from_stream(f, name=request["path"]))
+        else:
+            raise ValueError("Expected a textract response or {\"path\": ...}")
+        receipt.analyze()
+        return {"result": receipt.get_json()}
+    except Exception as e:
+        return {"error": "{}: {}".format(type(e).__name__, e)}
+
+
+class Service:
+    """
+    a pool of warm worker processes. At most `max_pending` documents are analyzed or waiting at once,
+    further requests are rejected right away (backpressure) instead of queueing without limit.
+    """
+
+    def __init__(self, workers: Optional[int] = None, max_pending: int = 64, timeout: float = 30.,
+                 data_root: Optional[str] = None):
+        """
+        :param workers: number of worker processes, defaults to the number of CPUs. With 1 the documents are
+        analyzed in the threads of the server
+        :param timeout: seconds a request may take before it fails
+        :param data_root: requests may name apiResponse.json files below this folder, see analyze_request
+        """
+        self.max_pending = max_pending
+        self.timeout = timeout
+        self.data_root = data_root
+        self.pending = 0
+        self._lock = threading.Lock()
+        if workers == 1:
+            warm_up()
+            self.pool = None
+        else:
+            self.pool = Pool(workers, initializer=warm_up)
+
+    def admit(self, number: int) -> bool:
+        """ reserve room for `number` documents, :return: False if there is not enough """
+        with self._lock:
+            if self.pending + number > self.max_pending:
+                return False
+            self.pending += number
+            return True
+
+    def release(self, number: int):
+        with self._lock:
+            self.pending -= number
+
+    def analyze(self, requests: List[Dict]) -> List[Dict]:
+        """
+        analyze requests that were admitted, their room is released when they are done. After a timeout they
+        keep running in the workers, so their room is only released then and not when the timeout is raised.
+        :return: one result per request in the same order, the requests of a batch are spread over the workers
+        """
+        if self.pool is None:
+            try:
+                return [analyze_request(request, self.data_root) for request in requests]
+            finally:
+                self.release(len(requests))
+
+        def release(_):
+            self.release(len(requests))
+
+        return self.pool.map_async(partial(analyze_request, data_root=self.data_root), requests, chunksize=1,
+                                   callback=release, error_callback=release).get(self.timeout)
+
+    @property
+    def status(self) -> Dict:
+        return {"pending": self.pending, "max_pending": self.max_pending}
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.terminate()
+            self.pool.join()
+
+
+class AnalyzeHandler(BaseHTTPRequestHandler):
+    """
+    POST /analyze with a request (see analyze_request) or a list of them as body, answers with the result(s).
+    GET /health answers with the status of the service.
+    """
+    protocol_version = "HTTP/1.1"
+
+    def send_json(self, status: int, body, headers: Optional[Dict[str, str]] = None):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        if self.path == "/health":
+            self.send_json(200, self.server.service.status)
+        else:
+            self.send_json(404, {"error": "Not found"})
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        if self.path != "/analyze":
+            self.send_json(404, {"error": "Not found"})
+            return
+        try:
+            request = json.loads(body.decode())
+        except ValueError as e:
+            self.send_json(400, {"error": "Invalid JSON: {}".format(e)})
+            return
+
+        service = self.server.service
+        requests = request if isinstance(request, list) else [request]
+        if len(requests) > service.max_pending:
+            self.send_json(413, {"error": "A batch may have at most {} documents".format(service.max_pending)})
+            return
+        if not service.admit(len(requests)):
+            self.send_json(503, {"error": "Too many pending documents"}, {"Retry-After": "1"})
+            return
+        try:
+            results = service.analyze(requests)
+        except TimeoutError:
+            self.send_json(504, {"error": "Timeout after {} seconds".format(service.timeout)})
+            return
+        self.send_json(200, results if isinstance(request, list) else results[0])
+
+    def address_string(self):
+        # the client of a unix socket has no address
+        return self.client_address[0] if isinstance(self.client_address, tuple) else "unix"
+
+    def log_message(self, format, *args):
+        logger.info("%s %s", self.address_string(), format % args)
+
+
+class ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class ThreadingUnixHTTPServer(ThreadingMixIn, UnixStreamServer):
+    daemon_threads = True
+
+
+def make_server(service: Service, host: str = "127.0.0.1", port: int = 8080, socket_path: Optional[str] = None):
+    """ :return: a server that answers every request in its own thread, on a unix socket if socket_path is given """
+    if socket_path is not None:
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+        server = ThreadingUnixHTTPServer(socket_path, AnalyzeHandler)
+    else:
+        server = ThreadingHTTPServer((host, port), AnalyzeHandler)
+    server.service = service
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Analyze textract responses in a long running service. Like the lambda, descriptions are "
+                    "corrected with the lexicon in ANALYZE_LEXICON and known stores are analyzed with the templates "
+                    "in ANALYZE_TEMPLATES.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--socket", default=None, help="listen on this unix socket instead of host:port")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="number of worker processes, defaults to the number of CPUs")
+    parser.add_argument("--max_pending", type=int, default=64,
+                        help="documents that may be analyzed or waiting at once, more are rejected with 503")
+    parser.add_argument("--timeout", type=float, default=30., help="seconds a request may take")
+    parser.add_argument("--data_root", default=None,
+                        help="requests may name apiResponse.json files below this folder, other paths are S3 keys")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    analyzer = Service(workers=args.workers, max_pending=args.max_pending, timeout=args.timeout,
+                       data_root=args.data_root)
+    http_server = make_server(analyzer, args.host, args.port, args.socket)
+    logger.info("Listening on %s", args.socket or "{}:{}".format(args.host, args.port))
+    try:
+        http_server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        http_server.server_close()
+        analyzer.close()
@@ -0,0 +1,82 @@
+import math
+from typing import Optional
+
+import numpy as np
+
+from util import Point
+
+
+class GridIndex:
+    """
+    buckets points (e.g. block centers in rotated receipt coordinates) into square cells.
+    The points of a cell are contiguous in `order`, cells are numbered column by column (x-major),
+    so all cells of one grid column between two rows are a single slice.
+    Queries return candidates: a superset of the points that fulfil the query, sorted by index.
+    """
+
+    def __init__(self, points: np.ndarray, cell_size: float):
+        self.points = np.asarray(points, dtype=float).reshape(-1, 2)
+        self.cell_size = cell_size
+        if len(self.points) == 0:
+            self.origin, self.shape = np.zeros(2), (0, 0)
+            self.order, self.starts = np.zeros(0, dtype=int), np.zeros(1, dtype=int)
+            return
+        self.origin = self.points.min(axis=0)
+        cells = self._cells(self.points)
+        self.shape = tuple(cells.max(axis=0) + 1)
+        flat = cells[:, 0] * self.shape[1] + cells[:, 1]
+        self.order = np.argsort(flat, kind="stable")
+        self.starts = np.searchsorted(flat[self.order], np.arange(self.shape[0] * self.shape[1] + 1))
+
+    def _cells(self, points: np.ndarray) -> np.ndarray:
+        return np.floor((points - self.origin) / self.cell_size).astype(int)
+
+    def __len__(self):
+        return len(self.points)
+
+    def _column_slices(self, column: int, row_min: int, row_max: int) -> np.ndarray:
+        row_min, row_max = max(row_min, 0), min(row_max, self.shape[1] - 1)
+        if row_min > row_max:
+            return self.order[0:0]
+        first = column * self.shape[1]
+        return self.order[self.starts[first + row_min]:self.starts[first + row_max + 1]]
+
+    def query_radius(self, center: Point, radius: float) -> np.ndarray:
+        """ :return: candidates for the points within `radius` of `center` """
+        if len(self) == 0:
+            return np.zeros(0, dtype=int)
+        (column_min, row_min), (column_max, row_max) = self._cells(
+            np.array([[center[0] - radius, center[1] - radius], [center[0] + radius, center[1] + radius]]))
+        parts = [self._column_slices(column, row_min, row_max)
+                 for column in range(max(column_min, 0), min(column_max, self.shape[0] - 1) + 1)]
+        return np.sort(np.concatenate(parts)) if len(parts) > 0 else np.zeros(0, dtype=int)
+
+    def query_band(self, point: Point, direction: Point, half_width: float,
+                   x_max: Optional[float] = None) -> np.ndarray:
+        """
+        :param point: a point on the line in the middle of the band
+        :param direction: direction of this line, it must not be vertical
+        :param half_width: the maximum distance of a point to the line
+        :param x_max: only points left of this x are needed
+        :return: candidates for the points within the band, e.g. the row of a price
+        """
+        if len(self) == 0:
+            return np.zeros(0, dtype=int)
+        if abs(direction[0]) < 1e-9:
+            return np.arange(len(self))
+        slope = direction[1] / direction[0]
+        # vertical extent of the band, plus a little to never miss a point because of rounding
+        half_height = half_width * math.sqrt(1 + slope ** 2) + 1e-9
+        column_max = self.shape[0] - 1
+        if x_max is not None:
+            column_max = min(column_max, int(math.floor((x_max - self.origin[0]) / self.cell_size)))
+
+        parts = []
+        for column in range(column_max + 1):
+            x0 = self.origin[0] + column * self.cell_size
+            y0 = point[1] + (x0 - point[0]) * slope
+            y1 = y0 + self.cell_size * slope
+            row_min = int(math.floor((min(y0, y1) - half_height - self.origin[1]) / self.cell_size))
+            row_max = int(math.floor((max(y0, y1) + half_height - self.origin[1]) / self.cell_size))
+            parts.append(self._column_slices(column, row_min, row_max))
+        return np.sort(np.concatenate(parts)) if len(parts) > 0 else np.zeros(0, dtype=int)
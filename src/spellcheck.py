@@ -0,0 +1,277 @@
+import argparse
+import hashlib
+import json
+import os
+import re
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+import numpy as np
+
+from item import Item
+
+LEXICON_VERSION = 3
+FNV_OFFSET, FNV_PRIME = np.uint64(14695981039346656037), np.uint64(1099511628211)
+# words with at least one letter, letters misread as digits are part of them, but numbers and prices are not
+WORD = re.compile(r"\b(?=\w*[^\W\d_])\w+\b")
+
+# characters that OCR confuses, replacing one with the other costs less than another substitution
+CONFUSIONS = {
+    ("i", "l"): 0.3, ("i", "1"): 0.3, ("l", "1"): 0.3, ("o", "0"): 0.3, ("s", "5"): 0.4, ("b", "8"): 0.4,
+    ("e", "c"): 0.5, ("a", "o"): 0.6, ("u", "v"): 0.5, ("n", "h"): 0.6, ("g", "9"): 0.5, ("z", "2"): 0.5,
+    ("ä", "a"): 0.3, ("ö", "o"): 0.3, ("ü", "u"): 0.3,
+}
+# two characters that are read as one
+SPLITS = {("rn", "m"): 0.3, ("cl", "d"): 0.4, ("vv", "w"): 0.3, ("ii", "u"): 0.5}
+# receipts are often cut off at the left, so letters missing at the start of a word are cheaper
+PREFIX_INSERTION_COST = 0.5
+
+
+def hash_strings(strings: List[str]) -> np.ndarray:
+    """ :return: the 64 bit FNV-1a hashes of the UTF-8 encoded strings, computed for all strings at once """
+    encoded = [string.encode() for string in strings]
+    lengths = np.array([len(e) for e in encoded], dtype=np.int64)
+    hashes = np.full(len(encoded), FNV_OFFSET, dtype=np.uint64)
+    if len(encoded) == 0 or lengths.max() == 0:
+        return hashes
+    data = np.zeros((len(encoded), lengths.max()), dtype=np.uint8)
+    rows = np.repeat(np.arange(len(encoded)), lengths)
+    columns = np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+    data[rows, columns] = np.frombuffer(b"".join(encoded), dtype=np.uint8)
+    for column in range(data.shape[1]):
+        active = lengths > column
+        hashes = np.where(active, (hashes ^ data[:, column].astype(np.uint64)) * FNV_PRIME, hashes)
+    return hashes
+
+
+def get_deletes(word: str, max_distance: int) -> Set[str]:
+    """ :return: the word and all strings that are left when up to max_distance characters are deleted """
+    deletes, current = {word}, {word}
+    for _ in range(max_distance):
+        current = {w[:i] + w[i + 1:] for w in current for i in range(len(w))}
+        deletes |= current
+    return deletes
+
+
+def substitution_cost(a: str, b: str) -> float:
+    if a == b:
+        return 0.
+    return CONFUSIONS.get((a, b), CONFUSIONS.get((b, a), 1.))
+
+
+def ocr_distance(source: str, target: str, max_cost: float) -> float:
+    """
+    a weighted Damerau-Levenshtein distance: substitutions of CONFUSIONS and SPLITS are cheaper,
+    and so are letters of the target that are missing at the start of the source.
+    :return: the cost to turn source into target, or inf as soon as it is sure to be more than max_cost
+    """
+    n, m = len(source), len(target)
+    if abs(n - m) > max_cost / PREFIX_INSERTION_COST:
+        return float("inf")
+    previous2 = None
+    previous = [j * PREFIX_INSERTION_COST for j in range(m + 1)]
+    for i in range(1, n + 1):
+        current = [float(i)] + [0.] * m
+        for j in range(1, m + 1):
+            cost = min(previous[j] + 1,  # delete from source
+                       current[j - 1] + 1,  # insert into source
+                       previous[j - 1] + substitution_cost(source[i - 1], target[j - 1]))
+            if i > 1 and j > 1 and source[i - 1] == target[j - 2] and source[i - 2] == target[j - 1]:
+                cost = min(cost, previous2[j - 2] + 1)  # transposition
+            if i > 1:
+                split_cost = SPLITS.get((source[i - 2:i], target[j - 1]))
+                if split_cost is not None:
+                    cost = min(cost, previous2[j - 1] + split_cost)
+            if j > 1:
+                split_cost = SPLITS.get((target[j - 2:j], source[i - 1]))
+                if split_cost is not None:
+                    cost = min(cost, previous[j - 2] + split_cost)
+            current[j] = cost
+        # a split can skip a row, so only stop if the last two rows are too expensive
+        if min(current) > max_cost and (previous2 is None or min(previous) > max_cost):
+            return float("inf")
+        previous2, previous = previous, current
+    return previous[m]
+
+
+def build_lexicon(word_counts: Dict[str, int], path: str, max_distance: int = 2):
+    """
+    write a symmetric delete lexicon into the folder `path`: the words, their counts and the sorted hashes
+    of all their deletes. Each file is a plain .npy file, so that a Lexicon can memory-map them.
+    """
+    words = sorted({word.lower() for word in word_counts})
+    counts = {}
+    for word, count in word_counts.items():
+        counts[word.lower()] = counts.get(word.lower(), 0) + count
+    encoded = [word.encode() for word in words]
+
+    delete_hashes, delete_words = [], []
+    for word_id, word in enumerate(words):
+        deletes = list(get_deletes(word, max_distance))
+        delete_hashes.extend(deletes)
+        delete_words.extend([word_id] * len(deletes))
+    hashes = hash_strings(delete_hashes)
+    order = np.argsort(hashes, kind="stable")
+
+    word_counts = np.array([counts[word] for word in words], dtype=np.int64)
+    # the other files follow from the words, their counts and max_distance
+    checksum = hashlib.md5(b"".join(encoded) + b"\0" + word_counts.tobytes() + bytes([max_distance])).hexdigest()
+
+    os.makedirs(path, exist_ok=True)
+    with open(os.path.join(path, "words.bin"), "wb") as f:
+        f.write(b"".join(encoded))
+    np.save(os.path.join(path, "offsets.npy"), np.cumsum([0] + [len(e) for e in encoded]).astype(np.int64))
+    np.save(os.path.join(path, "counts.npy"), word_counts)
+    np.save(os.path.join(path, "hashes.npy"), hashes[order])
+    np.save(os.path.join(path, "word_ids.npy"), np.array(delete_words, dtype=np.int32)[order])
+    with open(os.path.join(path, "lexicon.json"), "w") as f:
+        json.dump({"version": LEXICON_VERSION, "max_distance": max_distance, "words": len(words),
+                   "checksum": checksum}, f)
+
+
+class Lexicon:
+    """ a lexicon written by build_lexicon, memory-mapped so that only the pages that are looked up are read """
+
+    def __init__(self, path: str):
+        with open(os.path.join(path, "lexicon.json")) as f:
+            meta = json.load(f)
+        if meta["version"] != LEXICON_VERSION:
+            raise ValueError("Lexicon {} has version {}, rebuild it".format(path, meta["version"]))
+        self.path = path
+        self.max_distance = meta["max_distance"]
+        self.checksum = meta["checksum"]  # of the content, a rebuilt lexicon has another one
+        self.words = np.memmap(os.path.join(path, "words.bin"), dtype=np.uint8, mode="r") \
+            if os.path.getsize(os.path.join(path, "words.bin")) > 0 else np.zeros(0, dtype=np.uint8)
+        self.offsets = np.load(os.path.join(path, "offsets.npy"), mmap_mode="r")
+        self.counts = np.load(os.path.join(path, "counts.npy"), mmap_mode="r")
+        self.hashes = np.load(os.path.join(path, "hashes.npy"), mmap_mode="r")
+        self.word_ids = np.load(os.path.join(path, "word_ids.npy"), mmap_mode="r")
+
+    def __len__(self):
+        return len(self.counts)
+
+    def word(self, word_id: int) -> str:
+        return self.words[self.offsets[word_id]:self.offsets[word_id + 1]].tobytes().decode()
+
+    def candidates(self, word: str, max_distance: int) -> np.ndarray:
+        """
+        :return: ids of the words that share a delete with the word and are at most max_distance characters
+        longer or shorter, a superset of those within max_distance edits
+        """
+        hashes = hash_strings(list(get_deletes(word, max_distance)))
+        lo = np.searchsorted(self.hashes, hashes, side="left")
+        hi = np.searchsorted(self.hashes, hashes, side="right")
+        if (hi - lo).sum() == 0:
+            return np.zeros(0, dtype=np.int64)
+        word_ids = np.array(sorted(set(np.concatenate([self.word_ids[start:end] for start, end in zip(lo, hi)]))))
+        lengths = self.offsets[word_ids + 1] - self.offsets[word_ids]
+        return word_ids[np.abs(lengths - len(word.encode())) <= max_distance]
+
+
+class SpellChecker:
+    """
+    corrects misread words of item descriptions. The corrections are cached, so words that appear on many receipts
+    are looked up only once per process.
+    """
+
+    def __init__(self, lexicon: Lexicon, max_cost: float = 1.5, min_length: int = 4, cache_size: int = 1 << 16):
+        """
+        :param max_cost: words whose best correction costs more than this (see ocr_distance) are kept
+        :param min_length: shorter words are kept, there are too many similar words
+        """
+        self.lexicon = lexicon
+        self.max_cost = max_cost
+        self.min_length = min_length
+        self.cache_size = cache_size
+        self._cache: Dict[str, str] = {}
+        self.version = 0  # see changed()
+
+    def changed(self):
+        """
+        call after changing max_cost or min_length: the cached corrections are dropped
+        and receipts correct their items again
+        """
+        self._cache.clear()
+        self.version += 1
+
+    @classmethod
+    def from_path(cls, path: str, **kwargs) -> "SpellChecker":
+        return cls(Lexicon(path), **kwargs)
+
+    def correct_word(self, word: str) -> str:
+        correction = self._cache.get(word)
+        if correction is None:
+            if len(self._cache) >= self.cache_size:
+                self._cache.clear()
+            correction = self._cache[word] = self._correct_word(word)
+        return correction
+
+    def _correct_word(self, word: str) -> str:
+        lower = word.lower()
+        if len(lower) < self.min_length:
+            return word
+        # short words get fewer edits, otherwise almost every other short word would be a candidate
+        max_distance = min(self.lexicon.max_distance, len(lower) // 3)
+        # a split (rn read for m) takes two edits, so the word with the split undone is looked up, too
+        variants = [lower] + [lower.replace(read, meant) for read, meant in SPLITS if read in lower]
+        word_ids = sorted(set().union(*(self.lexicon.candidates(variant, max_distance).tolist()
+                                        for variant in variants)))
+        best: Optional[Tuple[float, int, str]] = None
+        for word_id in word_ids:
+            candidate = self.lexicon.word(word_id)
+            if candidate == lower:
+                return word
+            # only look for corrections that are at least as good as the best one so far
+            cost = ocr_distance(lower, candidate, self.max_cost if best is None else best[0])
+            count = -int(self.lexicon.counts[word_id])
+            if cost <= self.max_cost and (best is None or (cost, count) < best[:2]):
+                best = (cost, count, candidate)
+        if best is None:
+            return word
+        return match_case(best[2], word)
+
+    def correct(self, text: str) -> str:
+        """ correct all words of a text, numbers and punctuation are kept """
+        return WORD.sub(lambda match: self.correct_word(match.group()), text)
+
+    def correct_items(self, items: List[Item]):
+        """ correct the descriptions as they were read, so correcting twice doesn't change them again """
+        for item in items:
+            item.desc = self.correct(item.desc_block.text)
+
+
+def match_case(word: str, original: str) -> str:
+    """ :return: word written like the original: upper case, capitalized or lower case """
+    if original.isupper():
+        return word.upper()
+    if original[:1].isupper():
+        return word[:1].upper() + word[1:]
+    return word
+
+
+def count_words(texts: Iterable[str]) -> Dict[str, int]:
+    """ :return: how often each word occurs in the texts, split into words like SpellChecker.correct does """
+    counts: Dict[str, int] = {}
+    for text in texts:
+        for word in WORD.findall(text.lower()):
+            counts[word] = counts.get(word, 0) + 1
+    return counts
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build a lexicon for the spellchecker")
+    parser.add_argument("sources", nargs="+",
+                        help="text files with words, or folders of an item export (see export.py)")
+    parser.add_argument("--output", required=True, help="folder of the lexicon")
+    parser.add_argument("--max_distance", type=int, default=2)
+    args = parser.parse_args()
+
+    texts: List[str] = []
+    for source in args.sources:
+        if os.path.isdir(source):
+            from export import iter_chunks
+            for chunk in iter_chunks(source, ["desc"]):
+                texts.extend(chunk["desc"].tolist())
+        else:
+            with open(source) as source_file:
+                texts.extend(source_file)
+    build_lexicon(count_words(texts), args.output, args.max_distance)
@@ -0,0 +1,212 @@
+import argparse
+import hashlib
+import json
+import os
+import re
+from typing import Dict, List, Optional, Set, Tuple
+
+import numpy as np
+
+from matcher import Keyword
+
+TEMPLATE_VERSION = 1
+WORD = re.compile(r"[^\W\d_]{3,}")
+
+
+def get_lines(receipt) -> np.ndarray:
+    """
+    :return: the rotated coordinates of the left and right centers of all lines, shape (2, lines, 2).
+    They are rotated at once, the center of a line is the mean of both.
+    """
+    indices = receipt.line_indices
+    geometry = receipt.geometry
+    return receipt.rotate(np.concatenate((geometry.left_center[indices], geometry.right_center[indices]))) \
+        .reshape(2, -1, 2)
+
+
+def get_header(receipt, header_lines: int = 4, lines: Optional[np.ndarray] = None) -> Set[str]:
+    """
+    the fingerprint of a receipt: the character trigrams of the words in its top lines (in the direction of writing,
+    so find_writing_angle has to run before). Numbers are left out, they differ on every receipt (date, time).
+    Trigrams instead of words, so that a misread character only changes a few of them.
+    :param lines: see get_lines
+    """
+    lines = get_lines(receipt) if lines is None else lines
+    heights = lines[0, :, 1] + lines[1, :, 1]  # twice the heights of the centers
+    top = np.argsort(heights, kind="stable")[:header_lines]
+    text = " ".join(receipt.lines[idx].text for idx in top).lower()
+    words = [" {} ".format(word) for word in WORD.findall(text)]
+    return {word[i:i + 3] for word in words for i in range(len(word) - 2)}
+
+
+def get_text_extent(receipt, lines: Optional[np.ndarray] = None) -> Tuple[float, float]:
+    """ :return: the leftmost and rightmost x of the lines in rotated coordinates, where the text of the receipt is """
+    lines = get_lines(receipt) if lines is None else lines
+    return (float(lines[0, :, 0].min()), float(lines[1, :, 0].max())) if lines.shape[1] > 0 else (0., 1.)
+
+
+class Template:
+    """
+    the layout of the receipts of a store: where its price column is, relative to the width of the text,
+    and which of Receipt.TOTAL_WORDS it prints in front of the total
+    """
+    __slots__ = ("header", "column_x", "total_word", "count")
+
+    def __init__(self, header: Set[str], column_x: float, total_word: str, count: int = 1):
+        self.header = header
+        self.column_x = column_x
+        self.total_word = total_word
+        self.count = count  # number of analyses the template was learned from
+
+    @property
+    def json(self) -> Dict:
+        return {"header": sorted(self.header), "column_x": self.column_x, "total_word": self.total_word,
+                "count": self.count}
+
+    @classmethod
+    def from_json(cls, template_json: Dict) -> "Template":
+        return cls(set(template_json["header"]), template_json["column_x"], template_json["total_word"],
+                   template_json["count"])
+
+    def similarity(self, header: Set[str]) -> float:
+        """ Jaccard similarity of the headers """
+        union = len(self.header | header)
+        return len(self.header & header) / union if union > 0 else 0.
+
+    def __repr__(self):
+        return "Template({} x {:.3f}, {} times)".format(self.total_word, self.column_x, self.count)
+
+
+class TemplateStore:
+    """
+    the templates learned from earlier analyses, in a JSON file. A receipt whose header is similar enough to the
+    header of a template is analyzed with its layout (see Receipt.match_template), the others as usual.
+    """
+
+    def __init__(self, path: Optional[str] = None, min_similarity: float = 0.4, min_count: int = 1,
+                 column_tolerance: float = 0.03):
+        """
+        :param path: the JSON file of the templates, it is read if it exists and written by save()
+        :param min_similarity: of the headers, see get_header
+        :param min_count: templates learned from less analyses are not used yet
+        :param column_tolerance: how far (relative to the width of the text) a price may be from the column
+        """
+        self.path = path
+        self.min_similarity = min_similarity
+        self.min_count = min_count
+        self.column_tolerance = column_tolerance
+        self.templates: List[Template] = []
+        self._index: Dict[str, List[int]] = {}  # the templates by the trigrams of their headers
+        self.version = 0  # increases with every change, so that receipts match their template again
+        if path is not None and os.path.isfile(path):
+            with open(path) as f:
+                data = json.load(f)
+            if data["version"] != TEMPLATE_VERSION:
+                raise ValueError("Templates {} have version {}, learn them again".format(path, data["version"]))
+            for template_json in data["templates"]:
+                self._add(Template.from_json(template_json))
+
+    def __len__(self):
+        return len(self.templates)
+
+    def _add(self, template: Template):
+        for gram in template.header:
+            self._index.setdefault(gram, []).append(len(self.templates))
+        self.templates.append(template)
+        self.version += 1
+
+    def find(self, header: Set[str]) -> Optional[Template]:
+        """ :return: the template with the most similar header, if it is similar enough """
+        overlaps: Dict[int, int] = {}
+        for gram in header:
+            for template_id in self._index.get(gram, ()):
+                overlaps[template_id] = overlaps.get(template_id, 0) + 1
+        best, best_similarity = None, self.min_similarity
+        for template_id, overlap in sorted(overlaps.items()):
+            template = self.templates[template_id]
+            similarity = overlap / (len(template.header) + len(header) - overlap)
+            if similarity >= best_similarity:
+                best, best_similarity = template, similarity
+        return best
+
+    def match(self, receipt) -> Optional[Tuple[Template, Tuple[float, float]]]:
+        """
+        :return: the template of the receipt, if it is known well enough,
+        and where its price column is on the receipt: the range of rotated x that prices in it may have
+        """
+        lines = get_lines(receipt)
+        template = self.find(get_header(receipt, lines=lines))
+        if template is None or template.count < self.min_count:
+            return None
+        left, right = get_text_extent(receipt, lines)
+        width = right - left
+        return template, (left + (template.column_x - self.column_tolerance) * width,
+                          left + (template.column_x + self.column_tolerance) * width)
+
+    def learn(self, receipt) -> Optional[Template]:
+        """
+        learn the layout of an analyzed receipt, but only if its items add up to its total, so that wrong
+        analyses don't become templates
+        :return: the new or updated template
+        """
+        if receipt.total is None or len(receipt.items) == 0 or receipt.reconciliation is None \
+                or receipt.reconciliation.gap != 0:
+            return None
+        lines = get_lines(receipt)
+        left, right = get_text_extent(receipt, lines)
+        xs = receipt.rotate(receipt.geometry.poly[[item.price_block.idx for item in receipt.items], 1])
+        column_x = float(np.mean((xs.reshape(-1, 2)[:, 0] - left) / max(right - left, 1e-12)))
+        text = receipt.total_desc.text.lower()
+        total_word = max(receipt.TOTAL_WORDS, key=lambda word: Keyword(word).ratio(text))
+
+        header = get_header(receipt, lines=lines)
+        template = self.find(header)
+        if template is None:
+            template = Template(header, column_x, total_word)
+            self._add(template)
+        else:
+            template.column_x = (template.column_x * template.count + column_x) / (template.count + 1)
+            template.total_word = total_word
+            template.count += 1
+            self.version += 1
+        return template
+
+    @property
+    def json(self) -> Dict:
+        return {"version": TEMPLATE_VERSION, "templates": [template.json for template in self.templates]}
+
+    @property
+    def checksum(self) -> str:
+        """ of the content, cached results that were found with other templates are not used """
+        return hashlib.md5(json.dumps(self.json, sort_keys=True).encode()).hexdigest()
+
+    def save(self, path: Optional[str] = None):
+        path = path or self.path
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.json, f)
+        os.replace(tmp_path, path)  # a reader never sees half a file
+
+
+if __name__ == "__main__":
+    from batch import find_documents, load_receipt
+
+    parser = argparse.ArgumentParser(description="Learn the layouts of stores from analyzed receipts")
+    parser.add_argument("paths", nargs="+",
+                        help="apiResponse.json files or directories containing <name>/apiResponse.json")
+    parser.add_argument("--output", required=True, help="JSON file of the templates, new ones are added to it")
+    args = parser.parse_args()
+
+    store = TemplateStore(args.output)
+    documents = []
+    for path in args.paths:
+        documents.extend(find_documents(path) if os.path.isdir(path) else [path])
+    for numbered_document in enumerate(documents):
+        try:
+            document_receipt = load_receipt(numbered_document)
+            document_receipt.analyze()
+        except Exception as e:
+            print("[{}] {}: {}".format(numbered_document[1], type(e).__name__, e))
+            continue
+        print("[{}] {}".format(numbered_document[1], store.learn(document_receipt)))
+    store.save()
@@ -0,0 +1,36 @@
+import json
+import os
+from unittest import TestCase
+
+from batch import analyze_batch, find_documents
+
+
+class TestBatch(TestCase):
+    DATA_PATH = "../data/"
+
+    def test_find_documents(self):
+        paths = find_documents(self.DATA_PATH)
+        self.assertGreater(len(paths), 0)
+        self.assertEqual(paths, sorted(paths))
+        for path in paths:
+            self.assertEqual(os.path.basename(path), "apiResponse.json")
+
+    def test_analyze_batch(self):
+        paths = find_documents(self.DATA_PATH)
+        with open(paths[0]) as f:
+            response = json.load(f)
+        documents = paths + [response, {"Blocks": None}]
+
+        results = list(analyze_batch(documents, processes=2))
+        self.assertEqual(len(results), len(documents))
+        # results come back in order
+        for path, result in zip(paths, results):
+            self.assertEqual(result["name"], os.path.basename(os.path.dirname(path)))
+        self.assertEqual(results[len(paths)]["name"], str(len(paths)))
+        self.assertEqual(results[len(paths)]["result"], results[0]["result"])
+        # a broken document doesn't stop the batch
+        self.assertIn("error", results[-1])
+
+    def test_analyze_batch_in_process(self):
+        paths = find_documents(self.DATA_PATH)[:3]
+        self.assertEqual(list(analyze_batch(paths, processes=1)), list(analyze_batch(paths, processes=2)))
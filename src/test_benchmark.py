@@ -0,0 +1,27 @@
+import json
+from unittest import TestCase
+
+from benchmark import load_corpus, run_benchmark, stack_response
+
+
+class TestBenchmark(TestCase):
+    DATA_PATH = "../data/"
+
+    def test_stack_response(self):
+        name, response, _ = load_corpus(self.DATA_PATH)[0]
+        response = json.loads(response)
+        stacked = stack_response(response, 3)
+        self.assertEqual(len(stacked["Blocks"]), 3 * len(response["Blocks"]))
+        self.assertEqual(len({block["Id"] for block in stacked["Blocks"]}), len(stacked["Blocks"]))
+        for block in stacked["Blocks"]:
+            for point in block["Geometry"]["Polygon"]:
+                self.assertTrue(0 <= point["Y"] <= 1)
+
+    def test_run_benchmark(self):
+        benchmark = run_benchmark(self.DATA_PATH, docs=4)
+        self.assertEqual(benchmark["config"]["docs"], 4)
+        for stage in ("parse", "find_prices", "find_items", "total"):
+            self.assertIn("p99", benchmark["latency_ms"][stage])
+        self.assertGreater(benchmark["throughput"], 0)
+        self.assertGreater(benchmark["accuracy"]["receipts"], 0)
+        json.dumps(benchmark)
@@ -0,0 +1,34 @@
+from unittest import TestCase
+
+from block import Block
+
+
+class TestBlock(TestCase):
+    BLOCK_JSON = {
+        "BlockType": "WORD", "Confidence": 99.5, "Text": "1,99", "Id": "1b1e147b-49f4-4932-8617-3ef97086b49e",
+        "Geometry": {
+            "BoundingBox": {"Width": 0.2, "Height": 0.1, "Left": 0.1, "Top": 0.4},
+            "Polygon": [{"X": 0.1, "Y": 0.4}, {"X": 0.3, "Y": 0.4}, {"X": 0.3, "Y": 0.5}, {"X": 0.1, "Y": 0.5}]
+        }
+    }
+
+    def test_from_json(self):
+        block = Block.from_json(self.BLOCK_JSON)
+        self.assertEqual(block.id, self.BLOCK_JSON["Id"])
+        self.assertEqual(block.conf, 99.5)
+        self.assertEqual(block.text, "1,99")
+        self.assertIs(block.json, self.BLOCK_JSON)
+        self.assertIsNone(Block.from_json(self.BLOCK_JSON, keep_json=False).json)
+
+    def test_geometry(self):
+        block = Block.from_json(self.BLOCK_JSON)
+        self.assertEqual(tuple(block.top_right), (0.3, 0.4))
+        self.assertAlmostEqual(block.center[0], 0.2)
+        self.assertAlmostEqual(block.center[1], 0.45)
+        for key, value in self.BLOCK_JSON["Geometry"]["BoundingBox"].items():
+            self.assertAlmostEqual(block.bb[key], value)
+
+    def test_slots(self):
+        block = Block.from_json(self.BLOCK_JSON)
+        with self.assertRaises(AttributeError):
+            block.price_column = None
@@ -0,0 +1,88 @@
+import io
+import os
+import tempfile
+from unittest import TestCase
+
+from cache import Cache, DirectoryBackend, MemoryBackend, SQLiteBackend, backend_from_url, content_hash, get_image_hash
+
+
+class FakeS3:
+    """ answers head_object with the given headers and get_object with the body """
+
+    def __init__(self, body: bytes, **head):
+        self.body = body
+        self.head = head
+        self.gets = 0
+
+    def head_object(self, Bucket, Key):
+        return self.head
+
+    def get_object(self, Bucket, Key):
+        self.gets += 1
+        return {"Body": io.BytesIO(self.body)}
+
+
+class TestCache(TestCase):
+
+    def check_lru(self, backend):
+        backend.put("a", b"1")
+        backend.put("b", b"2")
+        self.assertEqual(backend.get("a"), b"1")  # now "b" is the least recently used entry
+        backend.put("c", b"3")
+        self.assertIsNone(backend.get("b"))
+        self.assertEqual(backend.get("a"), b"1")
+        self.assertEqual(backend.get("c"), b"3")
+
+    def test_memory_backend(self):
+        self.check_lru(MemoryBackend(max_entries=2))
+        backend = MemoryBackend(max_bytes=4)
+        backend.put("a", b"12")
+        backend.put("b", b"345")
+        self.assertIsNone(backend.get("a"))
+        self.assertEqual(backend.size, 3)
+
+    def test_directory_backend(self):
+        with tempfile.TemporaryDirectory() as path:
+            backend = DirectoryBackend(path, max_entries=2)
+            backend.put("x/a", b"1")
+            os.utime(os.path.join(path, "x", "a"), (0, 0))
+            backend.put("x/b", b"2")
+            os.utime(os.path.join(path, "x", "b"), (1, 1))
+            backend.put("x/c", b"3")
+            self.assertIsNone(backend.get("x/a"))
+            self.assertEqual(backend.get("x/b"), b"2")
+            self.assertEqual(backend.get("x/c"), b"3")
+
+    def test_sqlite_backend(self):
+        with tempfile.TemporaryDirectory() as path:
+            self.check_lru(SQLiteBackend(os.path.join(path, "cache.db"), max_entries=2))
+            backend = SQLiteBackend(os.path.join(path, "size.db"), max_bytes=4)
+            backend.put("a", b"12")
+            backend.put("b", b"345")
+            self.assertIsNone(backend.get("a"))
+            self.assertEqual(backend.get("b"), b"345")
+
+    def test_cache(self):
+        image_hash = content_hash(b"image")
+        cache = Cache(backend_from_url("memory://"), version="1")
+        self.assertIsNone(cache.get_response(image_hash))
+        cache.put_response(image_hash, {"Blocks": []})
+        cache.put_result(image_hash, {"total": 1.0, "items": []})
+        self.assertEqual(cache.get_response(image_hash), {"Blocks": []})
+        self.assertEqual(cache.get_result(image_hash), {"total": 1.0, "items": []})
+
+        # a new version of the analyzer reuses the textract response but not the result
+        cache.version = "2"
+        self.assertEqual(cache.get_response(image_hash), {"Blocks": []})
+        self.assertIsNone(cache.get_result(image_hash))
+
+    def test_get_image_hash(self):
+        md5 = content_hash(b"image")
+        # the ETag of a single part upload is the MD5, unless the object is encrypted with KMS or a customer key
+        for head, gets in [({}, 0), ({"ServerSideEncryption": "AES256"}, 0), ({"ServerSideEncryption": "aws:kms"}, 1),
+                           ({"SSECustomerAlgorithm": "AES256"}, 1)]:
+            client = FakeS3(b"image", ETag='"{}"'.format(md5 if gets == 0 else "0" * 32), **head)
+            self.assertEqual(get_image_hash("image.jpg", "bucket", client), md5)
+            self.assertEqual(client.gets, gets)
+        client = FakeS3(b"image", ETag='"{}-2"'.format("0" * 32))
+        self.assertEqual(get_image_hash("image.jpg", "bucket", client), md5)
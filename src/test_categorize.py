@@ -0,0 +1,64 @@
+import json
+import os
+import tempfile
+from unittest import TestCase
+
+from categorize import Categorizer, get_ngrams
+from export import ItemWriter
+from receipt import Receipt
+
+
+class TestCategorizer(TestCase):
+    DESCS = ("Vollmilch 3,5%", "Bio Bananen", "Butter", "Brot Vollkorn", "H-MILCH 1,5%", "Butter")
+    CATEGORIES = ("dairy", "fruit", "dairy", "bakery", "dairy", "fat")
+
+    def setUp(self):
+        self.categorizer = Categorizer()
+        self.categorizer.add(self.DESCS, self.CATEGORIES)
+
+    def test_get_ngrams(self):
+        self.assertEqual(get_ngrams("Aa  a"), {" aa": 1, "aa ": 1, "a a": 1, " a ": 1})
+        self.assertEqual(get_ngrams(""), {"  ": 1})
+
+    def test_lookup(self):
+        matches = self.categorizer.lookup(["VOLLMILCH 3.5%", "Bananen", "xyz", "", "butter"])
+        self.assertEqual([None if match is None else match.desc for match in matches],
+                         ["Vollmilch 3,5%", "Bio Bananen", None, None, "Butter"])
+        self.assertAlmostEqual(matches[4].score, 1.)
+        # the first category wins a tie
+        self.assertEqual(matches[4].category, "dairy")
+        self.assertEqual(len(self.categorizer), 5)
+
+    def test_add(self):
+        self.assertIsNone(self.categorizer.lookup(["Äpfel"])[0])
+        self.categorizer.add(["Äpfel", "Butter", "Butter"], ["fruit", "fat", "fat"])
+        self.assertEqual(self.categorizer.lookup(["äpfel", "Butter"]),
+                         [("fruit", 1., "Äpfel"), ("fat", 1., "Butter")])
+        # the same matches as an index that got all descriptions at once
+        merged = Categorizer()
+        merged.add(self.DESCS + ("Äpfel", "Butter", "Butter"), self.CATEGORIES + ("fruit", "fat", "fat"))
+        queries = ["Aepfel", "Milch", "Brot", "Vollkornbrot"]
+        expected = merged.lookup(queries, 0.1)
+        self.assertEqual([match.desc for match in self.categorizer.lookup(queries, 0.1)],
+                         [match.desc for match in expected])
+        # and the same scores once the delta is merged
+        self.categorizer.merge_ratio = 0.
+        self.categorizer.lookup(["Äpfel"])
+        for match, expected_match in zip(self.categorizer.lookup(queries, 0.1), expected):
+            self.assertAlmostEqual(match.score, expected_match.score)
+
+    def test_categorize(self):
+        with open(os.path.join("../data/", "edeka1", "apiResponse.json")) as f:
+            receipt = Receipt(json.load(f))
+        receipt.analyze()
+        receipt.items[0].category = "first"
+        with tempfile.TemporaryDirectory() as path:
+            with ItemWriter(path) as writer:
+                writer.add_receipt(receipt, "edeka1")
+            categorizer = Categorizer.from_export(path)
+        self.assertEqual(len(categorizer), 1)
+
+        receipt.items[0].category = None
+        categorizer.categorize(receipt.items)
+        self.assertEqual(receipt.items[0].category, "first")
+        self.assertEqual(receipt.get_json()["items"][0]["category"], "first")
@@ -0,0 +1,86 @@
+import json
+import os
+import tempfile
+from unittest import TestCase, skipIf
+
+import numpy as np
+
+from batch import find_documents
+from export import COLUMNS, ItemWriter, export_documents, item_columns, iter_chunks, load_items
+from receipt import Receipt
+
+try:
+    import pyarrow
+except ImportError:
+    pyarrow = None
+
+
+class TestExport(TestCase):
+    DATA_PATH = "../data/"
+    NAME = "edeka1"
+
+    def setUp(self):
+        with open(os.path.join(self.DATA_PATH, self.NAME, "apiResponse.json")) as f:
+            self.receipt = Receipt(json.load(f), name=self.NAME)
+        self.receipt.analyze()
+        self.receipt.items[0].category = "food"
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.path = tmp.name
+
+    def test_item_columns(self):
+        columns = item_columns(self.receipt, "r1")
+        self.assertEqual(set(columns), {name for name, _, _ in COLUMNS})
+        for name, _, shape in COLUMNS:
+            self.assertEqual(columns[name].shape, (len(self.receipt.items),) + shape)
+        self.assertEqual(list(columns["desc"]), [item.desc for item in self.receipt.items])
+        self.assertEqual(list(columns["price_cents"] / 100), [item.price for item in self.receipt.items])
+        self.assertEqual(columns["category"][0], "food")
+        self.assertEqual(columns["category"][1], "")
+        np.testing.assert_allclose(columns["price_polygon"][0], self.receipt.items[0].price_block.poly, rtol=1e-6)
+
+    def test_write_and_load(self):
+        expected = item_columns(self.receipt, "r1")
+        with ItemWriter(self.path, chunk_size=len(self.receipt.items) * 2) as writer:
+            for no in range(3):
+                writer.add_receipt(self.receipt, "r{}".format(no))
+        self.assertEqual(len(list(iter_chunks(self.path))), 2)
+        # another writer appends
+        with ItemWriter(self.path) as writer:
+            writer.add_receipt(self.receipt, "r3")
+        items = load_items(self.path)
+        self.assertEqual(len(items["desc"]), 4 * len(self.receipt.items))
+        self.assertEqual(sorted(set(items["receipt_id"])), ["r0", "r1", "r2", "r3"])
+        np.testing.assert_array_equal(items["desc_polygon"][:len(self.receipt.items)], expected["desc_polygon"])
+        self.assertEqual(set(load_items(self.path, ["desc", "price_cents"])), {"desc", "price_cents"})
+        self.assertEqual(len(load_items(os.path.join(self.path, "empty"))["desc"]), 0)
+
+    def test_part_numbers(self):
+        for no in range(2):
+            with ItemWriter(self.path) as writer:
+                writer.add_receipt(self.receipt, "r{}".format(no))
+        os.remove(os.path.join(self.path, "part-00000.npz"))
+        # two writers that append at once, neither overwrites a part
+        first, second = ItemWriter(self.path), ItemWriter(self.path)
+        for no, writer in enumerate((first, second)):
+            writer.add_receipt(self.receipt, "r{}".format(no + 2))
+            writer.close()
+        self.assertEqual(sorted(os.listdir(self.path)), ["part-00001.npz", "part-00002.npz", "part-00003.npz"])
+        self.assertEqual(list(dict.fromkeys(load_items(self.path)["receipt_id"])), ["r1", "r2", "r3"])
+
+    def test_export_documents(self):
+        paths = find_documents(self.DATA_PATH)
+        errors = export_documents(paths + [{"Blocks": None}], self.path, processes=2, chunk_size=50)
+        self.assertIn(str(len(paths)), errors)
+        items = load_items(self.path, ["receipt_id", "desc"])
+        self.assertIn(self.NAME, set(items["receipt_id"]))
+        self.assertEqual(list(items["desc"][items["receipt_id"] == self.NAME]),
+                         [item.desc for item in self.receipt.items])
+
+    @skipIf(pyarrow is None, "pyarrow is not installed")
+    def test_parquet(self):
+        with ItemWriter(self.path, file_format="parquet") as writer:
+            writer.add_receipt(self.receipt, "r1")
+        expected, items = item_columns(self.receipt, "r1"), load_items(self.path)
+        for name in expected:
+            np.testing.assert_array_equal(items[name], expected[name])
@@ -0,0 +1,37 @@
+from unittest import TestCase
+
+from matcher import Keyword, KeywordMatcher
+
+
+class TestMatcher(TestCase):
+
+    def test_lcs(self):
+        values = [
+            ("summe", "summe", 5),
+            ("summe", "sume", 4),
+            ("total", "tota1", 4),
+            ("zu zahlen", "zuzahlen", 8),
+            ("pagar", "", 0),
+        ]
+        for keyword, word, expected in values:
+            self.assertEqual(Keyword(keyword).lcs(word), expected)
+
+    def test_ratio(self):
+        values = [
+            ("summe", "summe", 100),
+            ("summe", "sume", 89),
+            ("summe", "suma", 67),
+            ("total", "", 0),
+            ("total", "xyz", 0),
+        ]
+        for keyword, word, expected in values:
+            self.assertEqual(Keyword(keyword).ratio(word), expected)
+
+    def test_match(self):
+        matcher = KeywordMatcher(("total", "summe"))
+        self.assertEqual(matcher.match(["milch", "summe", "sume"], 65), (1, 100))
+        # the keyword with priority wins, even if a later keyword would match better
+        self.assertEqual(matcher.match(["summe", "tota1"], 65), (1, 80))
+        # on equal ratios the first word wins
+        self.assertEqual(matcher.match(["sume", "brot", "sumne"], 65), (0, 89))
+        self.assertEqual(matcher.match(["milch", "brot"], 65), (None, 0))
@@ -0,0 +1,56 @@
+import contextlib
+import io
+import json
+import os
+from unittest import TestCase
+
+from metrics import Metrics, NULL_METRICS
+from receipt import Receipt
+
+
+class TestMetrics(TestCase):
+    DATA_PATH = "../data/"
+    NAME = "rewe1"
+
+    def load(self, metrics=None) -> Receipt:
+        with open(os.path.join(self.DATA_PATH, self.NAME, "apiResponse.json")) as f:
+            return Receipt(json.load(f), name=self.NAME, metrics=metrics)
+
+    def test_disabled(self):
+        receipt = self.load()
+        self.assertIs(receipt.metrics, NULL_METRICS)
+        receipt.analyze()
+        self.assertNotIn("metrics", receipt.get_json())
+        self.assertEqual(NULL_METRICS.timings, {})
+        self.assertEqual(NULL_METRICS.counters, {})
+
+    def test_enabled(self):
+        receipt = self.load(Metrics())
+        receipt.analyze()
+        metrics = receipt.get_json()["metrics"]
+        for stage in ["parse"] + [stage.name for stage in Receipt.STAGES]:
+            self.assertIn(stage, metrics["timings_ms"])
+        self.assertEqual(metrics["counters"]["words"], len(receipt.words))
+        self.assertEqual(metrics["counters"]["prices"], len(receipt.prices))
+        self.assertGreater(metrics["counters"]["keyword_comparisons"], 0)
+
+        # stages that don't run again don't count again
+        receipt.analyze()
+        self.assertEqual(receipt.get_json()["metrics"], metrics)
+
+    def test_emit(self):
+        metrics = Metrics({"function": "analyze"})
+        metrics.count("words", 3)
+        metrics.time("parse", metrics.now())
+        stdout = io.StringIO()
+        with contextlib.redirect_stdout(stdout):
+            metrics.emit()
+        # the line is nothing but the JSON object, else CloudWatch doesn't extract the metrics
+        lines = stdout.getvalue().splitlines()
+        self.assertEqual(len(lines), 1)
+        record = json.loads(lines[0])
+        self.assertIn("_aws", record)
+        self.assertEqual(record["words"], 3)
+        self.assertEqual(record["function"], "analyze")
+        self.assertIn("parse_ms", record)
+        self.assertEqual(record["_aws"]["CloudWatchMetrics"][0]["Dimensions"], [["function"]])
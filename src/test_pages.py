@@ -0,0 +1,84 @@
+import json
+from concurrent.futures import ProcessPoolExecutor
+from unittest import TestCase, mock
+
+from analyze import analyze_multipage
+from pages import PageSplitter, analyze_job, analyze_page, analyze_pages, merge_results, split_pages
+from receipt import Receipt
+from textract import AsyncTextract, LocalTextract, run
+
+
+class TestPages(TestCase):
+    DATA_PATH = "../data"
+    NAMES = ["edeka1", "rewe1", "dm2"]
+
+    def get_page_results(self):
+        results = []
+        for name in self.NAMES:
+            with open("{}/{}/apiResponse.json".format(self.DATA_PATH, name)) as f:
+                receipt = Receipt(json.load(f))
+            receipt.analyze()
+            results.append(receipt.get_json())
+        return results
+
+    def check_merged(self, result):
+        page_results = self.get_page_results()
+        self.assertEqual(result["pages"], len(self.NAMES))
+        self.assertNotIn("errors", result)
+        self.assertEqual(result["total"], page_results[-1]["total"])
+        expected = [dict(item, page=page) for page, page_result in enumerate(page_results, 1)
+                    for item in page_result["items"]]
+        self.assertEqual(result["items"], expected)
+
+    def test_split_pages(self):
+        blocks = [{"Id": "a"}, {"Id": "b", "Page": 2}, {"Id": "c", "Page": 2}, {"Id": "d", "Page": 3}]
+        self.assertEqual([(page, [block["Id"] for block in page_blocks]) for page, page_blocks in split_pages(blocks)],
+                         [(1, ["a"]), (2, ["b", "c"]), (3, ["d"])])
+
+    def test_splitter_yields_complete_pages(self):
+        splitter = PageSplitter()
+        self.assertEqual(list(splitter.feed([{"Page": 1}, {"Page": 1}])), [])
+        self.assertEqual([page for page, _ in splitter.feed([{"Page": 1}, {"Page": 2}])], [1])
+        self.assertEqual([page for page, _ in splitter.close()], [2])
+
+    def test_splitter_pages_in_one_piece(self):
+        with self.assertRaises(ValueError):
+            list(split_pages([{"Page": 1}, {"Page": 2}, {"Page": 1}]))
+
+    def test_analyze_job(self):
+        # few blocks per response, so that pages are split over responses
+        client = LocalTextract(self.DATA_PATH, max_results=50, polls_in_progress=2)
+        textract = AsyncTextract(client)
+        try:
+            job_id = run(textract.start_document_text_detection("invoices/{}.pdf".format("+".join(self.NAMES))))
+            result = run(analyze_job(textract, job_id, poll_interval=0.001))
+        finally:
+            textract.close()
+        self.check_merged(result)
+        self.assertGreater(client.polls[job_id], 3)
+
+    def test_analyze_job_processes(self):
+        with ProcessPoolExecutor(2) as executor:
+            result = analyze_multipage("invoices/{}.pdf".format("+".join(self.NAMES)),
+                                       client=LocalTextract(self.DATA_PATH, max_results=200),
+                                       executor=executor, poll_interval=0.001)
+        self.check_merged(result)
+        # outside the lambda, the pages are analyzed in a pool of processes by default
+        with mock.patch("concurrent.futures.ProcessPoolExecutor", wraps=ProcessPoolExecutor) as pool:
+            result = analyze_multipage("invoices/{}.pdf".format("+".join(self.NAMES)),
+                                       client=LocalTextract(self.DATA_PATH, max_results=200), poll_interval=0.001)
+        self.check_merged(result)
+        self.assertEqual(pool.call_count, 1)
+
+    def test_analyze_pages(self):
+        client = LocalTextract(self.DATA_PATH, max_results=100000, polls_in_progress=0)
+        response = client.get_document_text_detection(
+            client.start_document_text_detection({"S3Object": {"Name": "+".join(self.NAMES)}})["JobId"])
+        self.check_merged(analyze_pages(response))
+
+    def test_errors_are_isolated(self):
+        page_results = [analyze_page((2, [{"BlockType": "LINE"}])), {"page": 1, "result": {"total": 3.5, "items": []}}]
+        self.assertIn("error", page_results[0])
+        result = merge_results(page_results)
+        self.assertEqual(result["total"], 3.5)
+        self.assertEqual(list(result["errors"]), ["2"])
@@ -0,0 +1,56 @@
+import io
+import json
+import os
+from unittest import TestCase
+
+from parse import iter_blocks
+from receipt import Receipt
+
+
+class TestParse(TestCase):
+    DATA_PATH = "../data/"
+    NAMES = ("dm2", "edeka1", "rewe1", "DSC_3607")
+
+    def test_iter_blocks(self):
+        for name in self.NAMES:
+            path = os.path.join(self.DATA_PATH, name, "apiResponse.json")
+            with open(path) as f:
+                expected = json.load(f)["Blocks"]
+            for chunk_size in (7, 1000, 1 << 16):
+                with open(path, "rb") as f:
+                    self.assertEqual(list(iter_blocks(f, chunk_size)), expected)
+                with open(path) as f:
+                    self.assertEqual(list(iter_blocks(f, chunk_size)), expected)
+
+    def test_iter_blocks_other_keys(self):
+        text = '{"DocumentMetadata": {"Pages": 1}, "Blocks": [{"Id": "a"}, {"Id": "b", "Page": 12}],' \
+               '"DetectDocumentTextModelVersion": "1.0", "Size": 123456}'
+        for chunk_size in (1, 3, 100):
+            self.assertEqual(list(iter_blocks(io.StringIO(text), chunk_size)), [{"Id": "a"}, {"Id": "b", "Page": 12}])
+        self.assertEqual(list(iter_blocks(io.StringIO('{"Blocks": []}'))), [])
+        self.assertEqual(list(iter_blocks(io.StringIO('{}'))), [])
+        with self.assertRaises(ValueError):
+            list(iter_blocks(io.StringIO('{"Blocks": [{"Id": "a"}')))
+
+    def test_from_stream(self):
+        for name in self.NAMES:
+            path = os.path.join(self.DATA_PATH, name, "apiResponse.json")
+            with open(path) as f:
+                receipt = Receipt(json.load(f), name=name)
+            with open(path, "rb") as f:
+                streamed = Receipt.from_stream(f, name=name)
+            self.assertIsNone(streamed.data)
+            self.assertIsNone(streamed.words[0].json)
+            self.assertEqual([word.text for word in receipt.words], [word.text for word in streamed.words])
+
+            receipt.analyze()
+            streamed.analyze()
+            self.assertEqual(receipt.get_json(), streamed.get_json())
+
+    def test_keep_json(self):
+        path = os.path.join(self.DATA_PATH, self.NAMES[0], "apiResponse.json")
+        with open(path) as f:
+            response = json.load(f)
+        receipt = Receipt(response, keep_json=True)
+        self.assertIs(receipt.data, response)
+        self.assertEqual(receipt.lines[0].json["Text"], receipt.lines[0].text)
@@ -0,0 +1,95 @@
+import math
+import os
+import tempfile
+from unittest import TestCase, skipIf
+
+import numpy as np
+
+from preprocess import downsample, find_skew, get_edge_points, get_factor, load_image, otsu_threshold, preprocess, \
+    rotate, stretch_contrast
+
+try:
+    import PIL
+except ImportError:
+    PIL = None
+
+
+def make_photo(angle: float, text_height: int = 48, seed: int = 0) -> np.ndarray:
+    """ an RGB photo of a receipt with blocks of random pixels as words, rotated by angle on a dark table """
+    rng = np.random.RandomState(seed)
+    paper = np.full((1600, 700), 230, dtype=np.uint8)
+    for top in range(60, 1540, text_height * 2):
+        for left in range(40, 640, 60):
+            if rng.rand() < 0.7:
+                paper[top:top + text_height, left:left + 40] = np.where(rng.rand(text_height, 40) < 0.5, 30, 230)
+    paper = rotate(paper, -angle, fill=0)
+    photo = (60 + rng.randint(0, 20, (3000, 2000))).astype(np.uint8)
+    region = photo[500:500 + paper.shape[0], 400:400 + paper.shape[1]]
+    region[paper > 0] = paper[paper > 0]
+    return np.stack([photo] * 3, axis=2)
+
+
+class TestPreprocess(TestCase):
+
+    def test_otsu_threshold(self):
+        histogram = np.zeros(256, dtype=np.int64)
+        histogram[40], histogram[200] = 100, 300
+        self.assertTrue(40 < otsu_threshold(histogram) <= 200)
+
+    def test_find_skew(self):
+        for degrees in (-12, -3, 0, 8):
+            gray = make_photo(math.radians(degrees))[..., 0]
+            angle = find_skew(get_edge_points(gray, 60))
+            self.assertAlmostEqual(math.degrees(angle), degrees, delta=0.25)
+
+    def test_preprocess(self):
+        result = preprocess(make_photo(math.radians(5)))
+        top, bottom, left, right = result.box
+        self.assertTrue(480 < top < 520 and left > 380 and bottom < 2200 and right < 1300)
+        self.assertAlmostEqual(math.degrees(result.angle), 5, delta=0.25)
+        # the text is 48 pixels high and shrinks to 16
+        self.assertEqual(result.factor, 3)
+        self.assertEqual(result.image.dtype, np.uint8)
+        # only the paper is left
+        self.assertTrue(abs(result.image.shape[0] - 1600 / 3) < 10 and abs(result.image.shape[1] - 700 / 3) < 10)
+        self.assertEqual((result.image.min(), result.image.max()), (0, 255))
+
+    def test_memory_mapped(self):
+        photo = make_photo(math.radians(-4))
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "photo.npy")
+            np.save(path, photo)
+            mapped = load_image(path)
+            self.assertIsInstance(mapped, np.memmap)
+            result = preprocess(mapped, chunk_rows=100)
+            del mapped
+        expected = preprocess(photo)
+        self.assertEqual(result.box, expected.box)
+        self.assertEqual(result.angle, expected.angle)
+        np.testing.assert_array_equal(result.image, expected.image)
+
+    def test_downsample(self):
+        gray = np.arange(36, dtype=np.uint8).reshape(6, 6)
+        np.testing.assert_array_equal(downsample(gray, 3, chunk_rows=1), [[7, 10], [25, 28]])
+        self.assertEqual(downsample(gray[:5], 2).shape, (2, 3))
+
+    def test_get_factor(self):
+        self.assertEqual(get_factor((1000, 500), 40, 16), 2)
+        self.assertEqual(get_factor((1000, 500), 10, 16), 1)
+        self.assertEqual(get_factor((30000, 500), 10, 16, max_side=10000), 3)
+
+    def test_stretch_contrast(self):
+        gray = np.array([[100, 120], [140, 160]], dtype=np.uint8)
+        np.testing.assert_array_equal(stretch_contrast(gray, 0, 1), [[0, 85], [170, 255]])
+
+    @skipIf(PIL is None, "Pillow is not installed")
+    def test_encode(self):
+        from preprocess import encode
+        from PIL import Image
+        gray = preprocess(make_photo(0.)).image
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "receipt.png")
+            with open(path, "wb") as f:
+                f.write(encode(gray))
+            np.testing.assert_array_equal(np.asarray(Image.open(path)), gray)
+            np.testing.assert_array_equal(load_image(path)[..., 0], gray)
@@ -1,4 +1,7 @@
+import copy
+import hashlib
 import json
+import math
 import os
 from typing import List
 from unittest import TestCase
@@ -7,6 +10,8 @@ import matplotlib.pyplot as plt
 
 from instance import Instance
 from receipt import Receipt
+from tokenizer import Tokenizer
+from util import rotate_point
 
 
 class TestReceipt(TestCase):
@@ -90,3 +95,119 @@ class TestReceipt(TestCase):
                 ist.receipt.name, is_correct, same_length))
             pass
         self.assertEqual(number_correct, len(self.instances))
+
+
+class TestIncrementalAnalysis(TestCase):
+    DATA_PATH = TestReceipt.DATA_PATH
+    NAME = "edeka1"
+
+    def setUp(self):
+        with open(os.path.join(self.DATA_PATH, self.NAME, "apiResponse.json")) as f:
+            self.receipt = Receipt(json.load(f), name=self.NAME)
+
+    def test_analyze_twice(self):
+        self.assertEqual(self.receipt.analyze(), [stage.name for stage in Receipt.STAGES])
+        result = self.receipt.get_json()
+        number_columns = len(self.receipt.columns)
+        self.assertEqual(self.receipt.analyze(), [])
+        self.assertEqual(self.receipt.get_json(), result)
+        self.assertEqual(len(self.receipt.columns), number_columns)
+
+    def test_change_parameter(self):
+        self.receipt.analyze()
+        self.receipt.ROW_DIST_THRESHOLD = 0.
+        self.assertEqual(self.receipt.analyze(), ["find_items", "correct_items", "reconcile"])
+        self.assertEqual(self.receipt.items, [])
+
+        # the same total is found again, so the items don't have to be searched again
+        self.receipt.TOTAL_THRESHOLD = 70
+        self.assertEqual(self.receipt.analyze(), ["find_total"])
+
+    def test_same_columns(self):
+        self.receipt.analyze()
+        # the same columns are found again, so the items don't have to be searched again
+        self.receipt.COLUMN_ANGLE_TRESHOLD *= 0.9
+        self.assertEqual(self.receipt.analyze(), ["find_columns"])
+
+    def test_changed_object(self):
+        self.receipt.TOKENIZER = Tokenizer()
+        self.receipt.analyze()
+        self.assertEqual(self.receipt.analyze(), [])
+        # a parameter that is changed in place only makes its stage run again if it has a new version
+        self.receipt.TOKENIZER.changed()
+        self.assertEqual(self.receipt.analyze(), ["find_prices"])
+
+    def test_set_total_desc(self):
+        self.receipt.analyze()
+        expected = self.receipt.get_json()
+        total_desc = self.receipt.total_desc
+        self.receipt.set_total_desc(self.receipt.words[0])
+        self.assertEqual(self.receipt.analyze(), ["find_items", "correct_items", "reconcile"])
+        self.receipt.TOTAL_THRESHOLD = 70
+        self.assertEqual(self.receipt.analyze(), [])
+        self.assertIs(self.receipt.total_desc, self.receipt.words[0])
+
+        self.receipt.set_total_desc(None)
+        self.assertEqual(self.receipt.analyze(), ["find_total", "find_items", "correct_items", "reconcile"])
+        self.assertIs(self.receipt.total_desc, total_desc)
+        self.assertEqual(self.receipt.get_json(), expected)
+
+
+class TestWritingAngle(TestCase):
+    DATA_PATH = TestReceipt.DATA_PATH
+    NAME = "edeka1"
+
+    def setUp(self):
+        with open(os.path.join(self.DATA_PATH, self.NAME, "apiResponse.json")) as f:
+            self.data = json.load(f)
+
+    def rotated(self, angle: float) -> Receipt:
+        """ the receipt as if the photo was taken rotated by angle """
+        data = copy.deepcopy(self.data)
+        for block in data["Blocks"]:
+            for point in block["Geometry"]["Polygon"]:
+                point["X"], point["Y"] = rotate_point(angle, (point["X"], point["Y"]))
+        return Receipt(data, name=self.NAME)
+
+    def test_rotated_receipts(self):
+        upright = Receipt(self.data, name=self.NAME)
+        upright.analyze()
+        self.assertGreater(upright.angle_confidence, 0.9)
+        for angle in (math.pi / 2, -math.pi / 2, math.pi, 3.):
+            receipt = self.rotated(angle)
+            receipt.analyze()
+            self.assertAlmostEqual(math.cos(receipt.angle - upright.angle - angle), 1.)
+            self.assertGreater(receipt.angle_confidence, 0.9)
+            self.assertEqual(receipt.get_json(), upright.get_json())
+
+    def test_outliers(self):
+        receipt = Receipt(self.data, name=self.NAME)
+        angle = receipt.find_writing_angle()
+        # a vertical line doesn't change the angle, but the confidence
+        receipt.geometry.poly[receipt.line_indices[0]] = [(0.1, 0.1), (0.1, 0.9), (0.05, 0.9), (0.05, 0.1)]
+        self.assertAlmostEqual(receipt.find_writing_angle(), angle)
+        self.assertLess(receipt.angle_confidence, 0.99)
+
+
+class TestVersion(TestCase):
+    DATA_PATH = TestReceipt.DATA_PATH
+    # the checksum of the results of all receipts in DATA_PATH with this version, see test_version
+    VERSION, CHECKSUM = "4", "b35b5a40114b2b3b5c623f6d2f0a43b8"
+
+    def test_version(self):
+        """ results that are cached by version (see cache.Cache) must not change without a new version """
+        results = {}
+        for name in sorted(os.listdir(self.DATA_PATH)):
+            path = os.path.join(self.DATA_PATH, name, "apiResponse.json")
+            if not os.path.exists(path):
+                continue
+            with open(path) as f:
+                receipt = Receipt(json.load(f), name=name)
+            try:
+                receipt.analyze()
+                results[name] = receipt.get_json()
+            except Exception as e:
+                results[name] = type(e).__name__
+        checksum = hashlib.md5(json.dumps(results, sort_keys=True).encode()).hexdigest()
+        self.assertEqual((Receipt.VERSION, checksum), (self.VERSION, self.CHECKSUM),
+                         "The results changed: increase Receipt.VERSION and update VERSION and CHECKSUM")
@@ -0,0 +1,91 @@
+import itertools
+import json
+import os
+import random
+from unittest import TestCase
+
+from receipt import Receipt
+from reconcile import find_subsets, reconcile
+
+
+class TestFindSubsets(TestCase):
+
+    def test_smallest_first(self):
+        self.assertEqual(find_subsets([500, 199, 250, 301], 500), [(0,), (1, 3)])
+        self.assertEqual(find_subsets([500, 199, 250, 301], 500, max_subsets=1), [(0,)])
+
+    def test_negative(self):
+        # a discount of 0,50 and a deposit of 0,25
+        self.assertEqual(find_subsets([399, -50, 25], -25), [(1, 2)])
+
+    def test_no_subset(self):
+        self.assertEqual(find_subsets([100, 200], 50), [])
+        self.assertEqual(find_subsets([100, 200, 300, 400], 1000, max_size=3), [])
+        self.assertEqual(find_subsets([], 10 ** 9), [])
+
+    def test_many_values(self):
+        # more values than the recursion limit, e.g. the prices of a long multipage document
+        values = [1000 + value for value in range(1200)]
+        self.assertEqual(find_subsets(values, 1000 + 1150, max_size=1), [(1150,)])
+        # too much for two values
+        subsets = find_subsets(values, 5000, max_size=3, max_subsets=2)
+        self.assertEqual(len(subsets), 2)
+        for subset in subsets:
+            self.assertEqual((len(subset), sum(values[idx] for idx in subset)), (3, 5000))
+
+    def test_brute_force(self):
+        rng = random.Random(0)
+        for _ in range(300):
+            values = [rng.randint(-30, 60) for _ in range(rng.randint(0, 8))]
+            target = rng.randint(-40, 80)
+            subsets = find_subsets(values, target, 3, 10 ** 6)
+            expected = [[subset for subset in itertools.combinations(range(len(values)), size)
+                         if sum(values[idx] for idx in subset) == target] for size in range(4)]
+            sizes = [size for size in range(4) if expected[size]]
+            if len(sizes) == 0:
+                self.assertEqual(subsets, [])
+                continue
+            self.assertEqual(sorted(subsets), sorted(expected[sizes[0]] + (
+                expected[sizes[0] + 1] if sizes[0] < 3 else [])))
+
+
+class TestReconcile(TestCase):
+    DATA_PATH = "../data/"
+
+    def setUp(self):
+        with open(os.path.join(self.DATA_PATH, "edeka1", "apiResponse.json")) as f:
+            self.receipt = Receipt(json.load(f), name="edeka1")
+        self.receipt.analyze()
+
+    def test_matches(self):
+        self.assertEqual(self.receipt.reconciliation.gap, 0)
+        self.assertEqual(self.receipt.reconciliation.confidence, 1.)
+        self.assertEqual(self.receipt.get_json()["reconciliation"]["corrections"], [])
+
+    def test_missing_item(self):
+        items = self.receipt.items
+        missing = items[1].price_block
+        reconciliation = reconcile(items[:1] + items[2:], [missing], self.receipt.total)
+        self.assertEqual(reconciliation.gap, missing.cents)
+        self.assertEqual([(c.block, c.add) for c in reconciliation.corrections], [(missing, True)])
+        self.assertEqual(reconciliation.confidence, 0.5)
+
+    def test_extra_item(self):
+        items = self.receipt.items
+        reconciliation = reconcile(items + items[:1], [], self.receipt.total)
+        self.assertEqual(reconciliation.gap, -items[0].price_block.cents)
+        self.assertEqual(len(reconciliation.corrections), 1)
+        self.assertFalse(reconciliation.corrections[0].add)
+        # either of the two equal items can be removed
+        self.assertEqual(len(reconciliation.alternatives), 1)
+        self.assertEqual(reconciliation.confidence, 0.25)
+        self.assertEqual(reconciliation.json["corrections"][0]["action"], "remove")
+
+    def test_unreconciled(self):
+        reconciliation = reconcile(self.receipt.items[1:], [], self.receipt.total)
+        self.assertIsNone(reconciliation.corrections)
+        self.assertEqual(reconciliation.confidence, 0.)
+
+    def test_stage(self):
+        self.receipt.MAX_CORRECTIONS = 2
+        self.assertEqual(self.receipt.analyze(), ["reconcile"])
@@ -0,0 +1,52 @@
+import json
+import os
+import tempfile
+from unittest import TestCase
+
+import matplotlib.image
+import matplotlib.pyplot as plt
+
+from instance import Instance
+from receipt import Receipt
+from render import OVERLAYS, get_mistakes, render_batch, write_contact_sheet
+
+
+class TestRender(TestCase):
+    DATA_PATH = "../data/"
+    NAMES = ("edeka1", "_nudelhusli", "rewe1")
+
+    def test_render_batch(self):
+        paths = [os.path.join(self.DATA_PATH, name, "apiResponse.json") for name in self.NAMES]
+        with tempfile.TemporaryDirectory() as tmp:
+            reports = list(render_batch(paths, tmp, processes=2))
+            self.assertEqual([report["name"] for report in reports], list(self.NAMES))
+            self.assertIn("error", reports[1])
+            self.assertEqual(reports[0]["mistakes"], [])
+            for overlay in OVERLAYS:
+                image = matplotlib.image.imread(os.path.join(tmp, "edeka1", "{}.png".format(overlay)))
+                self.assertEqual(image.shape[:2], Instance.CANVAS_SHAPE)
+
+            with open(write_contact_sheet(reports, tmp)) as f:
+                page = f.read()
+            # the failed receipts come first
+            self.assertLess(page.index("_nudelhusli"), page.index("edeka1"))
+            self.assertIn('src="edeka1/items.png"', page)
+        # no figure was left open
+        self.assertEqual(plt.get_fignums(), [])
+
+    def test_only_failed(self):
+        paths = [os.path.join(self.DATA_PATH, name, "apiResponse.json") for name in ("edeka1", "rewe1")]
+        with tempfile.TemporaryDirectory() as tmp:
+            reports = list(render_batch(paths, tmp, processes=1, only_failed=True))
+            self.assertEqual(os.listdir(tmp), ["rewe1"])
+        self.assertEqual(reports[0]["overlays"], [])
+        self.assertGreater(len(reports[1]["mistakes"]), 0)
+
+    def test_get_mistakes(self):
+        with open(os.path.join(self.DATA_PATH, "edeka1", "apiResponse.json")) as f:
+            receipt = Receipt(json.load(f), name="edeka1")
+        receipt.analyze()
+        expected = receipt.get_json()
+        self.assertEqual(get_mistakes(receipt, expected), [])
+        expected["items"][0]["price"] += 1
+        self.assertEqual(len(get_mistakes(receipt, expected)), 1)
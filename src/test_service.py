@@ -0,0 +1,120 @@
+import json
+import os
+import socket
+import tempfile
+import threading
+from http.client import HTTPConnection
+from multiprocessing import TimeoutError
+from unittest import TestCase
+
+from batch import find_documents
+from service import Service, analyze_request, get_local_path, make_server
+
+
+class TestService(TestCase):
+    DATA_PATH = "../data/"
+
+    @classmethod
+    def setUpClass(cls):
+        cls.paths = find_documents(cls.DATA_PATH)[:4]
+        with open(cls.paths[0]) as f:
+            cls.response = json.load(f)
+        cls.expected = analyze_request({"path": cls.paths[0]}, cls.DATA_PATH)
+        cls.service = Service(workers=2, max_pending=4, data_root=cls.DATA_PATH)
+        cls.server = make_server(cls.service, port=0)
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        cls.service.close()
+
+    def request(self, method, path, body=None):
+        connection = HTTPConnection(*self.server.server_address)
+        try:
+            connection.request(method, path, None if body is None else json.dumps(body))
+            response = connection.getresponse()
+            return response.status, json.loads(response.read().decode())
+        finally:
+            connection.close()
+
+    def test_analyze(self):
+        self.assertIn("result", self.expected)
+        self.assertEqual(self.request("POST", "/analyze", self.response), (200, self.expected))
+        self.assertEqual(self.request("POST", "/analyze", {"path": self.paths[0]}), (200, self.expected))
+
+    def test_batch(self):
+        status, results = self.request("POST", "/analyze", [{"path": path} for path in self.paths])
+        self.assertEqual(status, 200)
+        self.assertEqual(results, [analyze_request({"path": path}, self.DATA_PATH) for path in self.paths])
+        status, results = self.request("POST", "/analyze", [self.response, {"Blocks": None}, "x"])
+        self.assertEqual(results[0], self.expected)
+        self.assertIn("error", results[1])
+        self.assertIn("error", results[2])
+
+    def test_backpressure(self):
+        self.assertEqual(self.request("POST", "/analyze", [self.response] * 5)[0], 413)
+        self.assertTrue(self.service.admit(3))
+        try:
+            self.assertEqual(self.request("POST", "/analyze", [self.response] * 2)[0], 503)
+            self.assertEqual(self.request("GET", "/health"), (200, {"pending": 3, "max_pending": 4}))
+        finally:
+            self.service.release(3)
+        self.assertEqual(self.request("POST", "/analyze", [self.response] * 2)[0], 200)
+
+    def test_timeout(self):
+        service = Service(workers=2, max_pending=4, timeout=0.)
+        try:
+            self.assertTrue(service.admit(4))
+            with self.assertRaises(TimeoutError):
+                service.analyze([self.response] * 4)
+            # the documents are still analyzed, so their room is still taken
+            self.assertGreater(service.pending, 0)
+            service.pool.close()
+            service.pool.join()
+            self.assertEqual(service.pending, 0)
+        finally:
+            service.close()
+
+    def test_local_path(self):
+        path = os.path.join(self.DATA_PATH, "dm1", "apiResponse.json")
+        self.assertEqual(get_local_path("dm1/apiResponse.json", self.DATA_PATH), os.path.realpath(path))
+        self.assertEqual(get_local_path(os.path.abspath(path), self.DATA_PATH), os.path.realpath(path))
+        # only files below the data root can be read
+        self.assertIsNone(get_local_path("dm1/apiResponse.json", None))
+        self.assertIsNone(get_local_path("../src/service.py", self.DATA_PATH))
+        self.assertIsNone(get_local_path(os.path.abspath("service.py"), self.DATA_PATH))
+        self.assertIsNone(get_local_path("dm1", self.DATA_PATH))
+
+    def test_bad_requests(self):
+        self.assertEqual(self.request("GET", "/nothing")[0], 404)
+        connection = HTTPConnection(*self.server.server_address)
+        connection.request("POST", "/analyze", "{")
+        self.assertEqual(connection.getresponse().status, 400)
+        connection.close()
+
+    def test_unix_socket(self):
+        service = Service(workers=1, data_root=self.DATA_PATH)
+        with tempfile.TemporaryDirectory() as tmp:
+            socket_path = os.path.join(tmp, "service.sock")
+            server = make_server(service, socket_path=socket_path)
+            threading.Thread(target=server.serve_forever, daemon=True).start()
+            try:
+                body = json.dumps({"path": self.paths[0]}).encode()
+                with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+                    client.connect(socket_path)
+                    client.sendall(b"POST /analyze HTTP/1.1\r\nHost: localhost\r\nConnection: close\r\n"
+                                   b"Content-Length: " + str(len(body)).encode() + b"\r\n\r\n" + body)
+                    response = b""
+                    while True:
+                        data = client.recv(1 << 16)
+                        if not data:
+                            break
+                        response += data
+                self.assertTrue(response.startswith(b"HTTP/1.1 200"))
+                self.assertEqual(json.loads(response.split(b"\r\n\r\n", 1)[1].decode()), self.expected)
+            finally:
+                server.shutdown()
+                server.server_close()
+                service.close()
@@ -0,0 +1,36 @@
+from unittest import TestCase
+
+import numpy as np
+
+from spatial import GridIndex
+from util import get_dists_to_lines
+
+
+class TestGridIndex(TestCase):
+
+    def setUp(self):
+        self.points = np.random.RandomState(0).uniform(0, 1, (500, 2))
+        self.index = GridIndex(self.points, 0.05)
+
+    def test_query_radius(self):
+        for center in [(0.5, 0.5), (0., 0.), (0.98, 0.3)]:
+            candidates = self.index.query_radius(center, 0.07)
+            inside = np.flatnonzero(np.hypot(*(self.points - center).T) <= 0.07)
+            self.assertTrue(set(inside) <= set(candidates))
+            self.assertLess(len(candidates), len(self.points) / 4)
+            self.assertTrue(np.all(np.diff(candidates) > 0))
+
+    def test_query_band(self):
+        for point, direction, x_max in [((0.9, 0.5), (0.1, 0.), None), ((0.8, 0.2), (0.1, 0.02), 0.6),
+                                        ((0.5, 0.9), (0.1, -0.03), 0.2), ((0.5, 2.), (1., 0.), None)]:
+            point, direction = np.array(point), np.array(direction)
+            candidates = self.index.query_band(point, direction, 0.05, x_max=x_max)
+            dists = get_dists_to_lines(point, point + direction, self.points)
+            inside = np.flatnonzero((dists <= 0.05) & (self.points[:, 0] <= (1 if x_max is None else x_max)))
+            self.assertTrue(set(inside) <= set(candidates))
+            self.assertLess(len(candidates), len(self.points) / 3)
+
+    def test_empty(self):
+        index = GridIndex(np.zeros((0, 2)), 0.05)
+        self.assertEqual(len(index.query_band(np.array([0.5, 0.5]), np.array([1., 0.]), 0.05)), 0)
+        self.assertEqual(len(index.query_radius((0.5, 0.5), 0.1)), 0)
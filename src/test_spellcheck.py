@@ -0,0 +1,111 @@
+import json
+import os
+import tempfile
+from unittest import TestCase, mock
+
+from batch import analyze_document
+from pages import analyze_page
+from receipt import Receipt
+from service import analyze_request
+from spellcheck import Lexicon, SpellChecker, build_lexicon, count_words, get_deletes, hash_strings, ocr_distance
+
+
+class TestSpellCheck(TestCase):
+    WORDS = {"apfelsaft": 5, "birnensaft": 3, "milch": 10, "butter": 4, "hemd": 1, "strumpf": 1, "bananen": 2,
+             "kombi": 1, "sensodyne": 2, "proschmelz": 1}
+
+    @classmethod
+    def setUpClass(cls):
+        cls.tmp = tempfile.TemporaryDirectory()
+        cls.path = cls.tmp.name
+        build_lexicon(cls.WORDS, cls.path)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.tmp.cleanup()
+
+    def setUp(self):
+        self.spellchecker = SpellChecker.from_path(self.path)
+
+    def test_hash_strings(self):
+        hashes = hash_strings(["", "a", "ab", "ba", "äb", "ab"])
+        self.assertEqual(len(set(hashes[:5].tolist())), 5)
+        self.assertEqual(hashes[2], hashes[5])
+        # FNV-1a of "a"
+        self.assertEqual(int(hashes[1]), 0xaf63dc4c8601ec8c)
+
+    def test_get_deletes(self):
+        self.assertEqual(get_deletes("abc", 1), {"abc", "bc", "ac", "ab"})
+        self.assertEqual(len(get_deletes("abc", 2)), 7)
+
+    def test_ocr_distance(self):
+        self.assertEqual(ocr_distance("milch", "milch", 2), 0)
+        self.assertAlmostEqual(ocr_distance("mllch", "milch", 2), 0.3)
+        self.assertAlmostEqual(ocr_distance("hernd", "hemd", 2), 0.3)
+        self.assertAlmostEqual(ocr_distance("felsaft", "apfelsaft", 2), 1.)
+        self.assertEqual(ocr_distance("butter", "btuter", 2), 1)
+        self.assertEqual(ocr_distance("kombi", "apfelsaft", 2), float("inf"))
+
+    def test_lexicon(self):
+        lexicon = Lexicon(self.path)
+        self.assertEqual(len(lexicon), len(self.WORDS))
+        self.assertEqual(sorted(lexicon.word(i) for i in range(len(lexicon))), sorted(self.WORDS))
+        self.assertIn(sorted(self.WORDS).index("milch"), lexicon.candidates("mlch", 1).tolist())
+
+    def test_correct(self):
+        values = [("felsaft", "apfelsaft"), ("rnensaft", "birnensaft"), ("MlLCH", "Milch"), ("MLLCH", "MILCH"),
+                  ("Butler", "Butter"), ("Hernd", "Hemd"), ("Strurnpf", "Strumpf"), ("BANANEN", "BANANEN"),
+                  ("Milk", "Milk"), ("xyzw", "xyzw")]
+        for word, expected in values:
+            self.assertEqual(self.spellchecker.correct_word(word), expected)
+        self.assertEqual(self.spellchecker.correct("2x felsaft 0,5l"), "2x apfelsaft 0,5l")
+
+    def test_correct_digits(self):
+        # letters misread as digits are corrected, numbers and prices are kept
+        self.assertEqual(self.spellchecker.correct("H-Mi1ch 3,5% 1,19"), "H-Milch 3,5% 1,19")
+        self.assertEqual(self.spellchecker.correct("8UTTER 250g"), "BUTTER 250g")
+        self.assertEqual(self.spellchecker.correct("1234 5678"), "1234 5678")
+
+    def test_checksum(self):
+        self.assertEqual(Lexicon(self.path).checksum, self.spellchecker.lexicon.checksum)
+        with tempfile.TemporaryDirectory() as path:
+            build_lexicon(dict(self.WORDS, milch=11), path)
+            self.assertNotEqual(Lexicon(path).checksum, self.spellchecker.lexicon.checksum)
+            build_lexicon(self.WORDS, path)
+            self.assertEqual(Lexicon(path).checksum, self.spellchecker.lexicon.checksum)
+
+    def test_multipage(self):
+        # the pages of a multipage document are corrected like single documents
+        with open(os.path.join("../data/", "edeka1", "apiResponse.json")) as f:
+            blocks = json.load(f)["Blocks"]
+        with mock.patch.dict(os.environ, {"ANALYZE_LEXICON": self.path}), mock.patch("analyze._spellchecker", None):
+            result = analyze_page((1, blocks))
+        self.assertEqual(result["result"]["items"][1]["desc"], "Sensodyne 2C Proschmelz 100ml")
+
+    def test_entry_points(self):
+        # the batch and the service correct the descriptions like the lambda
+        path = os.path.join("../data/", "edeka1", "apiResponse.json")
+        with open(path) as f:
+            response = json.load(f)
+        with mock.patch("analyze._spellchecker", self.spellchecker):
+            results = [analyze_document((0, path))["result"], analyze_request(response)["result"],
+                       analyze_request({"path": "edeka1/apiResponse.json"}, "../data/")["result"]]
+        for result in results:
+            self.assertEqual(result["items"][1]["desc"], "Sensodyne 2C Proschmelz 100ml")
+
+    def test_count_words(self):
+        self.assertEqual(count_words(["Milch 1,5%", "H-Milch"]), {"milch": 2, "h": 1})
+        self.assertEqual(count_words(["Milch 500ml 1,19"]), {"milch": 1, "500ml": 1})
+
+    def test_stage(self):
+        with open(os.path.join("../data/", "edeka1", "apiResponse.json")) as f:
+            receipt = Receipt(json.load(f))
+        receipt.analyze()
+        descs = [item.desc for item in receipt.items]
+        receipt.SPELLCHECKER = self.spellchecker
+        self.assertEqual(receipt.analyze(), ["correct_items"])
+        self.assertEqual(receipt.items[1].desc, "Sensodyne 2C Proschmelz 100ml")
+        self.assertEqual(receipt.items[2].desc, "Visiomc Kombi Hyal 360ml")
+        receipt.SPELLCHECKER = None
+        self.assertEqual(receipt.analyze(), ["correct_items"])
+        self.assertEqual([item.desc for item in receipt.items], descs)
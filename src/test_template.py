@@ -0,0 +1,110 @@
+import json
+import os
+import tempfile
+from unittest import TestCase, mock
+
+from batch import analyze_document, load_receipt
+from metrics import Metrics
+from receipt import Receipt
+from service import analyze_request, warm_up
+from template import Template, TemplateStore, get_header
+
+
+class TestTemplate(TestCase):
+    DATA_PATH = "../data/"
+
+    def load(self, name: str) -> Receipt:
+        with open(os.path.join(self.DATA_PATH, name, "apiResponse.json")) as f:
+            receipt = Receipt(json.load(f), name=name)
+        receipt.analyze()
+        return receipt
+
+    def setUp(self):
+        self.store = TemplateStore()
+        self.template = self.store.learn(self.load("dm1"))
+
+    def test_learn(self):
+        self.assertIsNotNone(self.template)
+        self.assertEqual(len(self.store), 1)
+        self.assertEqual(self.store.learn(self.load("dm2")), self.template)
+        self.assertEqual(self.template.count, 2)
+        self.assertEqual(len(self.store), 1)
+
+    def test_same_results(self):
+        expected = self.load("dm2").get_json()
+        receipt = self.load("dm2")
+        receipt.TEMPLATES = self.store
+        self.assertEqual(receipt.analyze(),
+                         ["match_template", "find_columns", "find_total", "find_items", "correct_items", "reconcile"])
+        self.assertIs(receipt.template, self.template)
+        self.assertEqual(receipt.get_json(), expected)
+
+    def test_learn_again(self):
+        # a template learned after the receipt was analyzed is matched when it is analyzed again
+        receipt = self.load("edeka1")
+        receipt.TEMPLATES = self.store
+        self.assertEqual(receipt.analyze(), ["match_template"])
+        self.assertIsNone(receipt.template)
+        self.store.learn(receipt)
+        self.assertEqual(receipt.analyze()[0], "match_template")
+        self.assertIsNotNone(receipt.template)
+        low, high = receipt.column_range
+        self.assertTrue(all(low <= receipt.r(price.top_right)[0] <= high for price in receipt.columns[0].prices))
+
+    def test_entry_points(self):
+        # the service and the batch use the templates of the lambda
+        path = os.path.join(self.DATA_PATH, "dm2", "apiResponse.json")
+        with open(path) as f:
+            response = json.load(f)
+        expected = self.load("dm2").get_json()
+        with tempfile.TemporaryDirectory() as tmp:
+            self.store.path = os.path.join(tmp, "templates.json")
+            self.store.save()
+            with mock.patch.dict(os.environ, {"ANALYZE_TEMPLATES": self.store.path}), \
+                    mock.patch("analyze._templates", None):
+                warm_up()
+                receipt = load_receipt((0, path))
+                self.assertEqual(receipt.TEMPLATES.checksum, self.store.checksum)
+                self.assertIn("match_template", receipt.analyze())
+                self.assertIsNotNone(receipt.template)
+                self.assertEqual(analyze_document((0, path))["result"], expected)
+                self.assertEqual(analyze_request(response)["result"], expected)
+
+    def test_other_store(self):
+        receipt = self.load("edeka1")
+        self.assertIsNone(self.store.match(receipt))
+        self.assertLess(self.template.similarity(get_header(receipt)), self.store.min_similarity)
+
+    def test_fallback(self):
+        expected = self.load("dm2").get_json()
+        receipt = self.load("dm2")
+        # a template whose column has no prices
+        receipt.TEMPLATES = TemplateStore()
+        receipt.TEMPLATES._add(Template(self.template.header, 0.5, self.template.total_word))
+        receipt.metrics = Metrics()
+        receipt.analyze()
+        self.assertEqual(receipt.metrics.counters["template_fallbacks"], 1)
+        self.assertEqual({key: value for key, value in receipt.get_json().items() if key != "metrics"}, expected)
+
+    def test_unreconciled(self):
+        # the items of hm don't add up to its total, so its layout is not learned
+        receipt = self.load("hm")
+        self.assertNotEqual(receipt.reconciliation.gap, 0)
+        self.assertIsNone(self.store.learn(receipt))
+        self.assertEqual(len(self.store), 1)
+
+    def test_min_count(self):
+        self.store.min_count = 2
+        self.assertIsNone(self.store.match(self.load("dm2")))
+
+    def test_save(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "templates.json")
+            self.store.path = path
+            self.store.save()
+            store = TemplateStore(path)
+        self.assertEqual([template.json for template in store.templates], [self.template.json])
+        self.assertEqual(store.checksum, self.store.checksum)
+        self.store.learn(self.load("dm2"))
+        self.assertNotEqual(store.checksum, self.store.checksum)
+        self.assertIs(store.find(self.template.header), store.templates[0])
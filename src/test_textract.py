@@ -0,0 +1,54 @@
+import threading
+from unittest import TestCase, mock
+
+from analyze import analyze_many
+from cache import Cache, MemoryBackend
+from textract import AsyncTextract, LocalTextract, LocalThrottlingError, is_throttling, run
+
+
+class TestTextract(TestCase):
+    DATA_PATH = "../data"
+    DOCUMENTS = ["receipts/dm2.jpg", "receipts/edeka1.jpg", "receipts/edeka2.jpg",
+                 "receipts/rewe1.jpg", "receipts/rewe2.jpg", "receipts/DSC_3607.JPG"]
+
+    def test_is_throttling(self):
+        self.assertTrue(is_throttling(LocalThrottlingError()))
+        self.assertFalse(is_throttling(ValueError()))
+
+    def test_max_in_flight(self):
+        # the requests are only answered in pairs: with less than 2 in flight the barrier breaks after its timeout,
+        # with more than 2 max_in_flight is more than 2
+        client = LocalTextract(self.DATA_PATH, barrier=threading.Barrier(2, timeout=10))
+        textract = AsyncTextract(client, max_in_flight=2)
+        responses = run(textract.detect_many(self.DOCUMENTS))
+        textract.close()
+        self.assertEqual(len(responses), len(self.DOCUMENTS))
+        self.assertTrue(all(isinstance(response, dict) and "Blocks" in response for response in responses))
+        self.assertEqual(client.max_in_flight, 2)
+
+    def test_retry(self):
+        client = LocalTextract(self.DATA_PATH, throttle_every=2)
+        textract = AsyncTextract(client, max_in_flight=1, base_delay=0.001)
+        responses = run(textract.detect_many(self.DOCUMENTS[:3]))
+        textract.close()
+        self.assertTrue(all("Blocks" in response for response in responses))
+        self.assertEqual(client.calls, 5)
+
+    def test_errors_are_isolated(self):
+        results = analyze_many(["receipts/dm2.jpg", "receipts/missing.jpg"],
+                               client=LocalTextract(self.DATA_PATH), max_in_flight=2)
+        self.assertIn("result", results[0])
+        self.assertIn("error", results[1])
+        self.assertEqual(results[1]["path"], "receipts/missing.jpg")
+
+    def test_cache(self):
+        cache = Cache(MemoryBackend(), "1")
+        with mock.patch("analyze.get_cache", return_value=cache), \
+                mock.patch("analyze.get_image_hash", side_effect=lambda document: document):
+            client = LocalTextract(self.DATA_PATH)
+            first = analyze_many(self.DOCUMENTS[:2], client=client)
+            self.assertEqual(client.calls, 2)
+            # only the document that is not cached yet is fetched
+            self.assertEqual(analyze_many(self.DOCUMENTS[:3], client=client)[:2], first)
+            self.assertEqual(client.calls, 3)
+            self.assertIsNotNone(cache.get_response(self.DOCUMENTS[2]))
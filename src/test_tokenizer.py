@@ -0,0 +1,34 @@
+from unittest import TestCase
+
+from tokenizer import CURRENCY, DATE, PERCENT, PRICE, QUANTITY, TEXT, Token, Tokenizer
+
+
+class TestTokenizer(TestCase):
+
+    def setUp(self):
+        self.tokenizer = Tokenizer()
+
+    def test_prices(self):
+        values = [
+            ("1,99", 199), ("0.15", 15), ("E0.45", 45), ("€12,50", 1250), ("2,99 A", 299), ("20, 02", 2002),
+            ("1.234,56", 123456), ("1,234.56", 123456), ("1'234.56", 123456),
+            ("-3,00", -300), ("1,99-", -199), ("-20, 02", -2002),
+        ]
+        for text, cents in values:
+            self.assertEqual(self.tokenizer.classify(text), Token(PRICE, cents), text)
+
+    def test_other_kinds(self):
+        values = [
+            ("28.07.2018", DATE), ("28. 07. 18", DATE), ("(4.11.", DATE), ("10.2018", DATE), ("03/02/2017", DATE),
+            ("08.00-20.00UHR", DATE), ("19,00%", PERCENT), ("-19,00%", PERCENT), ("6.00xPOST.", QUANTITY),
+            ("4x", QUANTITY), ("100g", QUANTITY), ("0,355", QUANTITY), ("EUR", CURRENCY), ("€", CURRENCY),
+            ("1,999", QUANTITY), ("123", TEXT), ("SUMME", TEXT), ("", TEXT),
+        ]
+        for text, kind in values:
+            self.assertEqual(self.tokenizer.classify(text).kind, kind, text)
+
+    def test_cache(self):
+        tokenizer = Tokenizer(cache_size=2)
+        self.assertEqual(tokenizer.tokenize(["1,99", "1,99", "x", "2,00"]),
+                         [Token(PRICE, 199), Token(PRICE, 199), Token(TEXT), Token(PRICE, 200)])
+        self.assertLessEqual(len(tokenizer._cache), 2)
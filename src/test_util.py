@@ -1,6 +1,10 @@
 import math
 from unittest import TestCase
-from util import get_abs_perp_angle_diff, get_dist_to_line, rotate_point
+
+import numpy as np
+
+from util import circular_mean, get_abs_perp_angle_diff, get_angle, get_angles, get_dist_to_line, get_dists_to_lines, \
+    rotate_point, rotate_points
 
 
 class TestUtil(TestCase):
@@ -35,3 +39,37 @@ class TestUtil(TestCase):
         for l1, l2, p, expected in values:
             calculated = get_dist_to_line(l1, l2, p)
             self.assertAlmostEqual(calculated, expected)
+
+    def test_rotate_points(self):
+        points = np.array([(1, 0), (0.3, 0.8), (0.5, 0.5)])
+        for angle in (0, math.pi / 2, -math.pi, 0.3):
+            calculated = rotate_points(angle, points)
+            for point, rotated in zip(points, calculated):
+                self.assertAlmostEqual(rotated[0], rotate_point(angle, point)[0])
+                self.assertAlmostEqual(rotated[1], rotate_point(angle, point)[1])
+
+    def test_get_angles(self):
+        points1 = np.array([(0, 0), (0.5, 0.5), (1, 1)])
+        points2 = np.array([(1, 0), (0.5, 1), (0, 0)])
+        for p1, p2, calculated in zip(points1, points2, get_angles(points1, points2)):
+            self.assertAlmostEqual(calculated, get_angle(p1, p2))
+
+    def test_get_dists_to_lines(self):
+        line_points1 = np.array([(0, 0), (0, 0.5)])[:, None]
+        line_points2 = np.array([(0, 1), (1, 0.5)])[:, None]
+        points = np.array([(1, 1), (0.2, 0.1), (0.5, 0.5)])[None]
+        calculated = get_dists_to_lines(line_points1, line_points2, points)
+        self.assertEqual(calculated.shape, (2, 3))
+        for i in range(2):
+            for j in range(3):
+                self.assertAlmostEqual(calculated[i, j],
+                                       get_dist_to_line(line_points1[i, 0], line_points2[i, 0], points[0, j]))
+
+    def test_circular_mean(self):
+        angle, concentration = circular_mean(np.array([math.pi - 0.1, -math.pi + 0.1]))
+        self.assertAlmostEqual(abs(angle), math.pi)
+        self.assertAlmostEqual(concentration, math.cos(0.1))
+        angle, concentration = circular_mean(np.array([0., math.pi / 2]), np.array([1., 0.]))
+        self.assertAlmostEqual(angle, 0.)
+        self.assertAlmostEqual(concentration, 1.)
+        self.assertEqual(circular_mean(np.zeros(0)), (0., 0.))
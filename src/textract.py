@@ -0,0 +1,196 @@
+import asyncio
+import json
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Dict, List, Optional, Sequence
+
+from aws import BUCKET, get_client, get_error_code
+
+THROTTLING_ERRORS = ("ThrottlingException", "ProvisionedThroughputExceededException", "LimitExceededException")
+
+
+def is_throttling(error: Exception) -> bool:
+    """ :return: whether the error is a botocore ClientError that asks us to slow down """
+    return get_error_code(error) in THROTTLING_ERRORS
+
+
+def run(coroutine):
+    """ asyncio.run is not available on the python3.6 lambda runtime """
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coroutine)
+    finally:
+        loop.close()
+
+
+class AsyncTextract:
+    """
+    issues many textract requests concurrently. boto3 is blocking, so the requests run on a thread pool,
+    at most `max_in_flight` of them at a time. Throttled requests are retried with exponential backoff and jitter.
+    """
+
+    def __init__(self, client=None, max_in_flight: int = 8, max_retries: int = 5,
+                 base_delay: float = 0.2, max_delay: float = 5.):
+        self.client = client if client is not None else get_client()
+        self.max_in_flight = max_in_flight
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._executor = ThreadPoolExecutor(max_workers=max_in_flight)
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._loop = None
+
+    def _get_semaphore(self) -> asyncio.Semaphore:
+        # a semaphore is bound to the event loop that is running when it is used first
+        loop = asyncio.get_event_loop()
+        if self._semaphore is None or self._loop is not loop:
+            self._semaphore, self._loop = asyncio.Semaphore(self.max_in_flight), loop
+        return self._semaphore
+
+    def backoff(self, attempt: int) -> float:
+        """ :return: seconds to wait before retry number `attempt` (0-indexed) """
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+    async def call(self, method: str, **kwargs) -> Dict:
+        """ call a method of the boto3 client, e.g. call("detect_document_text", Document=...) """
+        loop = asyncio.get_event_loop()
+        async with self._get_semaphore():
+            for attempt in range(self.max_retries + 1):
+                try:
+                    return await loop.run_in_executor(self._executor, partial(getattr(self.client, method), **kwargs))
+                except Exception as e:
+                    if not is_throttling(e) or attempt == self.max_retries:
+                        raise
+                await asyncio.sleep(self.backoff(attempt))
+
+    async def detect_document_text(self, document: str, bucket: str = BUCKET) -> Dict:
+        return await self.call("detect_document_text", Document={'S3Object': {'Bucket': bucket, 'Name': document}})
+
+    async def detect_many(self, documents: Sequence[str], bucket: str = BUCKET) -> List:
+        """
+        :return: the responses in the order of the documents,
+        a document that failed has the exception instead of its response.
+        """
+        return await asyncio.gather(*[self.detect_document_text(document, bucket) for document in documents],
+                                    return_exceptions=True)
+
+    async def start_document_text_detection(self, document: str, bucket: str = BUCKET) -> str:
+        """ start an asynchronous job, e.g. for a PDF with many pages. :return: the id of the job """
+        response = await self.call("start_document_text_detection",
+                                   DocumentLocation={'S3Object': {'Bucket': bucket, 'Name': document}})
+        return response["JobId"]
+
+    async def iter_document_text(self, job_id: str, poll_interval: float = 1.):
+        """
+        wait until the job is done, then yield its responses one after another, following their NextToken.
+        Textract returns the blocks ordered by page, a page can be split over several responses.
+        """
+        kwargs = {"JobId": job_id}
+        while True:
+            response = await self.call("get_document_text_detection", **kwargs)
+            if response["JobStatus"] == "IN_PROGRESS":
+                await asyncio.sleep(poll_interval)
+                continue
+            if response["JobStatus"] == "FAILED":
+                raise RuntimeError("Textract job {} failed: {}".format(job_id, response.get("StatusMessage")))
+            yield response
+            if "NextToken" not in response:
+                return
+            kwargs["NextToken"] = response["NextToken"]
+
+    def close(self):
+        self._executor.shutdown(wait=False)
+
+
+class LocalTextract:
+    """
+    stand-in for the boto3 textract client that replays data/<name>/apiResponse.json,
+    where <name> is the file name of the S3 object without its extension.
+    Latency and throttling can be simulated to test the async layer offline.
+    """
+
+    def __init__(self, data_path: str = "../data", latency: float = 0., throttle_every: int = 0,
+                 max_results: int = 1000, polls_in_progress: int = 1, barrier: Optional[threading.Barrier] = None):
+        """
+        :param latency: seconds every request takes
+        :param throttle_every: if > 0, every n-th request fails with a ThrottlingException
+        :param max_results: blocks per response of an asynchronous job, like MaxResults of textract
+        :param polls_in_progress: number of times an asynchronous job is reported to be still in progress
+        :param barrier: every request of detect_document_text waits for it, so that only as many requests
+        as the barrier has parties are answered together, e.g. to test concurrency without relying on timing
+        """
+        self.data_path = data_path
+        self.latency = latency
+        self.throttle_every = throttle_every
+        self.max_results = max_results
+        self.polls_in_progress = polls_in_progress
+        self.barrier = barrier
+        self.jobs: Dict[str, str] = {}
+        self.polls: Dict[str, int] = {}
+        self.calls = 0
+        self.in_flight, self.max_in_flight = 0, 0
+        self._lock = threading.Lock()
+
+    def detect_document_text(self, Document: Dict) -> Dict:
+        with self._lock:
+            self.calls += 1
+            calls = self.calls
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            time.sleep(self.latency)
+            if self.barrier is not None:
+                self.barrier.wait()
+            if self.throttle_every > 0 and calls % self.throttle_every == 0:
+                raise LocalThrottlingError()
+            name = os.path.splitext(os.path.basename(Document["S3Object"]["Name"]))[0]
+            with open(os.path.join(self.data_path, name, "apiResponse.json")) as f:
+                return json.load(f)
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+
+    def start_document_text_detection(self, DocumentLocation: Dict) -> Dict:
+        """
+        a job whose pages are data/<name>/apiResponse.json of every name in the file name joined by '+',
+        e.g. invoices/edeka1+rewe1.pdf has two pages.
+        """
+        with self._lock:
+            self.calls += 1
+            job_id = str(len(self.jobs))
+            self.jobs[job_id] = DocumentLocation["S3Object"]["Name"]
+        return {"JobId": job_id}
+
+    def get_document_text_detection(self, JobId: str, NextToken: Optional[str] = None) -> Dict:
+        """
+        the first `polls_in_progress` calls of a job answer IN_PROGRESS,
+        then the blocks of all pages follow, at most `max_results` per response
+        """
+        with self._lock:
+            self.calls += 1
+            self.polls[JobId] = self.polls.get(JobId, 0) + 1
+            if self.polls[JobId] <= self.polls_in_progress:
+                return {"JobStatus": "IN_PROGRESS"}
+        time.sleep(self.latency)
+        names = os.path.splitext(os.path.basename(self.jobs[JobId]))[0].split("+")
+        blocks = []
+        for page, name in enumerate(names, 1):
+            with open(os.path.join(self.data_path, name, "apiResponse.json")) as f:
+                for block in json.load(f)["Blocks"]:
+                    block["Page"] = page
+                    blocks.append(block)
+        start = int(NextToken or 0)
+        response = {"JobStatus": "SUCCEEDED", "DocumentMetadata": {"Pages": len(names)},
+                    "Blocks": blocks[start:start + self.max_results]}
+        if start + self.max_results < len(blocks):
+            response["NextToken"] = str(start + self.max_results)
+        return response
+
+
+class LocalThrottlingError(Exception):
+    """ looks like the botocore ClientError textract raises when it throttles """
+    response = {"Error": {"Code": "ThrottlingException", "Message": "Rate exceeded"}}
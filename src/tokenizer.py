@@ -0,0 +1,77 @@
+import re
+from typing import Dict, Iterable, List, NamedTuple, Optional
+
+PRICE, QUANTITY, PERCENT, CURRENCY, DATE, TEXT = "price", "quantity", "percent", "currency", "date", "text"
+
+# 28.07.2018, 28. 07. 18, (4.11., 03/02/2017, 10.2018 and opening hours like 08.00-20.00UHR
+DATE_PATTERN = r"\(?(\d{1,2}\. ?\d{1,2}\.( ?\d{1,4})?(?!\d)|\d{1,2}/\d{1,2}/\d{2,4}|\d{1,2}\.(19|20)\d\d(?!\d)" \
+               r"|\d{1,2}[.:]\d\d ?- ?\d{1,2}[.:]\d\d)"
+# an amount with two decimals, the integer part may have thousands separators: 1,99 1.234,56 1'234.56 and 20, 02
+# (textract sometimes puts a space after the decimal separator)
+AMOUNT_PATTERN = r"(?P<integer>\d{1,3}(?:[.,']\d{3})+|\d+)[.,] ?(?P<decimals>\d\d)(?!\d)"
+# 4x, 2 Stk, 100g, 0,355 (kg)
+QUANTITY_PATTERN = r"\d+([.,]\d{1,3})? ?(x|stk|st|kg|g|ml|l)\.?$|\d+[.,]\d{3}$"
+CURRENCY_PATTERN = r"(€|\$|£|EUR|USD|CHF|GBP)$"
+
+
+class Token(NamedTuple):
+    kind: str
+    cents: Optional[int] = None  # the value of a price, negative for refunds
+
+
+class Tokenizer:
+    """
+    classifies words as price, quantity, percent, currency, date or text.
+    A price may have up to `max_prefix` other characters in front (e.g. a currency symbol or 'E' as textract reads €)
+    and anything but a digit, '%' or a multiplication sign behind it (e.g. a tax class). A '-' in front or at the end
+    (1,99- is how many receipts print a refund) makes it negative.
+    Words repeat a lot, so every text is parsed only once and the tokens are cached.
+    """
+
+    def __init__(self, max_prefix: int = 2, cache_size: int = 1 << 14):
+        self.date = re.compile(DATE_PATTERN)
+        self.price = re.compile(r"(?P<prefix>\D{{0,{}}}?){}(?P<suffix>.*)$".format(max_prefix, AMOUNT_PATTERN))
+        self.quantity = re.compile(QUANTITY_PATTERN, re.IGNORECASE)
+        self.currency = re.compile(CURRENCY_PATTERN, re.IGNORECASE)
+        self.cache_size = cache_size
+        self._cache: Dict[str, Token] = {}
+        self.version = 0  # see changed()
+
+    def changed(self):
+        """ call after changing the patterns: the cached tokens are dropped and receipts find their prices again """
+        self._cache.clear()
+        self.version += 1
+
+    def classify(self, text: str) -> Token:
+        token = self._cache.get(text)
+        if token is None:
+            if len(self._cache) >= self.cache_size:
+                self._cache.clear()
+            token = self._cache[text] = self._classify(text.strip())
+        return token
+
+    def tokenize(self, texts: Iterable[str]) -> List[Token]:
+        return [self.classify(text) for text in texts]
+
+    def _classify(self, text: str) -> Token:
+        if self.date.match(text):
+            return Token(DATE)
+        match = self.price.match(text)
+        if match is not None:
+            suffix = match.group("suffix").strip()
+            if suffix.startswith("%"):
+                return Token(PERCENT)
+            if suffix[:1] in ("x", "X"):
+                return Token(QUANTITY)
+            cents = int(re.sub(r"\D", "", match.group("integer"))) * 100 + int(match.group("decimals"))
+            if "-" in match.group("prefix") or suffix.endswith("-"):
+                cents = -cents
+            return Token(PRICE, cents)
+        if self.quantity.match(text):
+            return Token(QUANTITY)
+        if self.currency.match(text):
+            return Token(CURRENCY)
+        return Token(TEXT)
+
+
+DEFAULT_TOKENIZER = Tokenizer()
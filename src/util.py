@@ -1,5 +1,5 @@
 import math
-from typing import Tuple, Union, List
+from typing import List, Optional, Tuple, Union
 
 import numpy as np
 from numpy.linalg import norm
@@ -26,6 +26,26 @@ def rotate_point(angle: float, point: Point, pivot: Point = (.5, .5)) -> Point:
     return qx, qy
 
 
+def rotate_points(angle: float, points: np.ndarray, pivot: Point = (.5, .5)) -> np.ndarray:
+    """
+    :param angle: angle in radius
+    :param points: array of shape (..., 2), all of them are rotated
+    :param pivot: rotate the points around this one
+    :return: array of the same shape as points
+
+    batched version of rotate_point
+    """
+    ox, oy = pivot
+    cos, sin = math.cos(angle), math.sin(angle)
+    px = points[..., 0] - ox
+    py = points[..., 1] - oy
+
+    rotated = np.empty(np.shape(points))
+    rotated[..., 0] = ox + cos * px - sin * py
+    rotated[..., 1] = oy + sin * px + cos * py
+    return rotated
+
+
 def get_angle(point1: Point, point2: Point) -> float:
     """
     :return: the angle of the line that runs from point1 to point2
@@ -33,6 +53,28 @@ def get_angle(point1: Point, point2: Point) -> float:
     return math.atan2(point2[1] - point1[1], point2[0] - point1[0])
 
 
+def get_angles(points1: np.ndarray, points2: np.ndarray) -> np.ndarray:
+    """
+    :return: the angles of the lines that run from points1[i] to points2[i], batched version of get_angle
+    """
+    return np.arctan2(points2[..., 1] - points1[..., 1], points2[..., 0] - points1[..., 0])
+
+
+def circular_mean(angles: np.ndarray, weights: Optional[np.ndarray] = None) -> Tuple[float, float]:
+    """
+    :param angles: angles in radians, e.g. -pi and pi are the same
+    :param weights: weight of each angle, all are weighted the same if None
+    :return: the mean angle in (-pi, pi] and the length of the mean resultant vector in [0, 1]:
+    1 if all angles are the same, about 0 if they are spread around the circle
+    """
+    weights = np.ones(len(angles)) if weights is None else weights
+    total = weights.sum()
+    if len(angles) == 0 or total <= 0:
+        return 0., 0.
+    x, y = np.dot(weights, np.cos(angles)) / total, np.dot(weights, np.sin(angles)) / total
+    return math.atan2(y, x), float(min(1., math.hypot(x, y)))
+
+
 def get_abs_perp_angle_diff(angle1: float, angle2: float) -> float:
     """
     :param angle1:
@@ -59,6 +101,20 @@ def get_dist_to_line(line_point1: Point, line_point2: Point, point: Point) -> fl
     return norm(np.cross(line_point2 - line_point1, line_point1 - point)) / norm(line_point2 - line_point1)
 
 
+def get_dists_to_lines(line_points1: np.ndarray, line_points2: np.ndarray, points: np.ndarray) -> np.ndarray:
+    """
+    :param line_points1: first points defining the lines, shape (..., 2)
+    :param line_points2: second points defining the lines, shape (..., 2)
+    :param points: the points to calculate the distances to, shape (..., 2)
+    :return: distances between points and the defined lines, all arguments are broadcast against each other.
+    e.g. lines of shape (M, 1, 2) and points of shape (1, N, 2) give a (M, N) distance matrix.
+    """
+    direction = line_points2 - line_points1
+    offset = line_points1 - points
+    cross = direction[..., 0] * offset[..., 1] - direction[..., 1] * offset[..., 0]
+    return np.abs(cross) / np.hypot(direction[..., 0], direction[..., 1])
+
+
 def distance_between_two_points(a: Point, b: Point) -> float:
     """https://stackoverflow.com/questions/1401712/how-can-the-euclidean-distance-be-calculated-with-numpy"""
     return np.linalg.norm(a - b)
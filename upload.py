@@ -1,4 +1,8 @@
 import argparse
+import ast
+import os
+import sys
+import tempfile
 from zipfile import ZipFile
 import subprocess
 
@@ -7,17 +11,30 @@ lambdas = {
     "analyze": {
         "config": {
             "handler": "analyze.lambda_handler",
-            "timeout": 10,  # seconds
+            "timeout": 120,  # seconds, event["multipage"] waits until its asynchronous textract job is done
             "runtime": "python3.6",
-            "role": "arn:aws:iam::693859464061:role/lambda-repository"
+            "role": "arn:aws:iam::693859464061:role/lambda-repository",
+            "import_budget_ms": 400,  # importing the handler must not take longer, see measure_import_time
         },
-        "src": [
+        "src": [  # instance.py (matplotlib) is only for visualization and isn't deployed
             "analyze.py",
+            "aws.py",
             "block.py",
+            "cache.py",
             "column.py",
-            "instance.py",
+            "geometry.py",
             "item.py",
+            "matcher.py",
+            "metrics.py",
+            "pages.py",
+            "parse.py",
             "receipt.py",
+            "reconcile.py",
+            "spatial.py",
+            "spellcheck.py",
+            "template.py",
+            "textract.py",
+            "tokenizer.py",
             "util.py",
         ]
     },
@@ -42,14 +59,72 @@ lambdas = {
 }
 
 
-def upload(name, update_config=False, create_function=False):
+def get_local_imports(module, found=None):
+    """
+    :return: the modules of src/ that the module imports, also inside functions and transitively,
+    but not in its `if __name__ == "__main__":` block. These have to be in the zip of a lambda.
+    """
+    found = set() if found is None else found
+    found.add(module)
+    with open(os.path.join("src", module + ".py")) as f:
+        tree = ast.parse(f.read())
+    nodes = [node for node in tree.body if not (isinstance(node, ast.If) and "__main__" in ast.dump(node.test))]
+    for node in (child for top in nodes for child in ast.walk(top)):
+        if isinstance(node, ast.Import):
+            names = [alias.name for alias in node.names]
+        elif isinstance(node, ast.ImportFrom) and node.module is not None and node.level == 0:
+            names = [node.module]
+        else:
+            continue
+        for imported in (name.split(".")[0] for name in names):
+            if imported not in found and os.path.isfile(os.path.join("src", imported + ".py")):
+                get_local_imports(imported, found)
+    return found
+
+
+def measure_import_time(name, zip_path):
+    """
+    import the handler module from the extracted zip in a new interpreter, like a cold start does.
+    This also fails if a module that the handler imports is missing in the zip.
+    :return: the import time of the handler module and the slowest imports, in milliseconds
+    """
+    module = lambdas[name]["config"]["handler"].split(".")[0]
+    with tempfile.TemporaryDirectory() as directory:
+        with ZipFile(zip_path) as z:
+            z.extractall(directory)
+        output = subprocess.run([sys.executable, "-X", "importtime", "-c", "import " + module],
+                                cwd=directory, stderr=subprocess.PIPE, check=True,
+                                env=dict(os.environ, PYTHONPATH=directory)).stderr.decode()
+    imports = {}
+    for line in output.splitlines():
+        if line.startswith("import time:") and "|" in line:
+            _, cumulative, imported = line.split("|")
+            if cumulative.strip().isdigit():
+                imports[imported.strip()] = int(cumulative) / 1000
+    slowest = sorted(((t, m) for m, t in imports.items() if m != module), reverse=True)[:5]
+    return imports[module], slowest
+
+
+def upload(name, update_config=False, create_function=False, check_imports=True):
     print("Processing Lambda '{}'...".format(name))
     zip_path = "./zips/{}.zip".format(name)
+    module = lambdas[name]["config"]["handler"].split(".")[0]
+    if os.path.isfile(os.path.join("src", module + ".py")):
+        missing = sorted({imported + ".py" for imported in get_local_imports(module)} - set(lambdas[name]["src"]))
+        if missing:
+            raise SystemExit("Lambda '{}' imports {}, add them to its src.".format(name, ", ".join(missing)))
     with ZipFile(zip_path, "w") as z:
         for filename in lambdas[name]["src"]:
             # don't include "src" folder in zip
             z.write("src/" + filename, arcname=filename)
     print("created zip file")
+    budget = lambdas[name]["config"].get("import_budget_ms")
+    if check_imports and budget is not None:
+        import_time, slowest = measure_import_time(name, zip_path)
+        print("import time: {:.0f} ms (budget {} ms), slowest: {}".format(
+            import_time, budget, ", ".join("{} {:.0f} ms".format(m, t) for t, m in slowest)))
+        if import_time > budget:
+            raise SystemExit("Import time of Lambda '{}' exceeds its budget, not uploading.".format(name))
     for _ in range(2):
         arguments = [
             "aws", "lambda", "create-function" if create_function else "update-function-code",
@@ -87,7 +162,10 @@ if __name__ == "__main__":
                         help="set this flag when the handler function has changed.")
     parser.add_argument("--create_function", action="store_true", default=False,
                         help="set if function does not exist yet and has to be newly created")
+    parser.add_argument("--skip_import_check", action="store_true", default=False,
+                        help="upload even if importing the handler takes longer than its import_budget_ms")
     args = parser.parse_args()
 
     for n in [args.name] if args.name is not None else lambdas.keys():
-        upload(name=n, update_config=args.update_config, create_function=args.create_function)
+        upload(name=n, update_config=args.update_config, create_function=args.create_function,
+               check_imports=not args.skip_import_check)